@@ -0,0 +1,32 @@
+from interface_expander.InterfaceExpander import InterfaceExpander
+from interface_expander.I2cInterface import I2cInterface, I2cConfig, ClockFreq, AddressWidth, I2cId
+from interface_expander.Memory import Memory, MemoryType, MemoryAddressWidth
+from concurrent.futures import ThreadPoolExecutor
+
+
+def read_fram(expander: InterfaceExpander) -> bytes:
+    cfg0 = I2cConfig(clock_freq=ClockFreq.FREQ1M,
+                     slave_addr=0x01,
+                     slave_addr_width=AddressWidth.Bits7)
+    i2c0 = I2cInterface(i2c_id=I2cId.I2C0, config=cfg0, expander=expander)
+
+    mem = Memory(interface=i2c0, slave_address=0x50, memory_type=MemoryType.FRAM,
+                 address_width=MemoryAddressWidth.TWO_BYTES, page_count=1, page_size=pow(2, 15))  # 32 kByte FRAM
+    return mem.read(address=0, length=-1)
+
+
+if __name__ == "__main__":
+    print(InterfaceExpander.find_devices())  # [(port, serial number), ...]
+
+    # Connect all attached expanders, a single one is selected with InterfaceExpander(port="COM4")
+    expanders = InterfaceExpander.connect_all()
+
+    # Operate all expanders in parallel
+    with ThreadPoolExecutor(max_workers=len(expanders)) as executor:
+        images = dict(zip(expanders, executor.map(read_fram, expanders.values())))
+
+    for port, image in images.items():
+        print(f"{port}: {image[:16].hex()}")
+
+    for expander in expanders.values():
+        expander.disconnect()
@@ -0,0 +1,291 @@
+from __future__ import annotations
+import asyncio
+import contextlib
+import io
+from typing import Callable, Generator, Iterable, Sequence
+from interface_expander.InterfaceExpander import InterfaceExpander
+from interface_expander.I2cInterface import I2cInterface, I2cMasterRequest, I2cSlaveRequest
+from interface_expander.IntervalSet import IntervalSet
+from interface_expander.Memory import (
+    Memory,
+    MemoryType,
+    MemoryTransaction,
+    MEMORY_MAX_WRITE_RETRIES,
+    MEMORY_MAX_READ_RETRIES,
+    MEMORY_REQUEST_TIMEOUT,
+)
+from interface_expander.DigitalToAnalog import (
+    DigitalToAnalog,
+    DacConfigStatusCode,
+    DacDataStatusCode,
+    DAC_MAX_DATA_SAMPLES,
+)
+
+ASYNC_MEMORY_LOCK_POLL = 0.001  # Polling interval while another thread (e.g. a write-back) holds the memory
+
+
+class AsyncExpander:
+    def __init__(self, expander: InterfaceExpander | None = None):
+        self.expander = expander or InterfaceExpander()
+        self.loop = None
+        self.rx_event = None  # Set whenever received messages have been handled
+        self.fd_reader = False
+
+    async def connect(self, coalesce_tx: bool = False) -> None:
+        """Open the serial port and receive on the event loop. Uses loop.add_reader() for the serial
+        file descriptor where available, otherwise the background reader of the expander.
+        coalesce_tx: see InterfaceExpander.connect()."""
+        if self.expander.running:
+            raise RuntimeError("Expander is already connected with a background reader!")
+
+        self.loop = asyncio.get_running_loop()
+        self.rx_event = asyncio.Event()
+        self.expander.connect(coalesce_tx=coalesce_tx)
+
+        try:
+            self.loop.add_reader(self.expander.serial_port.fileno(), self._on_readable)
+            self.fd_reader = True
+        except (NotImplementedError, AttributeError, io.UnsupportedOperation):
+            # No file descriptor for the port (Windows, URL handlers) or no selector loop (Proactor)
+            self.expander.dispatch_callback = self._on_dispatched
+            self.expander._start_reader()
+
+    def disconnect(self) -> None:
+        if self.fd_reader:
+            self.loop.remove_reader(self.expander.serial_port.fileno())
+            self.fd_reader = False
+        self.expander.dispatch_callback = None
+        self.expander.disconnect()
+
+    async def wait_until(self, predicate: Callable[[], bool], timeout: float) -> None:
+        """Wait until predicate() is true, re-checking it whenever messages have been received."""
+
+        async def wait():
+            while True:
+                self.expander._raise_rx_error()
+                if predicate():
+                    return
+                self.expander.flush()
+                self.rx_event.clear()
+                await self.rx_event.wait()
+
+        try:
+            await asyncio.wait_for(wait(), timeout)
+        except asyncio.TimeoutError:
+            raise TimeoutError("Timeout waiting for condition!") from None
+
+    def _on_readable(self) -> None:
+        with self.expander.lock:
+            try:
+                self.expander._read_all()
+                self.expander.flush()  # Requests sent by the RX handlers
+            except Exception as e:
+                self.expander.rx_error = e
+        self.rx_event.set()
+
+    def _on_dispatched(self) -> None:
+        # Called from the dispatch thread of the expander
+        self.loop.call_soon_threadsafe(self.rx_event.set)
+
+
+class AsyncI2cInterface:
+    def __init__(self, interface: I2cInterface):
+        self.interface = interface
+
+    async def request(
+        self, request: I2cMasterRequest | I2cSlaveRequest, timeout: float | None = None
+    ) -> I2cMasterRequest | I2cSlaveRequest:
+        """Send the request and wait for its response. Requests of concurrent coroutines are sent
+        in submission order whenever the device has queue and buffer space for them."""
+        future = self.interface.submit(request)
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(future), timeout)
+        except asyncio.TimeoutError:
+            position = self.interface.cancel(future)
+            if position is None:
+                raise TimeoutError(f"Timeout waiting for response (id: {request.request_id})!") from None
+            raise TimeoutError(f"Timeout waiting to send the request (submit queue position: {position})!") from None
+        except asyncio.CancelledError:
+            self.interface.cancel(future)  # Not sent later if it is still queued
+            raise
+
+    async def request_all(
+        self, requests: Iterable[I2cMasterRequest | I2cSlaveRequest], timeout: float | None = None
+    ) -> list[I2cMasterRequest | I2cSlaveRequest]:
+        return list(await asyncio.gather(*(self.request(request, timeout) for request in requests)))
+
+
+class AsyncMemory:
+    """Async API of a Memory. The requests are planned and their responses handled by the Memory, only the
+    waiting is done here. Like the sync operations they hold the io lock of the Memory (no write-back flush
+    meanwhile)."""
+
+    def __init__(self, memory: Memory):
+        self.memory = memory
+        self.interface = AsyncI2cInterface(memory.interface)
+
+    @contextlib.asynccontextmanager
+    async def _exclusive(self):
+        # See Memory._exclusive(), the event loop keeps running while another thread holds the lock
+        while not self.memory.io_lock.acquire(blocking=False):
+            await asyncio.sleep(ASYNC_MEMORY_LOCK_POLL)
+        try:
+            yield
+        finally:
+            self.memory.io_lock.release()
+
+    async def read(self, address: int, length: int) -> bytes:
+        # See Memory.read(), the prefetcher is not used (random access)
+        async with self._exclusive():
+            length = self.memory._check_read_range(address, length)
+            self.memory._check_write_back()
+            await self._cancel_prefetch()
+            steps = self.memory._plan_read(address, length)
+            try:
+                steps.send(await self._run_read_plan(next(steps)))
+            except StopIteration:
+                pass
+            return bytes(self.memory.buffer[address : address + length])
+
+    async def _cancel_prefetch(self) -> None:
+        # See Memory._cancel_prefetch(), the requests in flight are awaited instead of blocking the event loop
+        futures = [asyncio.wrap_future(future) for _, future in self.memory.prefetch_queue]
+        if futures:
+            await asyncio.wait(futures, timeout=MEMORY_REQUEST_TIMEOUT * len(futures))
+        self.memory._cancel_prefetch()
+
+    async def _run_read_plan(self, transactions: Sequence[MemoryTransaction]) -> list[bytes]:
+        # See Memory._run_read_plan(), not acknowledged requests are repeated
+        requests = [transaction.read_request() for transaction in transactions]
+        read_data = [None] * len(requests)
+        pending = list(range(len(requests)))
+        for _ in range(MEMORY_MAX_READ_RETRIES + 1):
+            responses = await self.interface.request_all([requests[i] for i in pending], timeout=1.0)
+            for i, response in zip(pending, responses):
+                read_data[i] = self.memory._read_response_data(response)
+            pending = [i for i in pending if read_data[i] is None]
+            if not pending:
+                return read_data
+
+        raise ValueError(f"Read failed after {MEMORY_MAX_READ_RETRIES} retries!")
+
+    async def _read_back(self, sections: list[tuple[int, int]]) -> list[bytes]:
+        # Read the sections without touching the buffer, see Memory._read_back()
+        plans = self.memory._read_back_plans(sections)
+        read_data = await self._run_read_plan([transaction for plan in plans for transaction in plan])
+        return self.memory._join_read_back(plans, read_data)
+
+    def write(self, address: int, data: bytes) -> None:
+        # Only updates the buffer, the data is sent by flush()
+        self.memory.write(address, data)
+
+    async def flush(self, differential: bool = False, verify: bool = False) -> tuple[int, int]:
+        # See Memory.flush()
+        async with self._exclusive():
+            self.memory._check_write_back()
+            return await self._flush(differential, verify)
+
+    async def _flush(self, differential: bool, verify: bool) -> tuple[int, int]:
+        steps = self.memory._plan_flush(differential)
+        try:
+            read_sections = next(steps)
+            while True:
+                read_sections = steps.send(await self._read_back(read_sections))
+        except StopIteration as stop:
+            sections, requests, pages_skipped = stop.value
+
+        if self.memory.memory_type == MemoryType.FRAM:
+            await self._send_write_requests_pipelined(requests)
+        else:
+            for request in requests:
+                await self._run_steps(self.memory._write_request_steps(request))
+            if requests:
+                await self._run_steps(self.memory._write_cycle_steps(requests[-1].slave_addr))
+
+        if verify:
+            self.memory._check_verify_result(await self._verify_sections(sections))
+        self.memory._flush_complete()
+        return self.memory._count_pages(sections), pages_skipped
+
+    async def _send_write_requests_pipelined(self, requests: list[I2cMasterRequest]) -> None:
+        # All requests are in flight together, not acknowledged ones are sent again
+        pending = requests
+        for _ in range(MEMORY_MAX_WRITE_RETRIES):
+            responses = await self.interface.request_all(pending, timeout=1.0)
+            pending = [
+                request
+                for request, response in zip(pending, responses)
+                if not self.memory._write_response_done(response)
+            ]
+            if not pending:
+                return
+
+        raise TimeoutError(f"Failed to write to memory after {MEMORY_MAX_WRITE_RETRIES} retries!")
+
+    async def _run_steps(self, steps: Generator[float | I2cMasterRequest, I2cMasterRequest | None, None]) -> None:
+        # Async driver of the request sequences of the Memory, see Memory._run_steps()
+        response = None
+        while True:
+            try:
+                step = steps.send(response)
+            except StopIteration:
+                return
+            if isinstance(step, I2cMasterRequest):
+                response = await self.interface.request(step, timeout=1.0)
+            else:
+                await asyncio.sleep(step)
+                response = None
+
+    async def verify(self, address: int = 0, length: int = -1) -> list[tuple[int, int]]:
+        # See Memory.verify(), all sections are compared
+        async with self._exclusive():
+            length = self.memory._check_read_range(address, length)
+            return await self._verify_sections([(address, address + length)])
+
+    async def _verify_sections(self, sections: list[tuple[int, int]]) -> list[tuple[int, int]]:
+        mismatches = IntervalSet()
+        for (section_start, _), data in zip(sections, await self._read_back(sections)):
+            self.memory._compare(section_start, data, mismatches)
+        return list(mismatches)
+
+
+class AsyncDigitalToAnalog:
+    def __init__(self, expander: AsyncExpander, dac: DigitalToAnalog):
+        self.expander = expander
+        self.dac = dac
+
+    async def stream_sequence(
+        self,
+        sequence_ch0: Iterable[float] | None,
+        sampling_rate_ch0: int | None,
+        sequence_ch1: Iterable[float] | None,
+        sampling_rate_ch1: int | None,
+    ) -> DacDataStatusCode:
+        dac = self.dac
+        config, sequence_ch0, sequence_ch1 = dac._create_stream_config(
+            sequence_ch0, sampling_rate_ch0, sequence_ch1, sampling_rate_ch1
+        )
+        if dac._send_config(config):
+            await self.expander.wait_until(config.completion.is_set, 1.0)
+            if config.status_code != DacConfigStatusCode.SUCCESS:
+                raise RuntimeError("Failed to apply DAC configuration!")
+
+        len_ch0 = len(sequence_ch0) if sequence_ch0 else 0
+        len_ch1 = len(sequence_ch1) if sequence_ch1 else 0
+        offset_ch0 = 0
+        offset_ch1 = 0
+
+        timeout = DAC_MAX_DATA_SAMPLES / max(sampling_rate_ch0 or 1, sampling_rate_ch1 or 1)
+        while offset_ch0 < len_ch0 or offset_ch1 < len_ch1:
+            await self.expander.wait_until(dac._stream_space_available, timeout + 0.42)
+            with self.expander.expander.lock:
+                request, offset_ch0, offset_ch1 = dac._create_stream_request(
+                    sequence_ch0, offset_ch0, sequence_ch1, offset_ch1
+                )
+                dac._send_accepted_data_request(request)
+
+        # Wait for all requests to complete
+        pending_requests = list(dac.data_requests.values())
+        await self.expander.wait_until(lambda: all(r.completion.is_set() for r in pending_requests), 0.42)
+        dac._pop_complete_data_requests()
+        return DacDataStatusCode.SUCCESS
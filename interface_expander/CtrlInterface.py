@@ -1,12 +1,20 @@
+from __future__ import annotations
 import interface_expander.tiny_frame as tf
+import interface_expander.InterfaceExpander as intexp
 from interface_expander.proto.proto_py import ctrl_pb2
 from interface_expander.Singleton import Singleton
 
 
 class CtrlInterface(metaclass=Singleton):
-    def __init__(self):
+    def __init__(self, expander: intexp.InterfaceExpander | None = None):
+        self.expander = expander or intexp.InterfaceExpander()
+        self.expander.ctrl_instance = self
         self.sequence_number = 0  # Proto message synchronization
 
+    @staticmethod
+    def _singleton_key(expander: intexp.InterfaceExpander | None = None) -> intexp.InterfaceExpander:
+        return expander or intexp.InterfaceExpander()  # One instance per expander
+
     def _send_system_reset(self) -> None:
         """Send a system reset message to the USB interface."""
         self.sequence_number += 1
@@ -16,7 +24,7 @@ class CtrlInterface(metaclass=Singleton):
         msg.ctrl_request.reset_system = True
 
         msg_bytes = msg.SerializeToString()
-        tf.TF_INSTANCE.send(tf.TfMsgType.TYPE_CTRL.value, msg_bytes, 0)
+        self.expander.tf.send(tf.TfMsgType.TYPE_CTRL.value, msg_bytes, 0)
 
     def _receive_msg_cb(self, msg: ctrl_pb2.CtrlMsg):
         """Receive a CTRL message from the USB interface."""
@@ -24,11 +32,14 @@ class CtrlInterface(metaclass=Singleton):
             return
 
 
-def _receive_ctrl_msg_cb(_, tf_msg: tf.TF.TF_Msg) -> None:
+def _receive_ctrl_msg_cb(tf_instance: tf.TF.TinyFrame, tf_msg: tf.TF.TF_Msg) -> None:
     """Receive a CTRL message from the USB interface."""
     msg = ctrl_pb2.CtrlMsg()
     msg.ParseFromString(tf_msg.data)
-    CtrlInterface()._receive_msg_cb(msg)
+
+    instance = tf_instance.userdata.ctrl_instance
+    if instance is not None:
+        instance._receive_msg_cb(msg)
 
 
 tf.tf_register_callback(tf.TfMsgType.TYPE_CTRL, _receive_ctrl_msg_cb)
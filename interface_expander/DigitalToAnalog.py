@@ -5,6 +5,7 @@ from typing import Callable, Iterable
 from copy import copy
 import interface_expander.tiny_frame as tf
 import interface_expander.InterfaceExpander as intexp
+import threading
 import time, math
 
 
@@ -25,8 +26,6 @@ DAC_CORRECTION_CH1 = int(0.0039 * DAC_MAX_SAMPLE_VALUE / DAC_GAIN_CH1 / DAC_VREF
 IDAC_RESISTANCE = 500  # Resistance in Ohms for current output conversion
 IDAC_MAX_CURRENT = 24.0  # Maximum current in mA for IDAC
 
-DAC_INSTANCE: DigitalToAnalog | None = None
-
 
 class DacMode(Enum):
     STATIC_MODE = 0
@@ -64,6 +63,7 @@ class DacConfig:
     ):
         self.status_code = DacConfigStatusCode.NOT_INIT
         self.request_id = None  # This will be set when the request is sent
+        self.completion = threading.Event()  # Set when the status is received
 
         self.mode_ch0 = mode_ch0
         self.sampling_rate_ch0 = sampling_rate_ch0
@@ -78,6 +78,7 @@ class DacDataRequest:
     def __init__(self, run_ch0: bool, sequence_ch0: list, run_ch1: bool, sequence_ch1: list):
         self.status_code = DacDataStatusCode.NOT_INIT
         self.request_id = None
+        self.completion = threading.Event()  # Set when the status is received
 
         self.run_ch0 = run_ch0
         self.sequence_ch0 = sequence_ch0
@@ -87,8 +88,8 @@ class DacDataRequest:
 
 
 class DigitalToAnalog:
-    def __init__(self):
-        self.expander = intexp.InterfaceExpander()
+    def __init__(self, expander: intexp.InterfaceExpander | None = None):
+        self.expander = expander or intexp.InterfaceExpander()
         self.config = None
 
         self.sequence_number = 0  # Proto message synchronization
@@ -103,8 +104,10 @@ class DigitalToAnalog:
         self.buffer_underrun_ch0 = False
         self.buffer_underrun_ch1 = False
 
-        global DAC_INSTANCE
-        DAC_INSTANCE = self
+        # Set by the RX handlers when queue/buffer space may have become available
+        self.space_event = threading.Event()
+
+        self.expander.dac_instance = self
 
         config = DacConfig(
             mode_ch0=DacMode.STATIC_MODE,
@@ -120,6 +123,15 @@ class DigitalToAnalog:
     def _apply_config(
         self, config: DacConfig, force_config_ch0: bool = False, force_config_ch1: bool = False, timeout: float = 1.0
     ) -> DacConfigStatusCode:
+        if not self._send_config(config, force_config_ch0, force_config_ch1):
+            return DacConfigStatusCode.SUCCESS
+
+        # Wait for response with timeout
+        self._wait_for_response(config.request_id, timeout)
+        return config.status_code
+
+    def _send_config(self, config: DacConfig, force_config_ch0: bool = False, force_config_ch1: bool = False) -> bool:
+        """Send the configuration if it differs from the active one, returns True if it was sent."""
         update_ch0_config = True
         update_ch1_config = True
 
@@ -142,7 +154,7 @@ class DigitalToAnalog:
             update_ch1_config = False
 
         if not update_ch0_config and not update_ch1_config:
-            return DacConfigStatusCode.SUCCESS
+            return False
 
         self.data_requests = {}
         if update_ch0_config and update_ch1_config:
@@ -159,6 +171,7 @@ class DigitalToAnalog:
 
         config.status_code = DacConfigStatusCode.PENDING
         config.request_id = self.request_id_counter
+        config.completion.clear()
         self.config = config
 
         def translate_mode(mode: DacMode) -> dac_pb2.DacMode:
@@ -185,11 +198,9 @@ class DigitalToAnalog:
         msg.config_request.periodic_samples_ch1 = config.sample_count_ch1
 
         msg_bytes = msg.SerializeToString()
-        tf.TF_INSTANCE.send(tf.TfMsgType.TYPE_DAC.value, msg_bytes, 0)
-
-        # Wait for response with timeout
-        self._wait_for_response(config.request_id, timeout)
-        return config.status_code
+        with self.expander.lock:
+            self.expander.tf.send(tf.TfMsgType.TYPE_DAC.value, msg_bytes, 0)
+        return True
 
     def _can_accept_request(self, request: DacDataRequest | DacConfig) -> bool:
         accept = False
@@ -399,6 +410,39 @@ class DigitalToAnalog:
         sequence_ch1: Iterable[float] | None,
         sampling_rate_ch1: int | None,
     ) -> DacDataStatusCode:
+        config, sequence_ch0, sequence_ch1 = self._create_stream_config(
+            sequence_ch0, sampling_rate_ch0, sequence_ch1, sampling_rate_ch1
+        )
+        if self._apply_config(config) != DacConfigStatusCode.SUCCESS:
+            raise RuntimeError("Failed to apply DAC configuration!")
+
+        len_ch0 = len(sequence_ch0) if sequence_ch0 else 0
+        len_ch1 = len(sequence_ch1) if sequence_ch1 else 0
+        offset_ch0 = 0
+        offset_ch1 = 0
+
+        timeout = DAC_MAX_DATA_SAMPLES / max(sampling_rate_ch0 or 1, sampling_rate_ch1 or 1)
+        while offset_ch0 < len_ch0 or offset_ch1 < len_ch1:
+            with self.expander.wait_until(self.space_event, self._stream_space_available, timeout + 0.42) as available:
+                if not available:
+                    raise TimeoutError("Timeout waiting for buffer space!")
+
+            request, offset_ch0, offset_ch1 = self._create_stream_request(
+                sequence_ch0, offset_ch0, sequence_ch1, offset_ch1
+            )
+            self._send_data_request(request)
+
+        # Wait for all requests to complete
+        self._wait_for_all_responses(timeout=0.42)
+        return DacDataStatusCode.SUCCESS
+
+    def _create_stream_config(
+        self,
+        sequence_ch0: Iterable[float] | None,
+        sampling_rate_ch0: int | None,
+        sequence_ch1: Iterable[float] | None,
+        sampling_rate_ch1: int | None,
+    ) -> tuple[DacConfig, list[int] | None, list[int] | None]:
         config = copy(self.config)
         sequence_ch0 = [DigitalToAnalog._voltage_to_value(v, None)[0] for v in sequence_ch0] if sequence_ch0 else None
         sequence_ch1 = [DigitalToAnalog._voltage_to_value(None, v)[1] for v in sequence_ch1] if sequence_ch1 else None
@@ -418,62 +462,51 @@ class DigitalToAnalog:
             config.sampling_rate_ch1 = sampling_rate_ch1
             config.sample_count_ch1 = 0
 
-        if self._apply_config(config) != DacConfigStatusCode.SUCCESS:
-            raise RuntimeError("Failed to apply DAC configuration!")
+        return config, sequence_ch0, sequence_ch1
 
+    def _stream_space_available(self) -> bool:
+        return (
+            self.buffer_space_ch0 >= DAC_MAX_DATA_SAMPLES
+            and self.buffer_space_ch1 >= DAC_MAX_DATA_SAMPLES
+            and self.queue_space > 0
+        )
+
+    def _create_stream_request(
+        self, sequence_ch0: list[int] | None, offset_ch0: int, sequence_ch1: list[int] | None, offset_ch1: int
+    ) -> tuple[DacDataRequest, int, int]:
         len_ch0 = len(sequence_ch0) if sequence_ch0 else 0
         len_ch1 = len(sequence_ch1) if sequence_ch1 else 0
-        offset_ch0 = 0
-        offset_ch1 = 0
-
-        timeout = DAC_MAX_DATA_SAMPLES / max(sampling_rate_ch0 or 1, sampling_rate_ch1 or 1)
-        while offset_ch0 < len_ch0 or offset_ch1 < len_ch1:
-            start_time = time.monotonic()
-            while (
-                self.buffer_space_ch0 < DAC_MAX_DATA_SAMPLES
-                or self.buffer_space_ch1 < DAC_MAX_DATA_SAMPLES
-                or self.queue_space == 0
-            ):
-                # self.expander._read_all()
-                self._wait_for_all_responses(timeout=0.1)
-                if time.monotonic() - start_time > timeout + 0.42:
-                    raise TimeoutError("Timeout waiting for buffer space!")
 
-            current_sequence_ch0 = []
-            if offset_ch0 < len_ch0:
-                length = min(DAC_MAX_DATA_SAMPLES, len_ch0 - offset_ch0, self.buffer_space_ch0)
-                current_sequence_ch0 = sequence_ch0[offset_ch0 : offset_ch0 + length]
-                offset_ch0 += length
-                # self.buffer_underrun_ch0 = False
+        current_sequence_ch0 = []
+        if offset_ch0 < len_ch0:
+            length = min(DAC_MAX_DATA_SAMPLES, len_ch0 - offset_ch0, self.buffer_space_ch0)
+            current_sequence_ch0 = sequence_ch0[offset_ch0 : offset_ch0 + length]
+            offset_ch0 += length
+            # self.buffer_underrun_ch0 = False
 
-            current_sequence_ch1 = []
-            if offset_ch1 < len_ch1:
-                length = min(DAC_MAX_DATA_SAMPLES, len_ch1 - offset_ch1, self.buffer_space_ch1)
-                current_sequence_ch1 = sequence_ch1[offset_ch1 : offset_ch1 + length]
-                offset_ch1 += length
-                # self.buffer_underrun_ch0 = True
+        current_sequence_ch1 = []
+        if offset_ch1 < len_ch1:
+            length = min(DAC_MAX_DATA_SAMPLES, len_ch1 - offset_ch1, self.buffer_space_ch1)
+            current_sequence_ch1 = sequence_ch1[offset_ch1 : offset_ch1 + length]
+            offset_ch1 += length
+            # self.buffer_underrun_ch0 = True
 
-            request = DacDataRequest(True, current_sequence_ch0, True, current_sequence_ch1)
-            self._send_data_request(request)
-
-        # Wait for all requests to complete
-        self._wait_for_all_responses(timeout=0.42)
-        return DacDataStatusCode.SUCCESS
+        request = DacDataRequest(True, current_sequence_ch0, True, current_sequence_ch1)
+        return request, offset_ch0, offset_ch1
 
     def _send_data_request(self, request: DacDataRequest, timeout: float = 0.1) -> int:
-        start_time = time.monotonic()
-        while not self._can_accept_request(request):
-            self.expander._read_all()
-            if time.monotonic() - start_time > timeout:
+        with self.expander.wait_until(self.space_event, lambda: self._can_accept_request(request), timeout) as accepted:
+            if not accepted:
                 raise TimeoutError("Timeout waiting for request acceptance!")
-        else:
-            self.expander._read_all()
+            return self._send_accepted_data_request(request)
 
+    def _send_accepted_data_request(self, request: DacDataRequest) -> int:
         self.sequence_number += 1
         self.request_id_counter += 1
 
         request.status_code = DacDataStatusCode.PENDING
         request.request_id = self.request_id_counter
+        request.completion.clear()
 
         self.data_requests[request.request_id] = request
 
@@ -505,37 +538,49 @@ class DigitalToAnalog:
         msg.data_request.data_ch1 = b"".join(x.to_bytes(2, "little") for x in request.sequence_ch1)
 
         msg_bytes = msg.SerializeToString()
-        tf.TF_INSTANCE.send(tf.TfMsgType.TYPE_DAC.value, msg_bytes, 0)
+        self.expander.tf.send(tf.TfMsgType.TYPE_DAC.value, msg_bytes, 0)
         return request.request_id
 
     def _wait_for_response(self, request_id: int, timeout: float) -> DacDataRequest | DacConfig:
         if request_id in self.data_requests:
             container = self.data_requests
             request = container[request_id]
-            pending_code = DacDataStatusCode.PENDING
         elif self.config.request_id == request_id:
             container = None
             request = self.config
-            pending_code = DacConfigStatusCode.PENDING
         else:
             raise ValueError("Unknown request id (id: %d)" % request_id)
 
-        start_time = time.monotonic()
-        while True:
-            self.expander._read_all()
-            if request.status_code != pending_code:
-                break
-            elif time.monotonic() - start_time > timeout:
-                raise TimeoutError("Timeout waiting for response (id: %d)" % request_id)
+        if not self.expander.wait_event(request.completion, timeout):
+            raise TimeoutError("Timeout waiting for response (id: %d)" % request_id)
 
-        if container:
-            del container[request_id]
+        with self.expander.lock:
+            if container:
+                del container[request_id]
         return request
 
     def _wait_for_all_responses(self, timeout: float) -> float:
         start_time = time.monotonic()
-        while self.data_requests:
-            self.expander._read_all()
+        with self.expander.lock:
+            pending_requests = list(self.data_requests.values())
+
+        complete = True
+        for request in pending_requests:
+            remaining = timeout - (time.monotonic() - start_time)
+            if not self.expander.wait_event(request.completion, remaining):
+                complete = False
+                break
+        self.expander._read_all()  # Pick up notifications received after the last response
+
+        self._pop_complete_data_requests()
+        if not complete:
+            raise TimeoutError("Timeout waiting for all responses!")
+
+        passed_time = time.monotonic() - start_time
+        return passed_time
+
+    def _pop_complete_data_requests(self) -> None:
+        with self.expander.lock:
             complete_rids = []
             for rid, request in self.data_requests.items():
                 status_code = request.status_code
@@ -549,14 +594,6 @@ class DigitalToAnalog:
             for rid in complete_rids:
                 del self.data_requests[rid]
 
-            if time.monotonic() - start_time > timeout:
-                raise TimeoutError("Timeout waiting for all responses!")
-        else:
-            self.expander._read_all()
-
-        passed_time = time.monotonic() - start_time
-        return passed_time
-
     def _receive_msg_cb(self, msg: dac_pb2.DacMsg):
         inner_msg = msg.WhichOneof("msg")
         if inner_msg == "config_status":
@@ -571,6 +608,7 @@ class DigitalToAnalog:
     def _handle_config_status(self, msg: dac_pb2.DacMsg):
         if msg.config_status.request_id == self.config.request_id:
             self.config.status_code = DacConfigStatusCode(msg.config_status.status_code)
+            self.config.completion.set()
         else:
             raise ValueError("Received config status for unknown request (id: %d)" % msg.config_status.request_id)
 
@@ -579,6 +617,7 @@ class DigitalToAnalog:
             self.queue_space = msg.data_status.queue_space
             self.buffer_space_ch0 = msg.data_status.buffer_space_ch0
             self.buffer_space_ch1 = msg.data_status.buffer_space_ch1
+            self.space_event.set()
             """
             print(
                 f"Updated space (queue: {self.queue_space}, ch0: {self.buffer_space_ch0}, ch1: {self.buffer_space_ch1})"
@@ -591,6 +630,7 @@ class DigitalToAnalog:
 
         status = DacDataStatusCode(msg.data_status.status_code)
         self.data_requests[request_id].status_code = status
+        self.data_requests[request_id].completion.set()
 
         if status != DacDataStatusCode.SUCCESS:
             raise RuntimeError(f"Data request {request_id} failed with status: {status}")
@@ -600,6 +640,7 @@ class DigitalToAnalog:
             self.queue_space = msg.notification.queue_space
             self.buffer_space_ch0 = msg.notification.buffer_space_ch0
             self.buffer_space_ch1 = msg.notification.buffer_space_ch1
+            self.space_event.set()
             """
             print(
                 f"Notification - updated space (queue: {self.queue_space}, ch0: {self.buffer_space_ch0}, ch1: {self.buffer_space_ch1})"
@@ -618,14 +659,14 @@ class DigitalToAnalog:
             # print("Warning: Buffer underrun on channel 1!")
 
 
-def _receive_dac_msg_cb(_, tf_msg: tf.TF.TF_Msg) -> None:
+def _receive_dac_msg_cb(tf_instance: tf.TF.TinyFrame, tf_msg: tf.TF.TF_Msg) -> None:
     """Receive a DAC message from the USB interface."""
     msg = dac_pb2.DacMsg()
     msg.ParseFromString(tf_msg.data)
 
-    global DAC_INSTANCE
-    if DAC_INSTANCE is not None:
-        DAC_INSTANCE._receive_msg_cb(msg)
+    instance = tf_instance.userdata.dac_instance
+    if instance is not None:
+        instance._receive_msg_cb(msg)
     else:
         raise RuntimeError("DAC instance is not initialized!")
 
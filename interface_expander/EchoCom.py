@@ -1,40 +1,48 @@
-import time
+from __future__ import annotations
+import threading
 import interface_expander.tiny_frame as tf
 import interface_expander.InterfaceExpander as intexp
 from interface_expander.Singleton import Singleton
 
 
 class EchoCom(metaclass=Singleton):
-    def __init__(self):
-        self.expander = intexp.InterfaceExpander()
+    def __init__(self, expander: intexp.InterfaceExpander | None = None):
+        self.expander = expander or intexp.InterfaceExpander()
+        self.expander.echo_instance = self
         self.received_data = None
+        self.received_event = threading.Event()
+
+    @staticmethod
+    def _singleton_key(expander: intexp.InterfaceExpander | None = None) -> intexp.InterfaceExpander:
+        return expander or intexp.InterfaceExpander()  # One instance per expander
 
     def send(self, data: bytes) -> None:
         """Send an echo message to the USB interface."""
-        self.received_data = None
-        tf.TF_INSTANCE.send(tf.TfMsgType.TYPE_ECHO.value, data, 0)
+        with self.expander.lock:
+            self.received_data = None
+            self.received_event.clear()
+            self.expander.tf.send(tf.TfMsgType.TYPE_ECHO.value, data, 0)
 
     def read_echo(self, timeout: float):
         """Wait for an echo message from the USB interface."""
-        start_time = time.monotonic()
-        while True:
-            self.expander._read_all()
-            if self.received_data:
-                break
-            elif time.monotonic() - start_time > timeout:
-                raise TimeoutError("Timeout waiting for echo message!")
+        if not self.expander.wait_event(self.received_event, timeout):
+            raise TimeoutError("Timeout waiting for echo message!")
 
         return self.received_data
 
     def _receive_msg_cb(self, msg: bytes):
         """Receive an echo message from the USB interface."""
         self.received_data = msg
+        self.received_event.set()
 
 
-def _receive_echo_msg_cb(_, tf_msg: tf.TF.TF_Msg) -> None:
+def _receive_echo_msg_cb(tf_instance: tf.TF.TinyFrame, tf_msg: tf.TF.TF_Msg) -> None:
     """Receive an echo message from the USB interface."""
     msg = tf_msg.data
-    EchoCom()._receive_msg_cb(msg)
+
+    instance = tf_instance.userdata.echo_instance
+    if instance is not None:
+        instance._receive_msg_cb(msg)
 
 
 tf.tf_register_callback(tf.TfMsgType.TYPE_ECHO, _receive_echo_msg_cb)
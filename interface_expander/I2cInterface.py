@@ -1,9 +1,12 @@
 from __future__ import annotations
 from interface_expander.proto.proto_py import i2c_pb2
 from enum import Enum
-from typing import Callable
+from typing import Callable, Iterable, Iterator
+from collections import deque
+from concurrent.futures import Future
 import interface_expander.tiny_frame as tf
 import interface_expander.InterfaceExpander as intexp
+import threading
 import time
 
 I2C_MASTER_QUEUE_SPACE = 4
@@ -19,9 +22,6 @@ class I2cId(Enum):
     I2C1 = 1
 
 
-I2C_INSTANCE: dict[I2cId, I2cInterface | None] = {I2cId.I2C0: None, I2cId.I2C1: None}
-
-
 class ClockFreq(Enum):
     FREQ10K = 10e3
     FREQ40K = 40e3
@@ -70,6 +70,7 @@ class I2cConfig:
     ):
         self.status_code = I2cConfigStatusCode.NOT_INIT
         self.request_id = None
+        self.completion = threading.Event()  # Set when the status is received
         self.clock_freq = clock_freq
         self.slave_addr = slave_addr
         self.slave_addr_width = slave_addr_width
@@ -80,6 +81,7 @@ class I2cMasterRequest:
     def __init__(self, slave_addr: int, write_data: bytes, read_size: int, callback_fn: Callable = None):
         self.status_code = I2cStatusCode.NOT_INIT
         self.request_id = None
+        self.completion = threading.Event()  # Set when the status is received
         self.slave_addr = slave_addr
         self.write_data = write_data
         self.read_size = read_size
@@ -95,6 +97,7 @@ class I2cSlaveRequest:
     ):
         self.status_code = I2cStatusCode.NOT_INIT
         self.request_id = None
+        self.completion = threading.Event()  # Set when the status is received
         self.write_addr = write_addr
         self.write_data = write_data
         self.read_addr = read_addr
@@ -112,8 +115,14 @@ class I2cSlaveNotification:
 
 
 class I2cInterface:
-    def __init__(self, i2c_id: I2cId, config: I2cConfig, callback_fn: Callable = None):
-        self.expander = intexp.InterfaceExpander()
+    def __init__(
+        self,
+        i2c_id: I2cId,
+        config: I2cConfig,
+        callback_fn: Callable = None,
+        expander: intexp.InterfaceExpander | None = None,
+    ):
+        self.expander = expander or intexp.InterfaceExpander()
         self.i2c_id = i2c_id
         self.config = config
         self.callback_fn = callback_fn  # Slave notifications callback
@@ -130,19 +139,28 @@ class I2cInterface:
         self.slave_requests = {}
         self.slave_access_notifications = {}
 
+        # Set by the RX handlers when space may have become available / a notification arrived
+        self.master_space_event = threading.Event()
+        self.slave_space_event = threading.Event()
+        self.notification_event = threading.Event()
+
+        # Pipelined submission (see submit()), requests wait here until the device has space for them
+        self.master_submit_queue = deque()
+        self.slave_submit_queue = deque()
+        self.request_futures = {}
+        self.completion_event = threading.Event()  # Set whenever a request completes
+
         self.i2c_idm = i2c_pb2.I2cId.I2C0 if self.i2c_id == I2cId.I2C0 else i2c_pb2.I2cId.I2C1
 
-        global I2C_INSTANCE
-        I2C_INSTANCE[self.i2c_id] = self
+        self.expander.i2c_instances[self.i2c_id] = self
 
         if self.apply_config(config) != I2cConfigStatusCode.SUCCESS:
             print("Failed to apply I2C configuration: %s" % config.status_code.name)
             raise RuntimeError("Failed to apply I2C configuration!")
 
     def __del__(self):
-        global I2C_INSTANCE
-        if I2C_INSTANCE and I2C_INSTANCE[self.i2c_id] is self:
-            I2C_INSTANCE[self.i2c_id] = None
+        if self.expander.i2c_instances.get(self.i2c_id) is self:
+            del self.expander.i2c_instances[self.i2c_id]
 
     def _check_request_sanity(self, request: I2cMasterRequest | I2cSlaveRequest) -> None:
         if isinstance(request, I2cMasterRequest):
@@ -234,18 +252,20 @@ class I2cInterface:
             assert self.slave_queue_space >= 0
 
     def get_pending_master_request_ids(self) -> list[int]:
-        return [
-            request.request_id
-            for rid, request in self.master_requests.items()
-            if request.status_code == I2cStatusCode.PENDING
-        ]
+        with self.expander.lock:
+            return [
+                request.request_id
+                for rid, request in self.master_requests.items()
+                if request.status_code == I2cStatusCode.PENDING
+            ]
 
     def get_complete_master_request_ids(self) -> list[int]:
-        return [
-            request.request_id
-            for rid, request in self.master_requests.items()
-            if request.status_code != I2cStatusCode.PENDING
-        ]
+        with self.expander.lock:
+            return [
+                request.request_id
+                for rid, request in self.master_requests.items()
+                if request.status_code != I2cStatusCode.PENDING
+            ]
 
     def get_master_request(self, request_id: int) -> I2cMasterRequest:
         return self.master_requests[request_id]
@@ -254,50 +274,56 @@ class I2cInterface:
         return self.master_requests.pop(request_id)
 
     def pop_complete_master_requests(self) -> dict[int, I2cMasterRequest]:
-        complete_requests = {
-            request.request_id: request
-            for rid, request in self.master_requests.items()
-            if request.status_code != I2cStatusCode.PENDING
-        }
-        for rid in complete_requests.keys():
-            del self.master_requests[rid]
-        return complete_requests
+        with self.expander.lock:
+            complete_requests = {
+                request.request_id: request
+                for rid, request in self.master_requests.items()
+                if request.status_code != I2cStatusCode.PENDING
+            }
+            for rid in complete_requests.keys():
+                del self.master_requests[rid]
+            return complete_requests
 
     def get_pending_slave_request_ids(self) -> list[int]:
-        return [
-            request.request_id
-            for rid, request in self.slave_requests.items()
-            if request.status_code == I2cStatusCode.PENDING
-        ]
+        with self.expander.lock:
+            return [
+                request.request_id
+                for rid, request in self.slave_requests.items()
+                if request.status_code == I2cStatusCode.PENDING
+            ]
 
     def get_complete_slave_request_ids(self) -> list[int]:
-        return [
-            request.request_id
-            for rid, request in self.slave_requests.items()
-            if request.status_code != I2cStatusCode.PENDING
-        ]
+        with self.expander.lock:
+            return [
+                request.request_id
+                for rid, request in self.slave_requests.items()
+                if request.status_code != I2cStatusCode.PENDING
+            ]
 
     def pop_complete_slave_requests(self) -> dict[int, I2cSlaveRequest]:
-        complete_requests = {
-            request.request_id: request
-            for rid, request in self.slave_requests.items()
-            if request.status_code != I2cStatusCode.PENDING
-        }
-        for rid in complete_requests.keys():
-            del self.slave_requests[rid]
-        return complete_requests
+        with self.expander.lock:
+            complete_requests = {
+                request.request_id: request
+                for rid, request in self.slave_requests.items()
+                if request.status_code != I2cStatusCode.PENDING
+            }
+            for rid in complete_requests.keys():
+                del self.slave_requests[rid]
+            return complete_requests
 
     def get_slave_access_notifications(self) -> dict[int, I2cSlaveNotification]:
-        return self.slave_access_notifications.copy()
+        with self.expander.lock:
+            return self.slave_access_notifications.copy()
 
     def pop_slave_access_notifications(self, count=-1) -> dict[int, I2cSlaveNotification]:
-        if count > 0:
-            keys = list(self.slave_access_notifications.keys())[:count]
-            notifications = {key: self.slave_access_notifications.pop(key) for key in keys}
-        else:
-            notifications = self.slave_access_notifications.copy()
-            self.slave_access_notifications.clear()
-        return notifications
+        with self.expander.lock:
+            if count > 0:
+                keys = list(self.slave_access_notifications.keys())[:count]
+                notifications = {key: self.slave_access_notifications.pop(key) for key in keys}
+            else:
+                notifications = self.slave_access_notifications.copy()
+                self.slave_access_notifications.clear()
+            return notifications
 
     def apply_config(self, config: I2cConfig, timeout: float = 0.1) -> I2cConfigStatusCode:
         if not isinstance(config, I2cConfig):
@@ -312,6 +338,7 @@ class I2cInterface:
 
         config.status_code = I2cConfigStatusCode.PENDING
         config.request_id = self.request_id_counter
+        config.completion.clear()
         self.config = config
 
         msg = i2c_pb2.I2cMsg()
@@ -329,27 +356,29 @@ class I2cInterface:
         )
 
         msg_bytes = msg.SerializeToString()
-        tf.TF_INSTANCE.send(tf.TfMsgType.TYPE_I2C.value, msg_bytes, 0)
+        with self.expander.lock:
+            self.expander.tf.send(tf.TfMsgType.TYPE_I2C.value, msg_bytes, 0)
 
         # Wait for response with timeout
         self.wait_for_response(config.request_id, timeout)
         return config.status_code
 
     def send_request(self, request: I2cMasterRequest | I2cSlaveRequest, timeout: float = 0.1) -> int:
-        start_time = time.monotonic()
-        while not self.can_accept_request(request):
-            self.expander._read_all()
-            if time.monotonic() - start_time > timeout:
-                raise TimeoutError("Timeout waiting for request acceptance!")
+        if isinstance(request, I2cSlaveRequest):
+            space_event = self.slave_space_event
         else:
-            self.expander._read_all()
+            space_event = self.master_space_event
 
-        if isinstance(request, I2cMasterRequest):
-            return self._send_master_request(request)
-        elif isinstance(request, I2cSlaveRequest):
-            return self._send_slave_request(request)
-        else:
-            raise ValueError("Invalid request type!")
+        with self.expander.wait_until(space_event, lambda: self.can_accept_request(request), timeout) as accepted:
+            if not accepted:
+                raise TimeoutError("Timeout waiting for request acceptance!")
+
+            if isinstance(request, I2cMasterRequest):
+                return self._send_master_request(request)
+            elif isinstance(request, I2cSlaveRequest):
+                return self._send_slave_request(request)
+            else:
+                raise ValueError("Invalid request type!")
 
     def _send_master_request(self, request: I2cMasterRequest) -> int:
         if not isinstance(request, I2cMasterRequest):
@@ -371,6 +400,7 @@ class I2cInterface:
 
         request.status_code = I2cStatusCode.PENDING
         request.request_id = self.request_id_counter
+        request.completion.clear()
 
         self.master_requests[request.request_id] = request
         self._update_free_space(request)
@@ -387,7 +417,7 @@ class I2cInterface:
         msg.master_request.sequence_idx = 0
 
         msg_bytes = msg.SerializeToString()
-        tf.TF_INSTANCE.send(tf.TfMsgType.TYPE_I2C.value, msg_bytes, 0)
+        self.expander.tf.send(tf.TfMsgType.TYPE_I2C.value, msg_bytes, 0)
         return request.request_id
 
     def _send_slave_request(self, request: I2cSlaveRequest) -> int:
@@ -407,6 +437,7 @@ class I2cInterface:
 
         request.status_code = I2cStatusCode.PENDING
         request.request_id = self.request_id_counter
+        request.completion.clear()
 
         self.slave_requests[request.request_id] = request
         self._update_free_space(request)
@@ -422,9 +453,67 @@ class I2cInterface:
         msg.slave_request.read_addr = request.read_addr
 
         msg_bytes = msg.SerializeToString()
-        tf.TF_INSTANCE.send(tf.TfMsgType.TYPE_I2C.value, msg_bytes, 0)
+        self.expander.tf.send(tf.TfMsgType.TYPE_I2C.value, msg_bytes, 0)
         return request.request_id
 
+    def submit(self, request: I2cMasterRequest | I2cSlaveRequest) -> Future:
+        """Queue a request without waiting for device space. Queued requests are sent in order as soon
+        as the tracked queue/buffer space allows it. The returned future resolves to the completed request.
+        Without the background reader, responses are only received inside wait_all()/as_completed()."""
+        self._check_request_sanity(request)
+        future = Future()
+        with self.expander.lock:
+            if isinstance(request, I2cMasterRequest):
+                self.master_submit_queue.append((request, future))
+            else:
+                self.slave_submit_queue.append((request, future))
+            self._send_submitted_requests()
+        return future
+
+    def _send_submitted_requests(self) -> None:
+        while self.master_submit_queue and self.can_accept_request(self.master_submit_queue[0][0]):
+            request, future = self.master_submit_queue.popleft()
+            self.request_futures[self._send_master_request(request)] = future
+
+        while self.slave_submit_queue and self.can_accept_request(self.slave_submit_queue[0][0]):
+            request, future = self.slave_submit_queue.popleft()
+            self.request_futures[self._send_slave_request(request)] = future
+
+    def cancel(self, future: Future) -> int | None:
+        """Cancel a request returned by submit(). A request not sent yet is removed from the submit queue and its
+        queue position is returned. Returns None if the request has been sent, its response is dropped."""
+        with self.expander.lock:
+            future.cancel()
+            for submit_queue in (self.master_submit_queue, self.slave_submit_queue):
+                for position, (_, queued_future) in enumerate(submit_queue):
+                    if queued_future is future:
+                        del submit_queue[position]
+                        return position
+        return None
+
+    def as_completed(self, futures: Iterable[Future], timeout: float) -> Iterator[Future]:
+        """Yield the futures returned by submit() as their requests complete."""
+        pending = dict.fromkeys(futures)
+        deadline = time.monotonic() + timeout
+        while pending:
+            with self.expander.lock:
+                self.completion_event.clear()
+                complete = [future for future in pending if future.done()]
+
+            for future in complete:
+                del pending[future]
+                yield future
+
+            if not complete and not self.expander.wait_event(self.completion_event, deadline - time.monotonic()):
+                raise TimeoutError("Timeout waiting for %d submitted request(s)!" % len(pending))
+
+    def wait_all(self, futures: Iterable[Future], timeout: float) -> list[I2cMasterRequest | I2cSlaveRequest]:
+        """Wait until all submitted requests are complete, returns them in submission order."""
+        futures = list(futures)
+        for _ in self.as_completed(futures, timeout):
+            pass
+        return [future.result() for future in futures]
+
     def slave_scan(self, addr_range=range(1, 128), address_width=AddressWidth.Bits7) -> list[int]:
         found_devices = []
         for addr in addr_range:
@@ -448,52 +537,47 @@ class I2cInterface:
         if request_id in self.master_requests.keys():
             container = self.master_requests
             request = container[request_id]
-            pending_code = I2cStatusCode.PENDING
         elif request_id in self.slave_requests.keys():
             container = self.slave_requests
             request = container[request_id]
-            pending_code = I2cStatusCode.PENDING
         elif self.config.request_id == request_id:
             container = None
             request = self.config
-            pending_code = I2cConfigStatusCode.PENDING
         else:
             raise ValueError("Unknown request id (id: %d)" % request_id)
 
-        start_time = time.monotonic()
-        while True:
-            self.expander._read_all()
-            if request.status_code != pending_code:
-                break
-            elif time.monotonic() - start_time > timeout:
-                raise TimeoutError("Timeout waiting for response (id: %d)" % request_id)
+        if not self.expander.wait_event(request.completion, timeout):
+            raise TimeoutError("Timeout waiting for response (id: %d)" % request_id)
 
-        if pop_request and container and request_id in container.keys():
-            del container[request_id]
+        with self.expander.lock:
+            if pop_request and container and request_id in container.keys():
+                del container[request_id]
         return request
 
     def wait_for_slave_notification(
         self, access_id: int | None, timeout: float, pop_notification: bool = False
     ) -> I2cSlaveNotification | None:
         notification = None
-        length = 0
-        if access_id is None or access_id < 0:
-            length = len(self.slave_access_notifications)
-
-        start_time = time.monotonic()
-        while True:
-            self.expander._read_all()
-            if (access_id is None or access_id < 0) and len(self.slave_access_notifications) > length:
-                _, notification = next(reversed(self.slave_access_notifications.items()))
-                break
-            elif access_id in self.slave_access_notifications.keys():
-                notification = self.slave_access_notifications[access_id]
-                break
-            elif time.monotonic() - start_time > timeout:
-                break
-
-        if notification is not None and pop_notification:
-            del self.slave_access_notifications[notification.access_id]
+
+        def notification_received() -> bool:
+            if access_id is None or access_id < 0:
+                return len(self.slave_access_notifications) > length
+            return access_id in self.slave_access_notifications.keys()
+
+        with self.expander.lock:
+            length = 0
+            if access_id is None or access_id < 0:
+                length = len(self.slave_access_notifications)
+
+        with self.expander.wait_until(self.notification_event, notification_received, timeout) as received:
+            if received:
+                if access_id is None or access_id < 0:
+                    _, notification = next(reversed(self.slave_access_notifications.items()))
+                else:
+                    notification = self.slave_access_notifications[access_id]
+
+            if notification is not None and pop_notification:
+                del self.slave_access_notifications[notification.access_id]
         return notification
 
     def _receive_msg_cb(self, msg: i2c_pb2.I2cMsg) -> None:
@@ -512,6 +596,7 @@ class I2cInterface:
     def _handle_config_status(self, msg: i2c_pb2.I2cMsg):
         if msg.config_status.request_id == self.config.request_id:
             self.config.status_code = I2cConfigStatusCode(msg.config_status.status_code)
+            self.config.completion.set()
         else:
             raise ValueError("Received config status for unknown request (id: %d)" % msg.config_status.request_id)
 
@@ -520,6 +605,7 @@ class I2cInterface:
             self.master_queue_space = msg.master_status.queue_space
             self.master_buffer_space1 = msg.master_status.buffer_space1
             self.master_buffer_space2 = msg.master_status.buffer_space2
+            self.master_space_event.set()
 
         request_id = msg.master_status.request_id
         if request_id not in self.master_requests.keys():
@@ -527,13 +613,23 @@ class I2cInterface:
 
         self.master_requests[request_id].status_code = I2cStatusCode(msg.master_status.status_code)
         self.master_requests[request_id].read_data = msg.master_status.read_data
-        if self.master_requests[request_id].callback_fn:
+        self.master_requests[request_id].completion.set()
+        future = self.request_futures.pop(request_id, None)
+        if future is not None:
+            request = self.master_requests.pop(request_id)
+            if not future.cancelled():
+                future.set_result(request)
+        elif self.master_requests[request_id].callback_fn:
             request = self.master_requests.pop(request_id)
             request.callback_fn(request)
 
+        self.completion_event.set()
+        self._send_submitted_requests()
+
     def _handle_slave_status(self, msg: i2c_pb2.I2cMsg):
         if msg.sequence_number >= self.sequence_number:
             self.slave_queue_space = msg.slave_status.queue_space
+            self.slave_space_event.set()
 
         request_id = msg.slave_status.request_id
         if request_id not in self.slave_requests.keys():
@@ -541,13 +637,24 @@ class I2cInterface:
 
         self.slave_requests[request_id].status_code = I2cStatusCode(msg.slave_status.status_code)
         self.slave_requests[request_id].read_data = msg.slave_status.read_data
-        if self.slave_requests[request_id].callback_fn:
+        self.slave_requests[request_id].completion.set()
+        future = self.request_futures.pop(request_id, None)
+        if future is not None:
+            request = self.slave_requests.pop(request_id)
+            if not future.cancelled():
+                future.set_result(request)
+        elif self.slave_requests[request_id].callback_fn:
             request = self.slave_requests.pop(request_id)
             request.callback_fn(request)
 
+        self.completion_event.set()
+        self._send_submitted_requests()
+
     def _handle_slave_notification(self, msg: i2c_pb2.I2cMsg):
         if msg.sequence_number >= self.sequence_number:
             self.slave_queue_space = msg.slave_notification.queue_space
+            self.slave_space_event.set()
+            self._send_submitted_requests()
 
         access_id = msg.slave_notification.access_id
 
@@ -562,6 +669,7 @@ class I2cInterface:
             msg.slave_notification.read_data,
         )
         self.slave_access_notifications[notification.access_id] = notification
+        self.notification_event.set()
 
         # print("Notification slave(%d) access (id: %d, w_data: %s (%d), r_data: %s (%d)"
         #      % (self.i2c_id.value, access_id, notification.write_data, len(notification.write_data),
@@ -571,16 +679,16 @@ class I2cInterface:
             self.callback_fn(notification)
 
 
-def _receive_i2c_msg_cb(_, tf_msg: tf.TF.TF_Msg) -> None:
+def _receive_i2c_msg_cb(tf_instance: tf.TF.TinyFrame, tf_msg: tf.TF.TF_Msg) -> None:
     """Receive a I2C message from the USB interface."""
     msg = i2c_pb2.I2cMsg()
     msg.ParseFromString(bytes(tf_msg.data))
 
-    global I2C_INSTANCE
+    i2c_instances = tf_instance.userdata.i2c_instances
     if msg.i2c_id == i2c_pb2.I2cId.I2C0:
-        instance = I2C_INSTANCE[I2cId.I2C0]
+        instance = i2c_instances.get(I2cId.I2C0)
     else:
-        instance = I2C_INSTANCE[I2cId.I2C1]
+        instance = i2c_instances.get(I2cId.I2C1)
 
     if instance is not None:
         instance._receive_msg_cb(msg)
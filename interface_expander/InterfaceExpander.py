@@ -1,79 +1,336 @@
+from __future__ import annotations
+import os
 import time
-
-# import threading
+import queue
+import threading
 import serial.tools.list_ports
+from contextlib import contextmanager
+from typing import Callable
 from interface_expander.tiny_frame import tf_init
 from interface_expander.CtrlInterface import CtrlInterface
 from interface_expander.Singleton import Singleton
 
+# Ports may be given as pySerial URLs, "sim://" connects the simulated expander (see protocol_sim.py)
+serial.protocol_handler_packages.append("interface_expander")
+
 
 class InterfaceExpander(metaclass=Singleton):
     VendorIds = [1155]
     ProductIds = [22288]
     SerialNumbers = ["EXPV1"]
+    ReadTimeout = 0.01  # Upper bound of a blocking read while waiting for responses
+    PortEnvironmentVariable = "INTERFACE_EXPANDER_PORT"  # Default port, e.g. "sim://" to run without hardware
+    TxLatency = 0.0005  # Upper bound a coalesced frame waits in the TX buffer before it is written
+    TxBufferSize = 8192  # Buffered TX bytes at which senders block until the buffer is written
+    _resolved_ports = {}  # Port of each (serial number, default port) selection, see _singleton_key()
 
-    def __init__(self):
+    def __init__(self, serial_number: str | None = None, port: str | None = None):
+        """InterfaceExpander() is the first expander found. Further expanders are selected by serial
+        number or port, e.g. InterfaceExpander(port="COM4"). Selections of the same port return the same instance."""
+        self.serial_number = serial_number
+        self.port = port
         self.serial_port = None
         self.tf = None
-        # self.read_thread = None
-        # self.running = False
+
+        # Interfaces of this expander the received messages are routed to
+        self.ctrl_instance = None
+        self.echo_instance = None
+        self.i2c_instances = {}
+        self.dac_instance = None
+
+        # Guards the request/response state shared between user code and the RX handlers
+        self.lock = threading.RLock()
+        self.rx_queue = queue.Queue()
+        self.rx_error = None
+        self.dispatch_callback = None  # Called by the dispatch thread after every handled message
+
+        self.read_thread = None
+        self.dispatch_thread = None
+        self.running = False
+
+        # Frames are buffered and written together when TX coalescing is enabled
+        self.tx_buffer = bytearray()
+        self.tx_condition = threading.Condition()
+        self.tx_write_lock = threading.Lock()  # Keeps the buffered frames in order on the serial port
+        self.tx_deadline = 0.0
+        self.tx_error = None
+        self.tx_thread = None
+        self.tx_running = False
+        self.tx_frames = 0  # Sent frames and serial port writes, frames per write = tx_frames / tx_writes
+        self.tx_writes = 0
+
+    @staticmethod
+    def _singleton_key(serial_number: str | None = None, port: str | None = None) -> tuple:
+        # The port the selection resolves to, unresolved selections (no device attached yet) are kept apart.
+        # Selections are resolved once, enumerating the serial ports is slow
+        if port is not None:
+            return (port,)
+        selection = (serial_number, os.environ.get(InterfaceExpander.PortEnvironmentVariable))
+        port = InterfaceExpander._resolved_ports.get(selection)
+        if port is None:
+            try:
+                port = InterfaceExpander._get_port_name(serial_number)
+            except Exception:
+                return (serial_number, None)
+            InterfaceExpander._resolved_ports[selection] = port
+        return (port,)
 
     @staticmethod
-    def _get_port_name() -> str:
+    def find_devices() -> list[tuple[str, str]]:
+        """Return (port, serial number) of all attached expanders."""
+        if os.environ.get(InterfaceExpander.PortEnvironmentVariable):
+            return [(os.environ[InterfaceExpander.PortEnvironmentVariable], None)]
+        devices = []
         com_ports = serial.tools.list_ports.comports()
         for com_port in com_ports:
-            if (
-                com_port.vid in InterfaceExpander.VendorIds
-                and com_port.pid in InterfaceExpander.ProductIds
-                and com_port.serial_number in InterfaceExpander.SerialNumbers
-            ):
-                return com_port.device
+            if com_port.vid in InterfaceExpander.VendorIds and com_port.pid in InterfaceExpander.ProductIds:
+                devices.append((com_port.device, com_port.serial_number))
+        return sorted(devices)
+
+    @staticmethod
+    def connect_all(background_reader: bool = True) -> dict[str, InterfaceExpander]:
+        """Connect all attached expanders. Returns the expanders by port."""
+        expanders = {}
+        for port, _ in InterfaceExpander.find_devices():
+            expander = InterfaceExpander(port=port)
+            expander.connect(background_reader=background_reader)
+            expanders[port] = expander
+        return expanders
+
+    @staticmethod
+    def _get_port_name(serial_number: str | None = None) -> str:
+        if serial_number is None and os.environ.get(InterfaceExpander.PortEnvironmentVariable):
+            return os.environ[InterfaceExpander.PortEnvironmentVariable]
+        for port, port_serial_number in InterfaceExpander.find_devices():
+            if serial_number is None and port_serial_number in InterfaceExpander.SerialNumbers:
+                return port
+            if serial_number is not None and port_serial_number == serial_number:
+                return port
         raise Exception("No valid Serial Port found!")
 
     @staticmethod
-    def _get_serial_port():
-        port = serial.Serial(InterfaceExpander._get_port_name(), baudrate=115200, timeout=1.0)
+    def _get_serial_port(port_name: str):
+        port = serial.serial_for_url(port_name, baudrate=115200, timeout=InterfaceExpander.ReadTimeout)
         return port
 
-    def connect(self):
+    def connect(self, background_reader: bool = False, coalesce_tx: bool = False):
+        """Open the serial port. With background_reader=True a dedicated thread receives and
+        dispatches all messages, so responses are processed even while user code is busy.
+        With coalesce_tx=True sent frames are collected and written together, at the latest after
+        TxLatency seconds or when waiting for a response (see flush())."""
         if self.serial_port and self.serial_port.isOpen():
             return
-        self.serial_port = self._get_serial_port()
-        self.tf = tf_init(self.serial_port.write)
+        self.serial_port = self._get_serial_port(self.port or self._get_port_name(self.serial_number))
+        self.tf = tf_init(self._write, self)
+        self.tx_frames = 0
+        self.tx_writes = 0
 
-        # self.running = True
-        # self.read_thread = threading.Thread(target=self._read_loop)
-        # self.read_thread.daemon = True
-        # self.read_thread.start()
+        if coalesce_tx:
+            self._start_writer()
+        if background_reader:
+            self._start_reader()
 
     def disconnect(self):
-        # self.running = False
-        # if self.read_thread:
-        #    self.read_thread.join()
-        #    self.read_thread = None
+        self._stop_reader()
+        self._stop_writer()
 
         if self.serial_port and self.serial_port.isOpen():
             self.serial_port.close()
         self.serial_port = None
         self.tf = None
 
-    def reset(self, wait_sec=3):
+    def reset(self, wait_sec: float | None = None):
+        """Restart the expander and wait until it is back. The wait defaults to the reset time of
+        the port (simulated expanders restart instantly) or 3 seconds."""
         self.connect()
-        # self.running = False
-        CtrlInterface()._send_system_reset()
+        self._stop_reader()
+        if wait_sec is None:
+            wait_sec = getattr(self.serial_port, "reset_time", 3)
+        CtrlInterface(self)._send_system_reset()
         self.disconnect()
         time.sleep(wait_sec)
 
+    def flush(self):
+        """Write the buffered frames now (only buffered with TX coalescing)."""
+        with self.tx_write_lock:
+            with self.tx_condition:
+                data = bytes(self.tx_buffer)
+                self.tx_buffer.clear()
+                self.tx_condition.notify_all()
+            if data:
+                self.serial_port.write(data)
+                self.tx_writes += 1
+        self._raise_tx_error()
+
+    def wait_event(self, event: threading.Event, timeout: float) -> bool:
+        """Wait until an RX handler sets the event. Returns False on timeout."""
+        if self.running:
+            self.flush()
+            result = event.wait(max(timeout, 0.0))
+            self._raise_rx_error()
+            return result
+
+        deadline = time.monotonic() + timeout
+        while not event.is_set():
+            if time.monotonic() >= deadline:
+                return False
+            self.flush()  # Requests sent by the RX handlers
+            self._read_blocking()
+        return True
+
+    @contextmanager
+    def wait_until(self, event: threading.Event, predicate: Callable[[], bool], timeout: float):
+        """Wait until predicate() is true, re-checking it whenever an RX handler sets the event.
+        Yields the predicate result (False on timeout) with self.lock held, so the caller can act on it
+        atomically. Must not be called with self.lock already held."""
+        deadline = time.monotonic() + timeout
+        self.lock.acquire()
+        try:
+            while True:
+                event.clear()
+                if predicate():
+                    break
+                self.lock.release()
+                try:
+                    received = self.wait_event(event, deadline - time.monotonic())
+                finally:
+                    self.lock.acquire()
+                if not received:
+                    break
+            yield predicate()
+        finally:
+            self.lock.release()
+
     def _read_all(self):
+        if self.running:
+            return  # The read thread owns the serial port
         if self.serial_port.in_waiting > 0:
             rx_data = self.serial_port.read(self.serial_port.in_waiting)
             self.tf.accept(rx_data)
 
-    """
+    def _read_blocking(self):
+        # Blocks until data arrives or the port timeout expires (instead of spinning on in_waiting)
+        rx_data = self.serial_port.read(max(1, self.serial_port.in_waiting))
+        if rx_data:
+            self.tf.accept(rx_data)
+
+    def _write(self, data: bytes):
+        if not self.tx_running:
+            self.serial_port.write(data)
+            self.tx_frames += 1
+            self.tx_writes += 1
+            return
+
+        with self.tx_condition:
+            # Backpressure: block while the writer thread has not caught up
+            while len(self.tx_buffer) >= InterfaceExpander.TxBufferSize and self.tx_running:
+                self.tx_condition.notify_all()
+                self.tx_condition.wait()
+            if not self.tx_buffer:
+                self.tx_deadline = time.monotonic() + InterfaceExpander.TxLatency
+                self.tx_condition.notify_all()
+            self.tx_buffer += data
+            self.tx_frames += 1
+            writer_stopped = not self.tx_running
+            if len(self.tx_buffer) >= InterfaceExpander.TxBufferSize:
+                self.tx_condition.notify_all()
+        if writer_stopped:
+            self.flush()  # The writer stopped while this sender was blocked, its final flush may be over
+
+    def _start_writer(self):
+        self.tx_buffer = bytearray()
+        self.tx_error = None
+        self.tx_running = True
+        self.tx_thread = threading.Thread(target=self._write_loop, name="expander-tx", daemon=True)
+        self.tx_thread.start()
+
+    def _stop_writer(self):
+        if not self.tx_running:
+            return
+        with self.tx_condition:
+            self.tx_running = False
+            self.tx_condition.notify_all()
+        self.tx_thread.join()
+        self.tx_thread = None
+        self.flush()
+
+    def _write_loop(self):
+        while True:
+            with self.tx_condition:
+                while self.tx_running and not self.tx_buffer:
+                    self.tx_condition.wait()
+                if not self.tx_running:
+                    break
+                # Collect further frames until the latency budget of the first one is used up
+                while self.tx_running and 0 < len(self.tx_buffer) < InterfaceExpander.TxBufferSize:
+                    remaining = self.tx_deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self.tx_condition.wait(remaining)
+            try:
+                self.flush()
+            except (serial.SerialException, OSError) as e:
+                self.tx_error = e
+
+    def _raise_tx_error(self):
+        if self.tx_error is not None:
+            error = self.tx_error
+            self.tx_error = None
+            raise error
+
+    def _start_reader(self):
+        self.rx_queue = queue.Queue()
+        self.rx_error = None
+        self.tf.frame_sink = self.rx_queue.put
+        self.running = True
+
+        self.read_thread = threading.Thread(target=self._read_loop, name="expander-rx", daemon=True)
+        self.dispatch_thread = threading.Thread(target=self._dispatch_loop, name="expander-dispatch", daemon=True)
+        self.dispatch_thread.start()
+        self.read_thread.start()
+
+    def _stop_reader(self):
+        if not self.running:
+            return
+        self.running = False
+        self.serial_port.cancel_read()
+
+        self.read_thread.join()
+        self.dispatch_thread.join()
+        self.read_thread = None
+        self.dispatch_thread = None
+        self.tf.frame_sink = None
+
     def _read_loop(self):
-        while self.running and self.serial_port and self.serial_port.isOpen():
-            if self.serial_port.in_waiting > 0:
-                rx_data = self.serial_port.read(self.serial_port.in_waiting)
+        while self.running:
+            try:
+                # Blocks until data arrives (or the port timeout expires)
+                rx_data = self.serial_port.read(max(1, self.serial_port.in_waiting))
+            except (serial.SerialException, OSError) as e:
+                if self.running:
+                    self.rx_error = e
+                break
+            if rx_data:
                 self.tf.accept(rx_data)
-            time.sleep(0.001)
-    """
+        self.rx_queue.put(None)  # Stop the dispatcher
+
+    def _dispatch_loop(self):
+        while True:
+            frame = self.rx_queue.get()
+            if frame is None:
+                break
+            with self.lock:
+                try:
+                    self.tf.handle_rx_frame(frame)
+                    if self.rx_queue.empty():
+                        self.flush()  # Requests sent by the handlers of the received burst
+                except Exception as e:
+                    self.rx_error = e
+            if self.dispatch_callback is not None:
+                self.dispatch_callback()
+
+    def _raise_rx_error(self):
+        if self.rx_error is not None:
+            error = self.rx_error
+            self.rx_error = None
+            raise error
@@ -0,0 +1,71 @@
+from __future__ import annotations
+from bisect import bisect_left, bisect_right
+from typing import Iterator
+
+
+class IntervalSet:
+    """Sorted set of non-overlapping [start, end) intervals, overlapping and adjacent intervals are merged."""
+
+    def __init__(self):
+        self.starts = []
+        self.ends = []
+
+    def add(self, start: int, end: int) -> None:
+        if start >= end:
+            return
+
+        # Intervals ending at or after start and starting at or before end are merged with the new interval
+        first = bisect_left(self.ends, start)
+        last = bisect_right(self.starts, end)
+        if first < last:
+            start = min(start, self.starts[first])
+            end = max(end, self.ends[last - 1])
+        self.starts[first:last] = [start]
+        self.ends[first:last] = [end]
+
+    def remove(self, start: int, end: int) -> None:
+        if start >= end:
+            return
+
+        # Intervals overlapping [start, end) are cut, their parts outside of it are kept
+        first = bisect_right(self.ends, start)
+        last = bisect_left(self.starts, end)
+        if first >= last:
+            return
+        starts = []
+        ends = []
+        if self.starts[first] < start:
+            starts.append(self.starts[first])
+            ends.append(start)
+        if self.ends[last - 1] > end:
+            starts.append(end)
+            ends.append(self.ends[last - 1])
+        self.starts[first:last] = starts
+        self.ends[first:last] = ends
+
+    def gaps(self, start: int, end: int) -> list[tuple[int, int]]:
+        """Return the parts of [start, end) not covered by the set."""
+        gaps = []
+        position = start
+        i = bisect_right(self.ends, start)
+        while i < len(self.starts) and self.starts[i] < end:
+            if self.starts[i] > position:
+                gaps.append((position, self.starts[i]))
+            position = max(position, self.ends[i])
+            i += 1
+        if position < end:
+            gaps.append((position, end))
+        return gaps
+
+    def clear(self) -> None:
+        self.starts.clear()
+        self.ends.clear()
+
+    def __iter__(self) -> Iterator[tuple[int, int]]:
+        return zip(self.starts, self.ends)
+
+    def __len__(self) -> int:
+        return len(self.starts)
+
+    def __bool__(self) -> bool:
+        return bool(self.starts)
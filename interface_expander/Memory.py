@@ -1,3 +1,4 @@
+from __future__ import annotations
 from interface_expander.I2cInterface import (
     I2cInterface,
     I2cMasterRequest,
@@ -5,9 +6,34 @@ from interface_expander.I2cInterface import (
     I2C_MAX_READ_SIZE,
     I2C_MAX_WRITE_SIZE,
 )
+from interface_expander.IntervalSet import IntervalSet
+from interface_expander.SparseBuffer import SparseBuffer
 from intelhex import IntelHex
+from concurrent.futures import Future, ThreadPoolExecutor
+from collections import deque
+from typing import Callable, Generator, NamedTuple, Sequence
 from enum import Enum
+import functools
+import hashlib
 import math
+import mmap
+import io
+import os
+import threading
+import time
+
+MEMORY_MAX_WRITE_RETRIES = 42  # Write attempts while the memory is busy (does not acknowledge)
+MEMORY_MAX_READ_RETRIES = 10  # Read attempts while the memory is busy (does not acknowledge)
+MEMORY_REQUEST_TIMEOUT = 0.1  # Response timeout per request in seconds
+MEMORY_WRITE_CYCLE_TIMEOUT = 0.1  # Upper bound of an EEPROM write cycle in seconds
+MEMORY_HEX_CHUNK_SIZE = 4096  # Bytes read from memory per block of hex records
+MEMORY_MERGE_GAP = 16  # Bytes, closer ranges are transferred by one request (cheaper than another transaction)
+MEMORY_VERIFY_WINDOW = 32  # Read requests in flight while verifying
+MEMORY_BIN_CHUNK_SIZE = 4096  # Bytes per chunk of binary file transfers (rounded up to whole pages)
+MEMORY_PLAN_CACHE_SIZE = 1024  # Memoized transaction plans per memory
+MEMORY_PREFETCH_READAHEAD = 2  # Sequential reads requested ahead (in read lengths) before the depth ramps up
+MEMORY_WRITE_BACK_DELAY = 0.01  # Write-back starts after this time without further writes (seconds)
+MEMORY_WRITE_BACK_WINDOW = 0.1  # Upper bound of collecting writes after the first one before writing back (seconds)
 
 
 class MemoryType(Enum):
@@ -23,6 +49,36 @@ class MemoryAddressWidth(Enum):
     FOUR_BYTES = 4
 
 
+class MemoryOperation(Enum):
+    READ = 0
+    WRITE = 1
+
+
+def _exclusive(method: Callable) -> Callable:
+    # Memory operations are not interleaved with the flushes of the write-back worker
+    @functools.wraps(method)
+    def wrapper(self: Memory, *args, **kwargs):
+        with self.io_lock:
+            return method(self, *args, **kwargs)
+
+    return wrapper
+
+
+class MemoryTransaction(NamedTuple):
+    """One I2C request of a plan, slave_addr includes the address bits packed into the slave address."""
+
+    address: int
+    length: int
+    slave_addr: int
+    address_bytes: bytes
+
+    def read_request(self) -> I2cMasterRequest:
+        return I2cMasterRequest(slave_addr=self.slave_addr, write_data=self.address_bytes, read_size=self.length)
+
+    def write_request(self, data: bytes) -> I2cMasterRequest:
+        return I2cMasterRequest(slave_addr=self.slave_addr, write_data=self.address_bytes + data, read_size=0)
+
+
 class Memory:
     def __init__(
         self,
@@ -32,7 +88,18 @@ class Memory:
         address_width: MemoryAddressWidth,
         page_count: int,
         page_size: int,
+        read_cache: bool = False,
+        buffer_file: str | None = None,
+        sparse_buffer: bool = False,
+        prefetch_depth: int = 0,
     ):
+        """With read_cache=True, ranges that have been read or flushed are served from the buffer
+        until invalidate() is called (only enable it if no other master modifies the memory).
+        The buffer is held in RAM unless it is mapped to buffer_file (an image of the whole memory, kept after close())
+        or sparse_buffer=True (only pages that have been written or read take memory).
+        With prefetch_depth > 0, sequential read() calls are detected and up to prefetch_depth read requests
+        are issued ahead of them. The depth ramps up while the reads stay sequential, prefetch_hits/prefetch_misses
+        count the reads served from prefetched data or not."""
         self.interface = interface
         self.slave_address = slave_address
         self.memory_type = memory_type
@@ -46,186 +113,909 @@ class Memory:
         if self.memory_size.bit_length() > self.address_width.value * 8:
             # Use address bit(s) in slave address byte
             self.additional_address_bits = (self.memory_size - 1).bit_length() - self.address_width.value * 8
-
-        self.buffer = bytearray(self.memory_size)
-        self.updated_sections = []
-
-    def _pack_slave_address(self, address: int) -> int:
-        # Pack the additional address bits into the slave address byte (used by some FRAMs/EEPROMs)
+        # plan(address, length, operation) returns the transactions of an operation, repeated layouts are memoized
+        # (call plan.cache_clear() after changing the slave address or geometry)
+        self.plan = functools.lru_cache(maxsize=MEMORY_PLAN_CACHE_SIZE)(self._create_plan)
+
+        self.buffer_file = buffer_file
+        if buffer_file is not None and sparse_buffer:
+            raise ValueError("Use either a buffer file or a sparse buffer!")
+        elif buffer_file is not None:
+            self.buffer = self._map_buffer_file(buffer_file)
+        elif sparse_buffer:
+            self.buffer = SparseBuffer(self.memory_size)
+        else:
+            self.buffer = bytearray(self.memory_size)
+        self.updated_sections = IntervalSet()  # Written but not yet flushed ranges
+        self.read_cache = read_cache
+        self.valid_sections = IntervalSet()  # Ranges of the buffer known to match the memory (read cache)
+        self.page_digests = {}  # Page index -> digest of the memory content (read cache, used by differential flush)
+        self.write_cycle_time = 0.0  # Learned EEPROM write cycle time, the next write is sent after it
+        self.write_cycle_start = None  # Start of the pending EEPROM write cycle
+
+        self.prefetch_depth = prefetch_depth  # Maximum read requests issued ahead of sequential reads (0: disabled)
+        self.prefetch_window = 1  # Current depth, adapts to the consumption rate
+        self.prefetch_queue = deque()  # (transaction, future) of the requests issued ahead, contiguous
+        self.prefetch_next = None  # Expected address of the next sequential read
+        self.prefetch_ready = 0  # Prefetched data from prefetch_next up to this address is in the buffer
+        self.prefetch_stale = False  # Written to the prefetched range, dropped by the next read
+        self.prefetch_hits = 0
+        self.prefetch_misses = 0
+
+        self.io_lock = threading.RLock()  # Held by memory operations and by each flush of the write-back worker
+        self.write_back_condition = threading.Condition()  # Guards the updated sections against the worker
+        self.write_back_running = False
+        self.write_back_thread = None
+        self.write_back_error = None  # Error of a failed background flush, raised by the next call
+        self.write_back_delay = MEMORY_WRITE_BACK_DELAY
+        self.write_back_window = MEMORY_WRITE_BACK_WINDOW
+        self.first_write_time = 0.0  # First and last write() since the updated sections were empty
+        self.last_write_time = 0.0
+
+    def _map_buffer_file(self, file_path: str) -> mmap.mmap:
+        # Extend the file to the memory size (sparse on most file systems) and map it
+        with open(file_path, "r+b" if os.path.exists(file_path) else "w+b") as file:
+            if os.fstat(file.fileno()).st_size < self.memory_size:
+                file.truncate(self.memory_size)
+            return mmap.mmap(file.fileno(), self.memory_size)
+
+    def close(self) -> None:
+        # Stop the write-back worker, receive the prefetch responses still in flight,
+        # write a mapped buffer back to its file and release it
+        self.stop_write_back()
+        self._cancel_prefetch()
+        if isinstance(self.buffer, mmap.mmap) and not self.buffer.closed:
+            self.buffer.flush()
+            self.buffer.close()
+
+    def _pack_slave_address(self, address: int) -> tuple[int, int]:
+        # Pack the additional address bits into the slave address byte (used by some FRAMs/EEPROMs),
+        # returns the slave address and the address without the additional bits
         if self.additional_address_bits == 0:
-            return address
+            return self.slave_address, address
 
         additional_address = address >> (self.address_width.value * 8)
         if additional_address.bit_length() > self.additional_address_bits:
             raise ValueError(f"Address {address} exceeds the maximum allowed with additional address bits!")
 
         slave_mask = ~((1 << self.additional_address_bits) - 1)
-        new_address = (self.slave_address & slave_mask) | additional_address
-        self.slave_address = new_address
+        slave_address = (self.slave_address & slave_mask) | additional_address
 
         max_value = (1 << (self.address_width.value * 8)) - 1
         masked_address = address & max_value
-        return masked_address  # Does not exceed the address width (additional bits are packed into the slave address)
+        return slave_address, masked_address  # Does not exceed the address width
 
-    def _unpack_slave_address(self, masked_address: int) -> int:
-        # Unpack the additional address bits from the slave address byte
-        if self.additional_address_bits == 0:
-            return masked_address
-
-        address_mask = (1 << self.additional_address_bits) - 1
-        additional_address = (self.slave_address & address_mask) << (self.address_width.value * 8)
-        address = masked_address | additional_address
-        return address  # Restores the full address including additional bits
-
-    def _wait_for_completion(self, request_ids: list[int], recursion: int = 0) -> None:
-        max_repetitions = 10  # Maximum number of retries for read requests
-        failed_requests = []
-
-        for rid in request_ids:
-            response = self.interface.wait_for_response(request_id=rid, timeout=0.1, pop_request=True)
-            if response.status_code == I2cStatusCode.SLAVE_NO_ACK and recursion < max_repetitions:
-                failed_requests.append(response)
-            elif response.status_code == I2cStatusCode.SUCCESS:
-                if response.read_data:
-                    # Update the buffer with the read data
-                    masked_address = int.from_bytes(response.write_data[: self.address_width.value], "big")
-                    address = self._unpack_slave_address(masked_address)
-                    self.buffer[address : address + len(response.read_data)] = response.read_data
-            else:
-                raise ValueError(f"Request {rid} failed with status: {response.status_code}")
-        request_ids.clear()
-
-        # Retry any requests that failed due to no ACK
-        for request in failed_requests:
-            rid = self.interface.send_request(request=request)
-            request_ids.append(rid)
-
-        if failed_requests:
-            self._wait_for_completion(request_ids, recursion + 1)
-
-    def read(self, address: int, length: int) -> bytes:
+    def _check_read_range(self, address: int, length: int) -> int:
         if length == -1:
             length = self.memory_size - address
         if length < 0 or address < 0 or address + length > self.memory_size:
             raise ValueError("Invalid address or length for read operation!")
-
-        request_count = math.ceil(length / I2C_MAX_READ_SIZE)
-        pending_rids = []
-        for i in range(request_count):
-            offset = i * I2C_MAX_READ_SIZE
-            current_address = address + offset
-            read_length = min(I2C_MAX_READ_SIZE, length - offset)
-
-            masked_addr = self._pack_slave_address(current_address)
-            address_bytes = masked_addr.to_bytes(self.address_width.value, "big")
-
-            request = I2cMasterRequest(slave_addr=self.slave_address, write_data=address_bytes, read_size=read_length)
-            rid = self.interface.send_request(request=request)
-            pending_rids.append(rid)
-
-        self._wait_for_completion(pending_rids)
+        return length
+
+    def _chunks(self, address: int, length: int, operation: MemoryOperation) -> list[tuple[int, int]]:
+        # Split the range into (address, length) chunks of one request each. No request crosses a bank boundary
+        # (address bits in the slave address), writes do not cross a page boundary either
+        if operation == MemoryOperation.READ:
+            max_length = I2C_MAX_READ_SIZE
+        else:
+            max_length = I2C_MAX_WRITE_SIZE - self.address_width.value
+        bank_size = 1 << (self.address_width.value * 8)
+
+        chunks = []
+        end = address + length
+        while address < end:
+            chunk_end = min(end, address + max_length)
+            if self.additional_address_bits:
+                chunk_end = min(chunk_end, (address // bank_size + 1) * bank_size)
+            if operation == MemoryOperation.WRITE:
+                chunk_end = min(chunk_end, (address // self.page_size + 1) * self.page_size)
+            chunks.append((address, chunk_end - address))
+            address = chunk_end
+        return chunks
+
+    def _create_plan(self, address: int, length: int, operation: MemoryOperation) -> tuple[MemoryTransaction, ...]:
+        transactions = []
+        for chunk_address, chunk_length in self._chunks(address, length, operation):
+            slave_addr, masked_address = self._pack_slave_address(chunk_address)
+            address_bytes = masked_address.to_bytes(self.address_width.value, "big")
+            transactions.append(MemoryTransaction(chunk_address, chunk_length, slave_addr, address_bytes))
+        return tuple(transactions)
+
+    def _create_read_requests(self, address: int, length: int) -> list[I2cMasterRequest]:
+        return [transaction.read_request() for transaction in self.plan(address, length, MemoryOperation.READ)]
+
+    def _uncached_sections(self, address: int, length: int) -> list[tuple[int, int]]:
+        # Sections that have to be read from the memory
+        if not self.read_cache:
+            return [(address, address + length)]
+        sections = []
+        for gap_start, gap_end in self.valid_sections.gaps(address, address + length):
+            sections.extend(self.updated_sections.gaps(gap_start, gap_end))  # Keep data not flushed yet
+        return sections
+
+    @_exclusive
+    def read(self, address: int, length: int) -> bytes:
+        length = self._check_read_range(address, length)
+        self._read_range(address, length)
         return bytes(self.buffer[address : address + length])
 
+    @_exclusive
+    def readinto(self, address: int, b) -> int:
+        """Read into the writable buffer b from address up to the end of the memory, returns the number of bytes
+        read. Data written but not flushed yet is taken from the buffer (it is not overwritten)."""
+        start = min(address, self.memory_size)
+        end = min(start + memoryview(b).nbytes, self.memory_size)
+        for gap_start, gap_end in self.updated_sections.gaps(start, end):
+            self._read_range(gap_start, gap_end - gap_start)
+        memoryview(b).cast("B")[: end - start] = self._buffer_view(start, end)
+        return end - start
+
+    def _read_range(self, address: int, length: int) -> None:
+        self._check_write_back()
+        if self.prefetch_depth > 0:
+            self._read_prefetched(address, length)
+        else:
+            self._read_to_buffer(address, length)
+
+    def _read_to_buffer(self, address: int, length: int) -> None:
+        steps = self._plan_read(address, length)
+        try:
+            steps.send(self._run_read_plan(next(steps)))
+        except StopIteration:
+            pass
+
+    def _plan_read(self, address: int, length: int) -> Generator[list[MemoryTransaction], list[bytes], None]:
+        # Shared by the sync and async read: yields the transactions reading the uncached sections of the range (to
+        # be run by the caller and their data sent in), stores the data in the buffer
+        transactions = self._buffer_read_plan(address, length)
+        self._store_read_data(transactions, (yield transactions))
+        self._mark_valid(address, address + length)
+
+    def _buffer_read_plan(self, address: int, length: int) -> list[MemoryTransaction]:
+        # Transactions reading the uncached sections of the range into the buffer
+        transactions = []
+        for section_start, section_end in self._uncached_sections(address, length):
+            transactions.extend(self.plan(section_start, section_end - section_start, MemoryOperation.READ))
+        return transactions
+
+    def _store_read_data(self, transactions: Sequence[MemoryTransaction], read_data: list[bytes]) -> None:
+        for transaction, data in zip(transactions, read_data):
+            self.buffer[transaction.address : transaction.address + transaction.length] = data
+
+    def _read_prefetched(self, address: int, length: int) -> None:
+        if self.prefetch_stale:
+            self._cancel_prefetch()
+        end = address + length
+        if address == self.prefetch_next:
+            ready = max(self.prefetch_ready, address)
+            # Read lengths grow the window, the next reads are requested before they are needed
+            readahead = math.ceil(MEMORY_PREFETCH_READAHEAD * length / I2C_MAX_READ_SIZE)
+            self.prefetch_window = min(self.prefetch_depth, max(2 * self.prefetch_window, readahead))
+        else:
+            self._cancel_prefetch()  # Random access, the requests issued ahead are not used
+            self.prefetch_window = 1
+            ready = address
+
+        while ready < end and self.prefetch_queue:
+            transaction, future = self.prefetch_queue.popleft()
+            data = self._prefetch_result(transaction, future)
+            for section_start, section_end in self._uncached_sections(transaction.address, transaction.length):
+                offset = section_start - transaction.address
+                self.buffer[section_start:section_end] = data[offset : offset + section_end - section_start]
+            ready = transaction.address + transaction.length
+
+        if ready >= end:
+            self.prefetch_hits += 1
+            self._mark_valid(address, end)
+        else:
+            self.prefetch_misses += 1
+            self._mark_valid(address, ready)
+            self._read_to_buffer(ready, end - ready)
+            ready = end
+        self.prefetch_next = end
+        self.prefetch_ready = ready
+        self._issue_prefetch()
+
+    def _issue_prefetch(self) -> None:
+        # Keep prefetch_window requests in flight behind the data already received
+        if self.prefetch_queue:
+            address = self.prefetch_queue[-1][0].address + self.prefetch_queue[-1][0].length
+        else:
+            address = self.prefetch_ready
+        while len(self.prefetch_queue) < self.prefetch_window and address < self.memory_size:
+            length = min(I2C_MAX_READ_SIZE, self.memory_size - address)
+            transaction = self.plan(address, length, MemoryOperation.READ)[0]
+            self.prefetch_queue.append((transaction, self.interface.submit(transaction.read_request())))
+            address += transaction.length
+
+    def _prefetch_result(self, transaction: MemoryTransaction, future: Future) -> bytes:
+        for _ in self.interface.as_completed([future], timeout=MEMORY_REQUEST_TIMEOUT * (len(self.prefetch_queue) + 1)):
+            pass
+        data = self._read_response_data(future.result())
+        if data is None:
+            return self._run_read_plan([transaction])[0]  # Busy (EEPROM write cycle), read again
+        return data
+
+    def _cancel_prefetch(self) -> None:
+        # Wait for the requests in flight (their responses would arrive after the next requests), drop the data
+        futures = [future for _, future in self.prefetch_queue]
+        for _ in self.interface.as_completed(futures, timeout=MEMORY_REQUEST_TIMEOUT * len(futures)):
+            pass
+        self.prefetch_queue.clear()
+        self.prefetch_next = None
+        self.prefetch_ready = 0
+        self.prefetch_stale = False
+
+    def _prefetch_overlaps(self, section_start: int, section_end: int) -> bool:
+        if self.prefetch_next is None or self.prefetch_stale:
+            return False
+        if self.prefetch_queue:
+            prefetch_end = self.prefetch_queue[-1][0].address + self.prefetch_queue[-1][0].length
+        else:
+            prefetch_end = self.prefetch_ready
+        return section_start < prefetch_end and section_end > self.prefetch_next
+
+    def _mark_valid(self, section_start: int, section_end: int) -> None:
+        # The buffer matches the memory in the section, remember the digests of complete and unchanged pages
+        if not self.read_cache:
+            return
+        self.valid_sections.add(section_start, section_end)
+        for page in range(section_start // self.page_size, math.ceil(section_end / self.page_size)):
+            page_start = page * self.page_size
+            page_end = page_start + self.page_size
+            if not self.valid_sections.gaps(page_start, page_end) and not self._is_updated(page_start, page_end):
+                self.page_digests[page] = self._page_digest(page)
+
+    def _is_updated(self, section_start: int, section_end: int) -> bool:
+        return self.updated_sections.gaps(section_start, section_end) != [(section_start, section_end)]
+
+    def _page_digest(self, page: int) -> bytes:
+        page_start = page * self.page_size
+        return hashlib.blake2b(self.buffer[page_start : page_start + self.page_size], digest_size=16).digest()
+
+    @_exclusive
+    def readv(self, ranges: list[tuple[int, int]]) -> list[bytes]:
+        """Read several (address, length) ranges with one pipelined set of requests, returns the data in request
+        order. Ranges closer than MEMORY_MERGE_GAP bytes are read by the same requests."""
+        ranges = [(address, self._check_read_range(address, length)) for address, length in ranges]
+        sections = IntervalSet()
+        for address, length in ranges:
+            sections.add(address, address + length)
+
+        # Gaps with data not flushed yet are not read (it would be overwritten)
+        merged_sections = self._merge_close_sections(
+            list(sections), lambda gap_start, gap_end: not self._is_updated(gap_start, gap_end)
+        )
+        read_sections = []
+        for section_start, section_end in merged_sections:
+            read_sections.extend(self._uncached_sections(section_start, section_end - section_start))
+        for (section_start, section_end), data in zip(read_sections, self._read_back(read_sections)):
+            self.buffer[section_start:section_end] = data
+
+        for section_start, section_end in merged_sections:
+            self._mark_valid(section_start, section_end)
+        return [bytes(self.buffer[address : address + length]) for address, length in ranges]
+
+    @staticmethod
+    def _merge_close_sections(
+        sections: list[tuple[int, int]], can_merge: Callable[[int, int], bool]
+    ) -> list[tuple[int, int]]:
+        # Merge sorted sections separated by less than MEMORY_MERGE_GAP bytes if can_merge(gap start, gap end)
+        merged_sections = []
+        for section_start, section_end in sections:
+            if merged_sections:
+                previous_start, previous_end = merged_sections[-1]
+                if section_start - previous_end < MEMORY_MERGE_GAP and can_merge(previous_end, section_start):
+                    merged_sections[-1] = (previous_start, section_end)
+                    continue
+            merged_sections.append((section_start, section_end))
+        return merged_sections
+
+    @_exclusive
+    def invalidate(self, address: int = 0, length: int = -1) -> None:
+        """Drop the range from the read cache, e.g. after another master has written to the memory."""
+        length = self._check_read_range(address, length)
+        self.valid_sections.remove(address, address + length)
+        if self._prefetch_overlaps(address, address + length):
+            self._cancel_prefetch()
+        for page in range(address // self.page_size, math.ceil((address + length) / self.page_size)):
+            self.page_digests.pop(page, None)
+
     def write(self, address: int, data: bytes) -> None:
+        """Update the buffer, the data is sent by the next flush (or the write-back worker).
+        The error of a failed write-back is raised after the data has been buffered, it is written by the next
+        flush together with the data of the failed write-back."""
         if address < 0 or address + len(data) > self.memory_size:
             raise ValueError("Invalid address or data length for write operation!")
 
-        self.buffer[address : address + len(data)] = data
+        if self._prefetch_overlaps(address, address + len(data)):
+            # The prefetched data would be outdated after the next flush. The requests in flight are received by the
+            # next read (write() does not wait for a write-back in progress on the interface)
+            self.prefetch_stale = True
+        with self.write_back_condition:
+            now = time.monotonic()
+            if not self.updated_sections:
+                self.first_write_time = now
+            self.last_write_time = now
+            self.buffer[address : address + len(data)] = data
+            self.updated_sections.add(address, address + len(data))
+            self.write_back_condition.notify_all()
+            self._raise_write_back_error()
+
+    @_exclusive
+    def writev(self, writes: list[tuple[int, bytes]], verify: bool = False) -> tuple[int, int]:
+        """Write several (address, data) ranges and flush them with one pipelined set of requests, see flush().
+        Ranges closer than MEMORY_MERGE_GAP bytes are written by the same requests if the gap content is known
+        (read cache)."""
+        for address, data in writes:
+            self.write(address, data)
 
-        section_start = address
-        section_end = address + len(data)
-        for i, section in enumerate(self.updated_sections):
-            start, end = section
-            if start <= section_start and section_end <= end:  # Contained within existing section
-                return
-            elif section_start <= start and section_end >= end:  # Wraps entire section
-                del self.updated_sections[i]
-            elif start <= section_start <= end:  # Overlaps with start of existing section (or follows directly)
-                del self.updated_sections[i]
-                section_start = start
-            elif start <= section_end <= end:  # Overlaps with end of existing section (or precedes directly)
-                del self.updated_sections[i]
-                section_end = end
-            else:
-                continue
+        # Rewriting a gap with the memory content is cheaper than another transaction
+        for section_start, section_end in self._merge_close_sections(list(self.updated_sections), self._is_known):
+            self.updated_sections.add(section_start, section_end)
+        return self.flush(verify=verify)
+
+    def _is_known(self, section_start: int, section_end: int) -> bool:
+        # Every byte of the section is either valid (read cache) or updated
+        return all(
+            not self.updated_sections.gaps(gap_start, gap_end)
+            for gap_start, gap_end in self.valid_sections.gaps(section_start, section_end)
+        )
+
+    @_exclusive
+    def flush(self, differential: bool = False, verify: bool = False) -> tuple[int, int]:
+        """Write the updated sections to the memory, returns the number of pages written and skipped.
+        With differential=True only pages whose content differs from the memory are written. The memory
+        content is known from the page digests (read cache) or read back before writing.
+        With verify=True the written sections are read back and compared, on a mismatch a ValueError is raised
+        and the sections stay updated (the next flush writes them again).
+        The error of a failed write-back is raised first, its sections are written by the next flush."""
+        self._check_write_back()
+        sections, requests, pages_skipped = self._prepare_flush(differential)
+        self._send_flush_requests(requests)
+        return self._finish_flush(sections, requests, pages_skipped, verify)
+
+    def _send_flush_requests(self, requests: list[I2cMasterRequest]) -> None:
+        if self.memory_type == MemoryType.FRAM:
+            self._send_write_requests_pipelined(requests)
+        else:
+            # EEPROMs do not acknowledge during the write cycle, write one page after the other
+            for request in requests:
+                self._send_write_request(request)
+
+    def sync(self) -> None:
+        """Barrier of the write-back mode: returns once all data written before the call is in the memory.
+        Raises the error of a failed write-back."""
+        self.flush()
 
-        # Add the new section
-        self.updated_sections.append((section_start, section_end))
+    def start_write_back(
+        self, delay: float = MEMORY_WRITE_BACK_DELAY, coalesce_window: float = MEMORY_WRITE_BACK_WINDOW
+    ) -> None:
+        """Flush the updated sections in a background thread, write() returns without waiting for the memory.
+        Writes are collected until none has come for delay seconds, at the latest coalesce_window seconds after
+        the first one. Other memory operations wait for a write-back in progress, use sync() as a barrier.
+        Requires the expander to be connected with background_reader=True."""
+        if self.write_back_running:
+            return
+        if not self.interface.expander.running:
+            raise ValueError("Write-back requires the background reader (connect(background_reader=True))!")
+        self.write_back_delay = delay
+        self.write_back_window = coalesce_window
+        self.write_back_error = None
+        self.write_back_running = True
+        self.write_back_thread = threading.Thread(target=self._write_back_loop, name="memory-write-back", daemon=True)
+        self.write_back_thread.start()
+
+    def stop_write_back(self) -> None:
+        """Stop the background thread and flush the remaining updated sections."""
+        if not self.write_back_running:
+            return
+        with self.write_back_condition:
+            self.write_back_running = False
+            self.write_back_condition.notify_all()
+        self.write_back_thread.join()
+        self.write_back_thread = None
+        self.flush()
 
-    def flush(self) -> None:
+    def _write_back_loop(self) -> None:
+        while True:
+            with self.write_back_condition:
+                while self.write_back_running and (not self.updated_sections or self.write_back_error is not None):
+                    self.write_back_condition.wait()
+                # Collect further writes, they are likely to hit the same pages
+                while self.write_back_running and self.updated_sections:
+                    deadline = min(
+                        self.last_write_time + self.write_back_delay, self.first_write_time + self.write_back_window
+                    )
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self.write_back_condition.wait(remaining)
+                if not self.write_back_running:
+                    break
+            try:
+                self._write_back()
+            except Exception as e:
+                with self.write_back_condition:
+                    self.write_back_error = e
+
+    def _write_back(self) -> None:
+        # Flush the updated sections, write() adds new ones while the requests are sent
+        with self.io_lock:
+            with self.write_back_condition:
+                sections, requests, _ = self._prepare_flush(differential=False)
+                self.updated_sections.clear()
+            try:
+                self._send_flush_requests(requests)
+                if self.memory_type == MemoryType.EEPROM and requests:
+                    self._wait_for_write_cycle(requests[-1].slave_addr)
+            except Exception:
+                with self.write_back_condition:
+                    for section_start, section_end in sections:
+                        self.updated_sections.add(section_start, section_end)  # Written again by the next flush
+                raise
+            with self.write_back_condition:
+                for section_start, section_end in sections:
+                    self._mark_valid(section_start, section_end)
+
+    def _check_write_back(self) -> None:
+        with self.write_back_condition:
+            self._raise_write_back_error()
+
+    def _raise_write_back_error(self) -> None:
+        if self.write_back_error is not None:
+            error = self.write_back_error
+            self.write_back_error = None
+            self.write_back_condition.notify_all()  # The worker continues
+            raise error
+
+    def _prepare_flush(self, differential: bool) -> tuple[list[tuple[int, int]], list[I2cMasterRequest], int]:
+        # Returns the sections to write, their write requests and the number of skipped pages
+        steps = self._plan_flush(differential)
+        try:
+            read_sections = next(steps)
+            while True:
+                read_sections = steps.send(self._read_back(read_sections))
+        except StopIteration as stop:
+            return stop.value
+
+    def _plan_flush(
+        self, differential: bool
+    ) -> Generator[list[tuple[int, int]], list[bytes], tuple[list[tuple[int, int]], list[I2cMasterRequest], int]]:
+        # Shared by the sync and async flush: yields the sections whose memory content is needed (to be read back
+        # by the caller and sent in), returns the sections to write, their write requests and the skipped pages
+        sections = self._flush_sections()
+        pages_skipped = 0
+        if differential:
+            read_sections = self._differential_read_sections()
+            sections, pages_skipped = self._differential_sections(read_sections, (yield read_sections))
+        if self.memory_type == MemoryType.EEPROM:
+            sections, unknown_gaps = self._coalesce_page_sections(sections)
+            self._fill_gaps(unknown_gaps, (yield unknown_gaps))
+
+        requests = []
+        for section_start, section_end in sections:
+            requests.extend(self._create_write_requests(section_start, section_end))
+        return sections, requests, pages_skipped
+
+    def _finish_flush(
+        self, sections: list[tuple[int, int]], requests: list[I2cMasterRequest], pages_skipped: int, verify: bool
+    ) -> tuple[int, int]:
+        # After all write requests have been sent
+        if self.memory_type == MemoryType.EEPROM and requests:
+            self._wait_for_write_cycle(requests[-1].slave_addr)
+        if verify:
+            self._check_verify_result(self._verify_sections(sections, stop_on_mismatch=True))
+        self._flush_complete()
+        return self._count_pages(sections), pages_skipped
+
+    def _coalesce_page_sections(
+        self, sections: list[tuple[int, int]]
+    ) -> tuple[list[tuple[int, int]], list[tuple[int, int]]]:
+        # Join the sections within a page if that does not take more write requests (each one costs an EEPROM
+        # write cycle). The gaps are rewritten with the memory content, returns the joined sections and the
+        # gaps whose content is unknown (to be read back)
+        joined_sections = []
+        gaps = []
+        for section_start, section_end in self._split_at_pages(sections):
+            if joined_sections:
+                previous_start, previous_end = joined_sections[-1]
+                request_count = self._write_request_count(previous_start, previous_end)
+                request_count += self._write_request_count(section_start, section_end)
+                if (
+                    previous_start // self.page_size == section_start // self.page_size
+                    and self._write_request_count(previous_start, section_end) <= request_count
+                ):
+                    joined_sections[-1] = (previous_start, section_end)
+                    gaps.append((previous_end, section_start))
+                    continue
+            joined_sections.append((section_start, section_end))
+
+        if not self.read_cache:
+            return joined_sections, gaps
+        return joined_sections, [gap for start, end in gaps for gap in self.valid_sections.gaps(start, end)]
+
+    def _write_request_count(self, section_start: int, section_end: int) -> int:
+        return len(self.plan(section_start, section_end - section_start, MemoryOperation.WRITE))
+
+    def _fill_gaps(self, gaps: list[tuple[int, int]], gap_data: list[bytes]) -> None:
+        # Store the memory content read from the gaps between joined sections
+        for (gap_start, gap_end), data in zip(gaps, gap_data):
+            self.buffer[gap_start:gap_end] = data
+            self._mark_valid(gap_start, gap_end)
+
+    @_exclusive
+    def verify(self, address: int = 0, length: int = -1, stop_on_mismatch: bool = True) -> list[tuple[int, int]]:
+        """Compare the memory with the buffer, returns the mismatching ranges (empty if equal).
+        With stop_on_mismatch=True no further reads are sent after the first mismatch."""
+        length = self._check_read_range(address, length)
+        return self._verify_sections([(address, address + length)], stop_on_mismatch)
+
+    def _verify_sections(self, sections: list[tuple[int, int]], stop_on_mismatch: bool) -> list[tuple[int, int]]:
+        # Keep a window of read requests in flight, each response is compared as it arrives
+        requests = []
+        for section_start, section_end in sections:
+            for transaction in self.plan(section_start, section_end - section_start, MemoryOperation.READ):
+                requests.append((transaction.address, transaction.read_request()))
+
+        mismatches = IntervalSet()
+        attempts = {}
+        pending = {}
+        next_request = 0
+        while True:
+            while next_request < len(requests) and len(pending) < MEMORY_VERIFY_WINDOW:
+                if stop_on_mismatch and mismatches:
+                    break
+                pending[self.interface.submit(requests[next_request][1])] = requests[next_request]
+                next_request += 1
+            if not pending:
+                break
+
+            future = next(self.interface.as_completed(pending, timeout=MEMORY_REQUEST_TIMEOUT * len(pending)))
+            address, request = pending.pop(future)
+            data = self._read_response_data(future.result())
+            if data is not None:
+                self._compare(address, data, mismatches)
+            elif attempts.get(address, 0) >= MEMORY_MAX_READ_RETRIES:
+                raise ValueError(f"Read failed after {MEMORY_MAX_READ_RETRIES} retries!")
+            else:
+                attempts[address] = attempts.get(address, 0) + 1
+                pending[self.interface.submit(request)] = (address, request)
+        return list(mismatches)
+
+    def _compare(self, address: int, data: bytes, mismatches: IntervalSet) -> None:
+        # Add the ranges where the data read from address differs from the buffer
+        expected = self.buffer[address : address + len(data)]
+        if data == expected:
+            return
+        mismatch_start = None
+        for i in range(len(data)):
+            if data[i] != expected[i] and mismatch_start is None:
+                mismatch_start = i
+            elif data[i] == expected[i] and mismatch_start is not None:
+                mismatches.add(address + mismatch_start, address + i)
+                mismatch_start = None
+        if mismatch_start is not None:
+            mismatches.add(address + mismatch_start, address + len(data))
+
+    @staticmethod
+    def _check_verify_result(mismatches: list[tuple[int, int]]) -> None:
+        if mismatches:
+            ranges = ", ".join(f"0x{start:X}-0x{end - 1:X}" for start, end in mismatches)
+            raise ValueError(f"Verify failed, the memory differs at {ranges}!")
+
+    def _flush_sections(self) -> list[tuple[int, int]]:
         for section_start, section_end in self.updated_sections:
             if section_start < 0 or section_end > self.memory_size:
                 raise ValueError("Invalid section range for flush operation!")
-            self._flush_section(section_start, section_end)
-        self.updated_sections.clear()
-
-    def _flush_section(self, section_start: int, section_end: int) -> None:
-        address = section_start
-        length = section_end - section_start
-        first_page = address // self.page_size
-        last_page = (address + length - 1) // self.page_size
-        page_count = last_page - first_page + 1
-        max_write_length = I2C_MAX_WRITE_SIZE - self.address_width.value
-
-        current_address = address
-        page_start = first_page * self.page_size
-        for _ in range(page_count):
-            page_end = page_start + self.page_size
-
-            while current_address < page_end and current_address < section_end:
-                write_length = min(max_write_length, page_end - current_address, section_end - current_address)
-                data = self.buffer[current_address : current_address + write_length]
-
-                masked_addr = self._pack_slave_address(current_address)
-                address_bytes = masked_addr.to_bytes(self.address_width.value, "big")
-
-                self._send_write_request(address_bytes + data)
-                current_address += write_length
-
-            page_start += self.page_size
+        return list(self.updated_sections)
 
-    def _send_write_request(self, write_data: bytes) -> None:
-        max_retries = 42
-        retry_counter = 0
-        while retry_counter < max_retries:
-            request = I2cMasterRequest(slave_addr=self.slave_address, write_data=write_data, read_size=0)
-            rid = self.interface.send_request(request=request)
-            response = self.interface.wait_for_response(request_id=rid, timeout=0.1, pop_request=True)
-
-            if response.status_code == I2cStatusCode.SUCCESS:
-                break
-            elif response.status_code == I2cStatusCode.SLAVE_NO_ACK:
-                retry_counter += 1
-                continue  # If the memory is busy, we may need to wait and retry
+    def _flush_complete(self) -> None:
+        # Skipped pages of a differential flush match the memory as well
+        sections = list(self.updated_sections)
+        self.updated_sections.clear()
+        for section_start, section_end in sections:
+            self._mark_valid(section_start, section_end)
+
+    def _split_at_pages(self, sections: list[tuple[int, int]]) -> list[tuple[int, int]]:
+        split_sections = []
+        for section_start, section_end in sections:
+            while section_start < section_end:
+                page_end = (section_start // self.page_size + 1) * self.page_size
+                split_sections.append((section_start, min(section_end, page_end)))
+                section_start = page_end
+        return split_sections
+
+    def _count_pages(self, sections: list[tuple[int, int]]) -> int:
+        return len({section_start // self.page_size for section_start, _ in self._split_at_pages(sections)})
+
+    def _differential_read_sections(self) -> list[tuple[int, int]]:
+        # Updated parts of the pages without a known digest have to be read back for comparison
+        return [
+            (section_start, section_end)
+            for section_start, section_end in self._split_at_pages(list(self.updated_sections))
+            if section_start // self.page_size not in self.page_digests
+        ]
+
+    def _differential_sections(
+        self, read_sections: list[tuple[int, int]], read_data: list[bytes]
+    ) -> tuple[list[tuple[int, int]], int]:
+        # Updated sections of the pages that differ from the memory content, and the number of skipped pages
+        memory_data = dict(zip(read_sections, read_data))
+        sections = self._split_at_pages(list(self.updated_sections))
+        changed_pages = set()
+        for section_start, section_end in sections:
+            page = section_start // self.page_size
+            if page in self.page_digests:
+                changed = self._page_digest(page) != self.page_digests[page]
             else:
-                raise ValueError(f"Failed to flush memory: {response.status_code}")
-
-        if retry_counter >= max_retries:
-            raise TimeoutError(f"Failed to write to memory after {max_retries} retries!")
-
-    def upload_bin_file(self, address: int, file_path: str) -> None:
-        # Read data from file and write to memory
-        with open(file_path, "rb") as file:
-            data = file.read()
-            self.write(address, data)
-            self.flush()
-
-    def download_bin_file(self, address: int, file_path: str, size: int = -1) -> None:
-        # Read data from memory and save to file
-        data = self.read(address, size)
-        with open(file_path, "wb") as file:
-            file.write(data)
-
+                changed = memory_data[(section_start, section_end)] != self.buffer[section_start:section_end]
+            if changed:
+                changed_pages.add(page)
+
+        changed_sections = [section for section in sections if section[0] // self.page_size in changed_pages]
+        return changed_sections, self._count_pages(sections) - len(changed_pages)
+
+    def _read_back(self, sections: list[tuple[int, int]]) -> list[bytes]:
+        # Read the sections without touching the buffer
+        plans = self._read_back_plans(sections)
+        return self._join_read_back(plans, self._run_read_plan([transaction for plan in plans for transaction in plan]))
+
+    def _read_back_plans(self, sections: list[tuple[int, int]]) -> list[tuple[MemoryTransaction, ...]]:
+        return [self.plan(start, end - start, MemoryOperation.READ) for start, end in sections]
+
+    @staticmethod
+    def _join_read_back(plans: list[tuple[MemoryTransaction, ...]], read_data: list[bytes]) -> list[bytes]:
+        # The data of each section from the data of all plans in order
+        section_data = []
+        offset = 0
+        for plan in plans:
+            section_data.append(b"".join(read_data[offset : offset + len(plan)]))
+            offset += len(plan)
+        return section_data
+
+    def _run_read_plan(self, transactions: Sequence[MemoryTransaction]) -> list[bytes]:
+        # Pipelined execution, not acknowledged requests are resubmitted. Returns the data in plan order
+        requests = [transaction.read_request() for transaction in transactions]
+        read_data = [b""] * len(requests)
+        pending = {self.interface.submit(request): i for i, request in enumerate(requests)}
+        retries = 0
+        while pending:
+            if retries > MEMORY_MAX_READ_RETRIES:
+                raise ValueError(f"Read failed after {MEMORY_MAX_READ_RETRIES} retries!")
+            retries += 1
+            submitted = pending
+            pending = {}
+            for future in self.interface.as_completed(submitted, timeout=MEMORY_REQUEST_TIMEOUT * len(submitted)):
+                i = submitted[future]
+                data = self._read_response_data(future.result())
+                if data is None:
+                    pending[self.interface.submit(requests[i])] = i
+                else:
+                    read_data[i] = data
+        return read_data
+
+    @staticmethod
+    def _read_response_data(response: I2cMasterRequest) -> bytes | None:
+        # Returns the read data, None if the memory is busy (the request is sent again)
+        if response.status_code == I2cStatusCode.SUCCESS:
+            return response.read_data
+        elif response.status_code == I2cStatusCode.SLAVE_NO_ACK:
+            return None
+        raise ValueError(f"Failed to read memory: {response.status_code}")
+
+    @staticmethod
+    def _write_response_done(response: I2cMasterRequest) -> bool:
+        # Returns False if the memory is busy (the request is sent again)
+        if response.status_code == I2cStatusCode.SUCCESS:
+            return True
+        elif response.status_code == I2cStatusCode.SLAVE_NO_ACK:
+            return False
+        raise ValueError(f"Failed to flush memory: {response.status_code}")
+
+    def _create_write_requests(self, section_start: int, section_end: int) -> list[I2cMasterRequest]:
+        return [
+            transaction.write_request(self.buffer[transaction.address : transaction.address + transaction.length])
+            for transaction in self.plan(section_start, section_end - section_start, MemoryOperation.WRITE)
+        ]
+
+    def _send_write_request(self, request: I2cMasterRequest) -> None:
+        self._run_steps(self._write_request_steps(request))
+
+    def _wait_for_write_cycle(self, slave_addr: int, busy_time: float | None = None) -> None:
+        self._run_steps(self._write_cycle_steps(slave_addr, busy_time))
+
+    def _run_steps(self, steps: Generator[float | I2cMasterRequest, I2cMasterRequest | None, None]) -> None:
+        # Sync driver of the request sequences shared with the async API: a float is a delay in seconds,
+        # a request is sent and its response is sent back into the sequence
+        response = None
+        while True:
+            try:
+                step = steps.send(response)
+            except StopIteration:
+                return
+            if isinstance(step, I2cMasterRequest):
+                rid = self.interface.send_request(request=step)
+                response = self.interface.wait_for_response(rid, timeout=MEMORY_REQUEST_TIMEOUT, pop_request=True)
+            else:
+                time.sleep(step)
+                response = None
+
+    def _write_request_steps(self, request: I2cMasterRequest) -> Generator[float | I2cMasterRequest, object, None]:
+        # Send one write request, an EEPROM is polled (instead of resending the payload) while it is busy
+        eeprom = self.memory_type == MemoryType.EEPROM
+        if eeprom:
+            yield self._write_cycle_delay()  # Until the previous write cycle is expected to be complete
+
+        for attempt in range(MEMORY_MAX_WRITE_RETRIES):
+            send_time = time.monotonic()
+            if self._write_response_done((yield request)):
+                break
+            if eeprom:
+                yield from self._write_cycle_steps(request.slave_addr, send_time)
+        else:
+            raise TimeoutError(f"Failed to write to memory after {MEMORY_MAX_WRITE_RETRIES} retries!")
+
+        if eeprom:
+            self._write_cycle_started(first_attempt=attempt == 0)
+
+    def _write_cycle_steps(
+        self, slave_addr: int, busy_time: float | None = None
+    ) -> Generator[float | I2cMasterRequest, object, None]:
+        # Acknowledge polling: probe with the slave address only (no payload) until the EEPROM acknowledges again.
+        # busy_time is the last time the EEPROM did not acknowledge (if known).
+        yield self._write_cycle_delay()
+        start_time = time.monotonic()
+        while True:
+            probe_time = time.monotonic()
+            if self._check_probe_response((yield self._create_probe_request(slave_addr)), probe_time - start_time):
+                break
+            busy_time = probe_time
+        self._write_cycle_complete(busy_time, probe_time)
+
+    @staticmethod
+    def _create_probe_request(slave_addr: int) -> I2cMasterRequest:
+        return I2cMasterRequest(slave_addr=slave_addr, write_data=bytes(), read_size=0)
+
+    @staticmethod
+    def _check_probe_response(response: I2cMasterRequest, elapsed_time: float) -> bool:
+        # Returns True once the write cycle is complete
+        if response.status_code == I2cStatusCode.SUCCESS:
+            return True
+        elif response.status_code != I2cStatusCode.SLAVE_NO_ACK:
+            raise ValueError(f"Failed to poll memory: {response.status_code}")
+        elif elapsed_time > MEMORY_WRITE_CYCLE_TIMEOUT:
+            raise TimeoutError("Memory did not complete the write cycle!")
+        return False
+
+    def _write_cycle_delay(self) -> float:
+        if self.write_cycle_start is None:
+            return 0.0
+        return max(0.0, self.write_cycle_start + self.write_cycle_time - time.monotonic())
+
+    def _write_cycle_started(self, first_attempt: bool) -> None:
+        if first_attempt and self.write_cycle_start is not None:
+            self.write_cycle_time *= 0.99  # The previous write cycle was complete in time, try a shorter wait
+        self.write_cycle_start = time.monotonic()
+
+    def _write_cycle_complete(self, busy_time: float | None, ready_time: float) -> None:
+        if busy_time is not None and self.write_cycle_start is not None:
+            # The write cycle ended between the last busy and the first ready probe
+            self.write_cycle_time = (busy_time + ready_time) / 2 - self.write_cycle_start
+        self.write_cycle_start = None
+
+    def _send_write_requests_pipelined(self, requests: list[I2cMasterRequest]) -> None:
+        # Keep the I2C master queue filled, not acknowledged requests are resubmitted right away
+        attempts = {id(request): 1 for request in requests}
+        pending = {self.interface.submit(request): request for request in requests}
+        while pending:
+            submitted = pending
+            pending = {}
+            for future in self.interface.as_completed(submitted, timeout=MEMORY_REQUEST_TIMEOUT * len(submitted)):
+                request = submitted[future]
+                if self._write_response_done(future.result()):
+                    continue
+                elif attempts[id(request)] >= MEMORY_MAX_WRITE_RETRIES:
+                    raise TimeoutError(f"Failed to write to memory after {MEMORY_MAX_WRITE_RETRIES} retries!")
+
+                attempts[id(request)] += 1
+                pending[self.interface.submit(request)] = request
+
+    def _chunk_sections(self, address: int, size: int) -> list[tuple[int, int]]:
+        # Split [address, address + size) at multiples of the (page aligned) chunk size
+        chunk_size = math.ceil(MEMORY_BIN_CHUNK_SIZE / self.page_size) * self.page_size
+        sections = []
+        section_start = address
+        while section_start < address + size:
+            section_end = min(address + size, (section_start // chunk_size + 1) * chunk_size)
+            sections.append((section_start, section_end))
+            section_start = section_end
+        return sections
+
+    def _read_file_chunk(self, file: io.BufferedReader, section_start: int, section_end: int) -> None:
+        # Read file data straight into the buffer (not the updated sections, they are only touched by the caller)
+        if isinstance(self.buffer, SparseBuffer):
+            self.buffer[section_start:section_end] = file.read(section_end - section_start)
+        elif file.readinto(memoryview(self.buffer)[section_start:section_end]) != section_end - section_start:
+            raise ValueError("Unexpected end of file!")
+
+    def _buffer_view(self, section_start: int, section_end: int) -> bytes | memoryview:
+        if isinstance(self.buffer, SparseBuffer):
+            return self.buffer[section_start:section_end]
+        return memoryview(self.buffer)[section_start:section_end]  # No copy of the buffer
+
+    @_exclusive
+    def upload_bin_file(self, address: int, file_path: str, progress: Callable[[int, int], None] | None = None) -> None:
+        """Stream the file to memory in page aligned chunks, the next chunk is read from disk while the
+        current one is written. progress(bytes done, total bytes) is called after each chunk."""
+        size = os.path.getsize(file_path)
+        if address < 0 or address + size > self.memory_size:
+            raise ValueError("Invalid address or file size for upload operation!")
+
+        self.flush()  # Pending writes first, then each flush only sends one chunk
+        if self._prefetch_overlaps(address, address + size):
+            self._cancel_prefetch()
+        sections = self._chunk_sections(address, size)
+        with open(file_path, "rb") as file, ThreadPoolExecutor(max_workers=1) as disk:
+            pending_read = disk.submit(self._read_file_chunk, file, *sections[0]) if sections else None
+            for i, (section_start, section_end) in enumerate(sections):
+                pending_read.result()
+                if i + 1 < len(sections):
+                    pending_read = disk.submit(self._read_file_chunk, file, *sections[i + 1])
+
+                self.updated_sections.add(section_start, section_end)
+                self.flush()
+                if progress is not None:
+                    progress(section_end - address, size)
+
+    @_exclusive
+    def download_bin_file(
+        self, address: int, file_path: str, size: int = -1, progress: Callable[[int, int], None] | None = None
+    ) -> None:
+        """Stream memory to the file in page aligned chunks, each chunk is written to disk while the next
+        one is read. progress(bytes done, total bytes) is called after each chunk."""
+        size = self._check_read_range(address, size)
+        if self.buffer_file is not None and os.path.abspath(file_path) == os.path.abspath(self.buffer_file):
+            # The data is read straight into the mapped file
+            if address != 0 or size != self.memory_size:
+                raise ValueError("The buffer file can only hold the whole memory!")
+            for section_start, section_end in self._chunk_sections(address, size):
+                self._read_to_buffer(section_start, section_end - section_start)
+                if progress is not None:
+                    progress(section_end - address, size)
+            self.buffer.flush()
+            return
+
+        with open(file_path, "wb") as file, ThreadPoolExecutor(max_workers=1) as disk:
+            pending_write = None
+            for section_start, section_end in self._chunk_sections(address, size):
+                self._read_to_buffer(section_start, section_end - section_start)
+                if pending_write is not None:
+                    pending_write.result()
+                pending_write = disk.submit(file.write, self._buffer_view(section_start, section_end))
+                if progress is not None:
+                    progress(section_end - address, size)
+            if pending_write is not None:
+                pending_write.result()
+
+    @_exclusive
     def upload_hex_file(self, file_path: str) -> None:
-        # Read data from hex file and write to memory
+        # Write each contiguous segment of the hex file to memory as one range
         ih = IntelHex(file_path)
-        for address, data in ih.todict().items():
-            self.write(address, bytes([data]))
+        for segment_start, segment_end in ih.segments():
+            self.write(segment_start, ih.gets(segment_start, segment_end - segment_start))
         self.flush()
 
+    @_exclusive
     def download_hex_file(self, address: int, file_path: str, size: int = -1) -> None:
-        # Read data from memory and save to hex file
-        ih = IntelHex()
-        data = self.read(address, size)
-        ih.frombytes(data, offset=address)
-        ih.tofile(file_path, format="hex")
+        # Read memory in chunks and append their records to the hex file as they are read
+        size = self._check_read_range(address, size)
+        with open(file_path, "w") as file:
+            for chunk_start in range(address, address + size, MEMORY_HEX_CHUNK_SIZE):
+                chunk_size = min(MEMORY_HEX_CHUNK_SIZE, address + size - chunk_start)
+                ih = IntelHex()
+                ih.frombytes(self.read(chunk_start, chunk_size), offset=chunk_start)
+                records = io.StringIO()
+                ih.write_hex_file(records, write_start_addr=False)
+                file.writelines(records.getvalue().splitlines(keepends=True)[:-1])  # Without end of file record
+            IntelHex().write_hex_file(file, write_start_addr=False)  # End of file record
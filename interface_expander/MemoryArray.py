@@ -0,0 +1,145 @@
+from __future__ import annotations
+from interface_expander.Memory import Memory, MemoryType
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack
+from itertools import accumulate
+from bisect import bisect_right
+from typing import Callable
+
+
+class MemoryArray:
+    """Several memories presented as one address space, concatenated (stripe_size=None) or striped round-robin
+    in blocks of stripe_size bytes (identical memories). Memories on different I2C interfaces are accessed
+    concurrently if the expanders run the background reader, the EEPROM page writes of the memories on one
+    interface are interleaved so their write cycles overlap."""
+
+    def __init__(self, memories: list[Memory], stripe_size: int | None = None):
+        if not memories:
+            raise ValueError("At least one memory is required!")
+        if stripe_size is not None:
+            if any(memory.memory_size != memories[0].memory_size for memory in memories):
+                raise ValueError("Striped memories must have the same size!")
+            if stripe_size <= 0 or memories[0].memory_size % stripe_size != 0:
+                raise ValueError("The memory size must be a multiple of the stripe size!")
+
+        self.memories = memories
+        self.stripe_size = stripe_size
+        self.memory_size = sum(memory.memory_size for memory in memories)
+        self.bases = list(accumulate(memory.memory_size for memory in memories[:-1]))
+        self.bases.insert(0, 0)  # Start address of each memory (concatenated)
+
+    def _check_range(self, address: int, length: int) -> int:
+        if length == -1:
+            length = self.memory_size - address
+        if length < 0 or address < 0 or address + length > self.memory_size:
+            raise ValueError("Invalid address or length for memory array!")
+        return length
+
+    def _map(self, address: int, length: int) -> list[list[tuple[int, int, int]]]:
+        # Split the range into (memory address, length, offset in the range) pieces per memory. The pieces of
+        # one memory are contiguous in its address space
+        pieces = [[] for _ in self.memories]
+        offset = 0
+        while offset < length:
+            array_address = address + offset
+            if self.stripe_size is None:
+                index = bisect_right(self.bases, array_address) - 1
+                memory_address = array_address - self.bases[index]
+                piece_length = min(length - offset, self.memories[index].memory_size - memory_address)
+            else:
+                stripe, stripe_offset = divmod(array_address, self.stripe_size)
+                index = stripe % len(self.memories)
+                memory_address = stripe // len(self.memories) * self.stripe_size + stripe_offset
+                piece_length = min(length - offset, self.stripe_size - stripe_offset)
+            pieces[index].append((memory_address, piece_length, offset))
+            offset += piece_length
+        return pieces
+
+    def _run_per_interface(self, function: Callable[[list[Memory]], object], memories: list[Memory]) -> list:
+        # Call function(memories on one interface) for each interface, concurrently if possible
+        groups = {}
+        for memory in memories:
+            groups.setdefault(id(memory.interface), []).append(memory)
+        groups = list(groups.values())
+
+        concurrent = len(groups) > 1 and all(
+            memory.interface is not None and memory.interface.expander.running for memory in memories
+        )
+        if not concurrent:
+            return [function(group) for group in groups]
+        with ThreadPoolExecutor(max_workers=len(groups), thread_name_prefix="memory-array") as executor:
+            return list(executor.map(function, groups))
+
+    def read(self, address: int, length: int) -> bytes:
+        length = self._check_range(address, length)
+        pieces = {memory: p for memory, p in zip(self.memories, self._map(address, length)) if p}
+        data = bytearray(length)
+
+        self._run_per_interface(lambda group: self._read_interface(group, pieces, data), list(pieces))
+        return bytes(data)
+
+    @staticmethod
+    def _read_interface(memories: list[Memory], pieces: dict, data: bytearray) -> None:
+        # The requests of all memories on the interface are pipelined together
+        with MemoryArray._exclusive(memories):
+            plans = {}
+            for memory in memories:
+                start = pieces[memory][0][0]
+                end = pieces[memory][-1][0] + pieces[memory][-1][1]
+                plans[memory] = (start, end, memory._buffer_read_plan(start, end - start))
+            read_data = memories[0]._run_read_plan([transaction for *_, plan in plans.values() for transaction in plan])
+
+            plan_start = 0
+            for memory, (start, end, plan) in plans.items():
+                memory._store_read_data(plan, read_data[plan_start : plan_start + len(plan)])
+                memory._mark_valid(start, end)
+                plan_start += len(plan)
+                for memory_address, piece_length, offset in pieces[memory]:
+                    data[offset : offset + piece_length] = memory.buffer[memory_address : memory_address + piece_length]
+
+    def write(self, address: int, data: bytes) -> None:
+        # Only updates the buffers, the data is sent by flush()
+        self._check_range(address, len(data))
+        for memory, memory_pieces in zip(self.memories, self._map(address, len(data))):
+            for memory_address, piece_length, offset in memory_pieces:
+                memory.write(memory_address, data[offset : offset + piece_length])
+
+    def flush(self, differential: bool = False, verify: bool = False) -> tuple[int, int]:
+        """Flush all memories, returns the total number of pages written and skipped (see Memory.flush())."""
+        memories = [
+            memory for memory in self.memories if memory.updated_sections or memory.write_back_error is not None
+        ]
+        group_results = self._run_per_interface(
+            lambda group: self._flush_interface(group, differential, verify), memories
+        )
+        results = [result for group in group_results for result in group]
+        return sum(written for written, _ in results), sum(skipped for _, skipped in results)
+
+    @staticmethod
+    def _exclusive(memories: list[Memory]) -> ExitStack:
+        # Hold the io locks of the memories (in array order, no write-back worker runs meanwhile), raise the
+        # error of a failed write-back
+        stack = ExitStack()
+        with stack:
+            for memory in memories:
+                stack.enter_context(memory.io_lock)
+                memory._check_write_back()
+            return stack.pop_all()
+
+    @staticmethod
+    def _flush_interface(memories: list[Memory], differential: bool, verify: bool) -> list[tuple[int, int]]:
+        with MemoryArray._exclusive(memories):
+            fram_memories = [memory for memory in memories if memory.memory_type == MemoryType.FRAM]
+            results = [memory.flush(differential, verify) for memory in fram_memories]
+
+            # Write to the EEPROM with the shortest remaining write cycle, the others keep writing meanwhile
+            eeproms = [memory for memory in memories if memory.memory_type == MemoryType.EEPROM]
+            flushes = {memory: memory._prepare_flush(differential) for memory in eeproms}
+            pending = {memory: list(reversed(flush[1])) for memory, flush in flushes.items()}
+            while any(pending.values()):
+                memory = min((memory for memory in eeproms if pending[memory]), key=lambda m: m._write_cycle_delay())
+                memory._send_write_request(pending[memory].pop())
+
+            for memory, (sections, requests, pages_skipped) in flushes.items():
+                results.append(memory._finish_flush(sections, requests, pages_skipped, verify))
+        return results
@@ -0,0 +1,89 @@
+from __future__ import annotations
+from interface_expander.Memory import Memory
+import math
+import io
+
+MEMORY_IO_BUFFER_SIZE = 4096  # Read-ahead and write-back buffer of MemoryFile (rounded up to whole pages)
+
+
+class MemoryRawIO(io.RawIOBase):
+    """Unbuffered seekable binary stream over a Memory. Written data is kept in the memory buffer
+    until flush() or close()."""
+
+    def __init__(self, memory: Memory):
+        super().__init__()
+        self.memory = memory
+        self.position = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def writable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def _check_open(self) -> None:
+        if self.closed:
+            raise ValueError("I/O operation on closed memory stream!")
+
+    def readinto(self, b) -> int:
+        self._check_open()
+        length = self.memory.readinto(self.position, b)
+        self.position += length
+        return length
+
+    def readall(self) -> bytes:
+        # The rest of the memory with one pipelined read
+        data = bytearray(max(0, self.memory.memory_size - self.position))
+        return bytes(data[: self.readinto(data)])
+
+    def write(self, b) -> int:
+        self._check_open()
+        data = memoryview(b).cast("B")
+        length = min(len(data), self.memory.memory_size - self.position)
+        if length <= 0 and len(data) > 0:
+            raise OSError("Write beyond the end of the memory!")
+        self.memory.write(self.position, data[:length])
+        self.position += length
+        return length
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        self._check_open()
+        if whence == io.SEEK_SET:
+            position = offset
+        elif whence == io.SEEK_CUR:
+            position = self.position + offset
+        elif whence == io.SEEK_END:
+            position = self.memory.memory_size + offset
+        else:
+            raise ValueError(f"Invalid whence ({whence})!")
+        if position < 0:
+            raise OSError("Negative seek position!")
+        self.position = position
+        return position
+
+    def tell(self) -> int:
+        self._check_open()
+        return self.position
+
+    def flush(self) -> None:
+        # Send the written data to the memory
+        if not self.closed:
+            self.memory.flush()
+        super().flush()
+
+
+class MemoryFile(io.BufferedRandom):
+    """Buffered seekable binary file over a Memory (read-ahead and write-back of buffer_size bytes).
+    Unlike io.BufferedRandom, flush() also sends the written data to the memory."""
+
+    def __init__(self, memory: Memory, buffer_size: int | None = None):
+        if buffer_size is None:
+            buffer_size = math.ceil(MEMORY_IO_BUFFER_SIZE / memory.page_size) * memory.page_size
+        super().__init__(MemoryRawIO(memory), buffer_size)
+
+    def flush(self) -> None:
+        super().flush()
+        self.raw.flush()
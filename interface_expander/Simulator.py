@@ -0,0 +1,537 @@
+"""
+Python model of the interface expander firmware
+
+The simulator implements the ECHO, CTRL, I2C and DAC message flows of the device including the queue and buffer
+space accounting, so the library can be tested and benchmarked without hardware. It is connected through the
+"sim://" serial URL (see protocol_sim.py), e.g. InterfaceExpander(port="sim://").
+"""
+
+from __future__ import annotations
+from interface_expander.proto.proto_py import ctrl_pb2, i2c_pb2, dac_pb2
+from interface_expander.I2cInterface import (
+    I2cStatusCode,
+    I2cConfigStatusCode,
+    ClockFreq,
+    I2C_MASTER_QUEUE_SPACE,
+    I2C_MASTER_BUFFER_SPACE,
+    I2C_SLAVE_QUEUE_SPACE,
+    I2C_SLAVE_BUFFER_SPACE,
+    I2C_MAX_WRITE_SIZE,
+    I2C_MAX_READ_SIZE,
+)
+from interface_expander.DigitalToAnalog import (
+    DacConfigStatusCode,
+    DacDataStatusCode,
+    DAC_MAX_QUEUE_SPACE,
+    DAC_MAX_SAMPLE_BUFFER_SPACE,
+    DAC_MAX_DATA_SAMPLES,
+    DAC_MIN_SAMPLING_RATE,
+    DAC_MAX_SAMPLING_RATE,
+)
+from collections import deque
+import interface_expander.tiny_frame as tf
+import itertools
+import threading
+import heapq
+import math
+import time
+
+SIM_LATENCY = 0.0  # USB latency of every message sent to the host in seconds (0: delivered during the host's write)
+SIM_I2C_REQUEST_OVERHEAD = 20e-6  # Firmware processing time per I2C master request in seconds
+SIM_EEPROM_WRITE_TIME = 0.005  # EEPROM write cycle (does not acknowledge while writing)
+SIM_FRAM_SLAVE_ADDR = 0x51  # 32 kByte FRAM (as on the test board)
+SIM_FRAM_SIZE = pow(2, 15)
+SIM_EEPROM_SLAVE_ADDR = 0x52  # 128 kByte EEPROM (uses one address bit in the slave address)
+SIM_EEPROM_SIZE = pow(2, 17)
+SIM_EEPROM_PAGE_SIZE = 256
+
+
+class SimMemory:
+    """I2C memory (FRAM/EEPROM) attached to the simulated I2C bus"""
+
+    def __init__(self, size: int, address_width: int, page_size: int = 0, write_time: float = 0.0):
+        self.data = bytearray(size)
+        self.address_width = address_width  # Number of address bytes
+        self.page_size = page_size  # Writes wrap around within a page (0: no paging)
+        self.write_time = write_time  # Does not acknowledge for this time after a write
+        self.address_bits = max(0, (size - 1).bit_length() - address_width * 8)  # Bits in the slave address
+
+        self.pointer = 0
+        self.busy_until = 0.0
+
+    def acknowledges(self, now: float) -> bool:
+        return now >= self.busy_until
+
+    def access(
+        self, slave_addr: int, write_data: bytes, read_size: int, now: float, time_scale: float = 1.0
+    ) -> tuple[bool, bytes]:
+        """Run an I2C access, returns (acknowledged, read data)."""
+        if now < self.busy_until:
+            return False, b""
+
+        size = len(self.data)
+        if len(write_data) >= self.address_width:
+            bank = slave_addr & ((1 << self.address_bits) - 1)
+            address = int.from_bytes(write_data[: self.address_width], "big")
+            self.pointer = ((bank << (self.address_width * 8)) | address) % size
+
+        data = write_data[self.address_width :]
+        if data:
+            if self.page_size:
+                page_start = self.pointer - self.pointer % self.page_size
+                for i, byte in enumerate(data):
+                    self.data[page_start + (self.pointer - page_start + i) % self.page_size] = byte
+                self.pointer = page_start + (self.pointer - page_start + len(data)) % self.page_size
+            else:
+                for i, byte in enumerate(data):
+                    self.data[(self.pointer + i) % size] = byte
+                self.pointer = (self.pointer + len(data)) % size
+            self.busy_until = now + self.write_time * time_scale
+
+        read_data = bytes(self.data[(self.pointer + i) % size] for i in range(read_size))
+        self.pointer = (self.pointer + read_size) % size
+        return True, read_data
+
+
+class SimMasterBuffer:
+    """Buffer holding the write and read data of queued master requests. It does not fragment, so all
+    free space is reported as the first section and the space assumed by the host is always available."""
+
+    def __init__(self, size: int):
+        self.size = size
+        self.used = 0
+
+    def space(self) -> tuple[int, int]:
+        return self.size - self.used, 0
+
+    def allocate_request(self, write_size: int, read_size: int) -> int | None:
+        """Returns the allocated size (None if there is no space)."""
+        size = write_size + read_size
+        if size > self.size - self.used:
+            return None
+        self.used += size
+        return size
+
+    def release(self, size: int) -> None:
+        self.used -= size
+
+
+class SimI2c:
+    """I2C interface of the firmware (master and slave)"""
+
+    def __init__(self, simulator: Simulator, i2c_id: int):
+        self.simulator = simulator
+        self.i2c_id = i2c_id
+        self.generation = 0  # Invalidates scheduled completions
+        self.reset()
+
+    def reset(self) -> None:
+        self.sequence_number = 0
+        self.clock_freq = None
+        self.slave_addr = None
+        self.mem_addr_width = 2
+
+        self.master_queue = deque()  # (request, allocated buffer size)
+        self.master_buffer = SimMasterBuffer(I2C_MASTER_BUFFER_SPACE)
+        self.master_busy = False
+        self.generation += 1
+
+        self.slave_memory = bytearray(I2C_SLAVE_BUFFER_SPACE)
+        self.access_id = 0
+
+    def receive(self, msg: i2c_pb2.I2cMsg) -> None:
+        self.sequence_number = msg.sequence_number
+        inner_msg = msg.WhichOneof("msg")
+        if inner_msg == "config_request":
+            self._handle_config_request(msg.config_request)
+        elif inner_msg == "master_request":
+            self._handle_master_request(msg.master_request)
+        elif inner_msg == "slave_request":
+            self._handle_slave_request(msg.slave_request)
+
+    def _send(self, msg: i2c_pb2.I2cMsg) -> None:
+        msg.i2c_id = self.i2c_id
+        msg.sequence_number = self.sequence_number
+        self.simulator.send(tf.TfMsgType.TYPE_I2C, msg.SerializeToString())
+
+    def _handle_config_request(self, request: i2c_pb2.I2cConfigRequest) -> None:
+        status_code = I2cConfigStatusCode.SUCCESS
+        if request.clock_freq not in [int(freq.value) for freq in ClockFreq]:
+            status_code = I2cConfigStatusCode.INVALID_CLOCK_FREQ
+        elif request.slave_addr_width == i2c_pb2.AddressWidth.Bits7 and request.slave_addr > 0x7F:
+            status_code = I2cConfigStatusCode.INVALID_SLAVE_ADDR
+        else:
+            self.clock_freq = request.clock_freq
+            self.slave_addr = request.slave_addr
+            self.mem_addr_width = 1 if request.mem_addr_width == i2c_pb2.AddressWidth.Bits8 else 2
+
+        msg = i2c_pb2.I2cMsg()
+        msg.config_status.request_id = request.request_id
+        msg.config_status.status_code = status_code.value
+        self._send(msg)
+
+    def _handle_master_request(self, request: i2c_pb2.I2cMasterRequest) -> None:
+        size = None
+        if len(request.write_data) <= I2C_MAX_WRITE_SIZE and request.read_size <= I2C_MAX_READ_SIZE:
+            if len(self.master_queue) < I2C_MASTER_QUEUE_SPACE:
+                size = self.master_buffer.allocate_request(len(request.write_data), request.read_size)
+
+        if size is None:
+            self._send_master_status(request, I2cStatusCode.NO_SPACE, b"")
+            return
+
+        self.master_queue.append((request, size))
+        self._start_master_request()
+
+    def _start_master_request(self) -> None:
+        if self.master_busy or not self.master_queue:
+            return
+        self.master_busy = True
+
+        request, _ = self.master_queue[0]
+        # The transfer ends after the address byte if the slave does not acknowledge
+        acknowledged = self.simulator.bus_acknowledge(self, request.slave_addr, time.monotonic())
+        bits = 2 + 9  # Start/stop and address
+        if acknowledged:
+            bits += 9 * len(request.write_data)
+            if request.read_size > 0:
+                bits += 9 * (1 + request.read_size)  # Repeated start, address and read data
+        bus_time = bits / (self.clock_freq or ClockFreq.FREQ100K.value) * self.simulator.bus_time
+        self.simulator.schedule(
+            SIM_I2C_REQUEST_OVERHEAD + bus_time, self._complete_master_request, self.generation, acknowledged
+        )
+
+    def _complete_master_request(self, generation: int, acknowledged: bool) -> None:
+        if generation != self.generation:
+            return  # Reset in the meantime
+
+        request, size = self.master_queue.popleft()
+        self.master_busy = False
+        read_data = b""
+        if acknowledged:
+            acknowledged, read_data = self.simulator.bus_access(
+                self, request.slave_addr, request.write_data, request.read_size
+            )
+        self.master_buffer.release(size)
+
+        status_code = I2cStatusCode.SUCCESS if acknowledged else I2cStatusCode.SLAVE_NO_ACK
+        self._send_master_status(request, status_code, read_data)
+        self._start_master_request()
+
+    def _send_master_status(self, request: i2c_pb2.I2cMasterRequest, status_code: I2cStatusCode, read_data: bytes):
+        space1, space2 = self.master_buffer.space()
+        msg = i2c_pb2.I2cMsg()
+        msg.master_status.request_id = request.request_id
+        msg.master_status.status_code = status_code.value
+        msg.master_status.read_data = read_data
+        msg.master_status.queue_space = I2C_MASTER_QUEUE_SPACE - len(self.master_queue)
+        msg.master_status.buffer_space1 = space1
+        msg.master_status.buffer_space2 = space2
+        self._send(msg)
+
+    def _handle_slave_request(self, request: i2c_pb2.I2cSlaveRequest) -> None:
+        # Updates the slave memory directly (no bus access)
+        write_end = request.write_addr + len(request.write_data)
+        read_end = request.read_addr + request.read_size
+        if write_end > I2C_SLAVE_BUFFER_SPACE or read_end > I2C_SLAVE_BUFFER_SPACE:
+            status_code = I2cStatusCode.BAD_REQUEST
+            read_data = b""
+        else:
+            status_code = I2cStatusCode.SUCCESS
+            self.slave_memory[request.write_addr : write_end] = request.write_data
+            read_data = bytes(self.slave_memory[request.read_addr : read_end])
+
+        msg = i2c_pb2.I2cMsg()
+        msg.slave_status.request_id = request.request_id
+        msg.slave_status.status_code = status_code.value
+        msg.slave_status.read_data = read_data
+        msg.slave_status.queue_space = I2C_SLAVE_QUEUE_SPACE
+        self._send(msg)
+
+    def slave_access(self, write_data: bytes, read_size: int) -> bytes:
+        """Access of another master to the slave memory of this interface."""
+        address = int.from_bytes(write_data[: self.mem_addr_width], "big")
+        data = write_data[self.mem_addr_width :]
+        for i, byte in enumerate(data):
+            self.slave_memory[(address + i) % I2C_SLAVE_BUFFER_SPACE] = byte
+        read_data = bytes(self.slave_memory[(address + i) % I2C_SLAVE_BUFFER_SPACE] for i in range(read_size))
+
+        self.access_id += 1
+        msg = i2c_pb2.I2cMsg()
+        msg.slave_notification.access_id = self.access_id
+        msg.slave_notification.status_code = I2cStatusCode.SUCCESS.value
+        msg.slave_notification.write_data = write_data
+        msg.slave_notification.read_data = read_data
+        msg.slave_notification.queue_space = I2C_SLAVE_QUEUE_SPACE
+        self._send(msg)
+        return read_data
+
+
+class SimDacChannel:
+    def __init__(self):
+        self.mode = dac_pb2.DacMode.DAC_MODE_STATIC
+        self.sampling_rate = DAC_MIN_SAMPLING_RATE
+        self.level = 0.0  # Samples in the buffer
+        self.running = False
+        self.last_update = 0.0
+        self.generation = 0  # Invalidates scheduled buffer updates
+
+    def update(self, now: float) -> bool:
+        """Play the streamed samples until now, returns True on buffer underrun."""
+        if self.mode != dac_pb2.DacMode.DAC_MODE_STREAMING or not self.running:
+            return False
+        self.level -= (now - self.last_update) * self.sampling_rate
+        self.last_update = now
+        if self.level <= 0:
+            self.level = 0.0
+            self.running = False
+            return True
+        return False
+
+    def space(self) -> int:
+        return DAC_MAX_SAMPLE_BUFFER_SPACE - math.ceil(self.level)
+
+
+class SimDac:
+    """Two channel DAC of the firmware"""
+
+    def __init__(self, simulator: Simulator):
+        self.simulator = simulator
+        self.channels = [SimDacChannel(), SimDacChannel()]
+        self.reset()
+
+    def reset(self) -> None:
+        self.sequence_number = 0
+        for i, channel in enumerate(self.channels):
+            generation = channel.generation + 1
+            self.channels[i] = SimDacChannel()
+            self.channels[i].generation = generation
+
+    def receive(self, msg: dac_pb2.DacMsg) -> None:
+        self.sequence_number = msg.sequence_number
+        inner_msg = msg.WhichOneof("msg")
+        if inner_msg == "config_request":
+            self._handle_config_request(msg.config_request)
+        elif inner_msg == "data_request":
+            self._handle_data_request(msg.data_request)
+
+    def _send(self, msg: dac_pb2.DacMsg) -> None:
+        msg.sequence_number = self.sequence_number
+        self.simulator.send(tf.TfMsgType.TYPE_DAC, msg.SerializeToString())
+
+    def _handle_config_request(self, request: dac_pb2.DacConfigRequest) -> None:
+        status_code = DacConfigStatusCode.SUCCESS
+        configs = (
+            (request.config_ch0, request.mode_ch0, request.sampling_rate_ch0, request.periodic_samples_ch0),
+            (request.config_ch1, request.mode_ch1, request.sampling_rate_ch1, request.periodic_samples_ch1),
+        )
+        for config, mode, sampling_rate, periodic_samples in configs:
+            if not config:
+                continue
+            if not DAC_MIN_SAMPLING_RATE <= sampling_rate <= DAC_MAX_SAMPLING_RATE:
+                status_code = DacConfigStatusCode.INVALID_SAMPLING_RATE
+            elif periodic_samples > DAC_MAX_SAMPLE_BUFFER_SPACE:
+                status_code = DacConfigStatusCode.INVALID_PERIODIC_SAMPLES
+
+        if status_code == DacConfigStatusCode.SUCCESS:
+            for i, (config, mode, sampling_rate, _) in enumerate(configs):
+                if config:
+                    channel = SimDacChannel()
+                    channel.generation = self.channels[i].generation + 1
+                    channel.mode = mode
+                    channel.sampling_rate = sampling_rate
+                    self.channels[i] = channel
+
+        msg = dac_pb2.DacMsg()
+        msg.config_status.request_id = request.request_id
+        msg.config_status.status_code = status_code.value
+        self._send(msg)
+
+    def _handle_data_request(self, request: dac_pb2.DacDataRequest) -> None:
+        now = time.monotonic()
+        underrun = [channel.update(now) for channel in self.channels]
+        if any(underrun):
+            self._send_notification(underrun)
+
+        samples = (len(request.data_ch0) // 2, len(request.data_ch1) // 2)
+        runs = (request.run_ch0, request.run_ch1)
+        status_code = DacDataStatusCode.SUCCESS
+        if any(count > channel.space() for count, channel in zip(samples, self.channels)):
+            status_code = DacDataStatusCode.BUFFER_OVERFLOW
+        else:
+            for i, (count, run, channel) in enumerate(zip(samples, runs, self.channels)):
+                if channel.mode != dac_pb2.DacMode.DAC_MODE_STATIC:
+                    channel.level += count
+                if run and channel.mode == dac_pb2.DacMode.DAC_MODE_STREAMING and not channel.running:
+                    channel.running = channel.level > 0
+                    channel.last_update = now
+                    channel.generation += 1
+                    self._schedule_update(i)
+                elif run:
+                    channel.running = True
+
+        msg = dac_pb2.DacMsg()
+        msg.data_status.request_id = request.request_id
+        msg.data_status.status_code = status_code.value
+        msg.data_status.queue_space = DAC_MAX_QUEUE_SPACE
+        msg.data_status.buffer_space_ch0 = self.channels[0].space()
+        msg.data_status.buffer_space_ch1 = self.channels[1].space()
+        self._send(msg)
+
+    def _schedule_update(self, index: int) -> None:
+        channel = self.channels[index]
+        if channel.running:
+            interval = DAC_MAX_DATA_SAMPLES / channel.sampling_rate
+            self.simulator.schedule(interval, self._update_channel, index, channel.generation)
+
+    def _update_channel(self, index: int, generation: int) -> None:
+        channel = self.channels[index]
+        if channel.generation != generation or not channel.running:
+            return
+
+        underrun = [False, False]
+        underrun[index] = channel.update(time.monotonic())
+        self._send_notification(underrun)
+        self._schedule_update(index)
+
+    def _send_notification(self, underrun: list[bool]) -> None:
+        msg = dac_pb2.DacMsg()
+        msg.notification.queue_space = DAC_MAX_QUEUE_SPACE
+        msg.notification.buffer_space_ch0 = self.channels[0].space()
+        msg.notification.buffer_space_ch1 = self.channels[1].space()
+        msg.notification.buffer_underrun_ch0 = underrun[0]
+        msg.notification.buffer_underrun_ch1 = underrun[1]
+        self._send(msg)
+
+
+class Simulator:
+    """Simulated interface expander, all messages are processed on a scheduler thread"""
+
+    def __init__(self, latency: float = SIM_LATENCY, bus_time: float = 1.0):
+        self.latency = latency  # Delay of all messages sent to the host
+        self.bus_time = bus_time  # Scales the I2C bus and memory write times (0: instant)
+
+        self.lock = threading.RLock()
+        self.condition = threading.Condition(self.lock)
+        self.events = []  # Heap of (due time, counter, function, args)
+        self.event_counter = itertools.count()
+        self.thread = None
+        self.output = None  # Receives the bytes sent to the host
+
+        self.tf = tf.TF.TinyFrame(peer=0)
+        self.tf.SOF_BYTE = tf.TF_FRAME_START
+        self.tf.ID_BYTES = tf.TF_ID_BYTES
+        self.tf.LEN_BYTES = tf.TF_LEN_BYTES
+        self.tf.TYPE_BYTES = tf.TF_TYPE_BYTES
+        self.tf.CKSUM_TYPE = "xor"
+        self.tf.write = self._transmit
+        self.tf.add_type_listener(tf.TfMsgType.TYPE_ECHO.value, self._receive_echo_msg_cb)
+        self.tf.add_type_listener(tf.TfMsgType.TYPE_CTRL.value, self._receive_ctrl_msg_cb)
+        self.tf.add_type_listener(tf.TfMsgType.TYPE_I2C.value, self._receive_i2c_msg_cb)
+        self.tf.add_type_listener(tf.TfMsgType.TYPE_DAC.value, self._receive_dac_msg_cb)
+
+        self.i2c = {i2c_id: SimI2c(self, i2c_id) for i2c_id in (i2c_pb2.I2cId.I2C0, i2c_pb2.I2cId.I2C1)}
+        self.dac = SimDac(self)
+
+        self.devices = {}  # Slave address -> device on the I2C bus (shared by both interfaces)
+        self.attach(SIM_FRAM_SLAVE_ADDR, SimMemory(SIM_FRAM_SIZE, address_width=2))
+        eeprom = SimMemory(SIM_EEPROM_SIZE, 2, page_size=SIM_EEPROM_PAGE_SIZE, write_time=SIM_EEPROM_WRITE_TIME)
+        self.attach(SIM_EEPROM_SLAVE_ADDR, eeprom)
+
+    def attach(self, slave_addr: int, memory: SimMemory) -> None:
+        """Attach a memory to the I2C bus (also at the addresses used by its additional address bits)."""
+        with self.lock:
+            for bank in range(1 << memory.address_bits):
+                self.devices[slave_addr | bank] = memory
+
+    def connect(self, output) -> None:
+        with self.lock:
+            self.output = output
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._run, name="expander-simulator", daemon=True)
+                self.thread.start()
+
+    def disconnect(self) -> None:
+        with self.lock:
+            self.output = None
+
+    def receive(self, data: bytes) -> None:
+        """Bytes sent by the host."""
+        with self.lock:
+            self.tf.accept(data)
+
+    def send(self, msg_type: tf.TfMsgType, data: bytes, frame_id: int = 0) -> None:
+        self.tf.send(msg_type.value, data, frame_id)
+
+    def schedule(self, delay: float, fn, *args) -> None:
+        with self.condition:
+            heapq.heappush(self.events, (time.monotonic() + delay, next(self.event_counter), fn, args))
+            self.condition.notify()
+
+    def bus_acknowledge(self, master: SimI2c, slave_addr: int, now: float) -> bool:
+        """Returns True if the slave acknowledges its address."""
+        for i2c in self.i2c.values():
+            if i2c is not master and i2c.slave_addr == slave_addr:
+                return True
+        device = self.devices.get(slave_addr)
+        return device is not None and device.acknowledges(now)
+
+    def bus_access(self, master: SimI2c, slave_addr: int, write_data: bytes, read_size: int) -> tuple[bool, bytes]:
+        for i2c in self.i2c.values():
+            if i2c is not master and i2c.slave_addr == slave_addr:
+                return True, i2c.slave_access(write_data, read_size)
+
+        device = self.devices.get(slave_addr)
+        if device is None:
+            return False, b""
+        return device.access(slave_addr, write_data, read_size, time.monotonic(), self.bus_time)
+
+    def reset(self) -> None:
+        with self.lock:
+            for i2c in self.i2c.values():
+                i2c.reset()
+            self.dac.reset()
+
+    def _transmit(self, data: bytes) -> None:
+        data = bytes(data)
+        if self.latency > 0:
+            self.schedule(self.latency, self._deliver, data)
+        else:
+            self._deliver(data)
+
+    def _deliver(self, data: bytes) -> None:
+        if self.output is not None:
+            self.output(data)
+
+    def _run(self) -> None:
+        with self.condition:
+            while True:
+                if not self.events:
+                    self.condition.wait()
+                    continue
+                due, _, fn, args = self.events[0]
+                delay = due - time.monotonic()
+                if delay > 0:
+                    self.condition.wait(delay)
+                    continue
+                heapq.heappop(self.events)
+                fn(*args)
+
+    def _receive_echo_msg_cb(self, _, tf_msg: tf.TF.TF_Msg) -> None:
+        self.send(tf.TfMsgType.TYPE_ECHO, bytes(tf_msg.data), tf_msg.id)
+
+    def _receive_ctrl_msg_cb(self, _, tf_msg: tf.TF.TF_Msg) -> None:
+        msg = ctrl_pb2.CtrlMsg()
+        msg.ParseFromString(bytes(tf_msg.data))
+        if msg.WhichOneof("msg") == "ctrl_request" and msg.ctrl_request.reset_system:
+            self.reset()
+
+    def _receive_i2c_msg_cb(self, _, tf_msg: tf.TF.TF_Msg) -> None:
+        msg = i2c_pb2.I2cMsg()
+        msg.ParseFromString(bytes(tf_msg.data))
+        self.i2c[msg.i2c_id].receive(msg)
+
+    def _receive_dac_msg_cb(self, _, tf_msg: tf.TF.TF_Msg) -> None:
+        msg = dac_pb2.DacMsg()
+        msg.ParseFromString(bytes(tf_msg.data))
+        self.dac.receive(msg)
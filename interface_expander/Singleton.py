@@ -1,7 +1,14 @@
 class Singleton(type):
+    """One instance per class and device (e.g. one InterfaceExpander per serial port). Classes resolve their
+    constructor arguments to the device in _singleton_key(), so equivalent calls return the same instance."""
+
     _instances = {}
 
     def __call__(cls, *args, **kwargs):
-        if cls not in cls._instances:
-            cls._instances[cls] = super(Singleton, cls).__call__(*args, **kwargs)
-        return cls._instances[cls]
+        if hasattr(cls, "_singleton_key"):
+            key = (cls, cls._singleton_key(*args, **kwargs))
+        else:
+            key = (cls, args, tuple(sorted(kwargs.items())))
+        if key not in cls._instances:
+            cls._instances[key] = super(Singleton, cls).__call__(*args, **kwargs)
+        return cls._instances[key]
@@ -0,0 +1,56 @@
+from __future__ import annotations
+
+
+class SparseBuffer:
+    """bytearray-like buffer of a fixed size that only allocates the pages written to (unwritten bytes read as 0)"""
+
+    PageSize = 4096
+
+    def __init__(self, size: int):
+        self.size = size
+        self.pages = {}  # Page index -> bytearray(PageSize)
+
+    def __len__(self) -> int:
+        return self.size
+
+    def _range(self, key: int | slice) -> tuple[int, int]:
+        if isinstance(key, slice):
+            start, stop, step = key.indices(self.size)
+            if step != 1:
+                raise ValueError("SparseBuffer does not support extended slices!")
+            return start, max(start, stop)
+
+        index = key + self.size if key < 0 else key
+        if not 0 <= index < self.size:
+            raise IndexError("SparseBuffer index out of range!")
+        return index, index + 1
+
+    def _page_sections(self, start: int, stop: int):
+        # Yield (page index, start in page, stop in page, offset in range) of the pages touched by [start, stop)
+        position = start
+        while position < stop:
+            page_index, page_start = divmod(position, SparseBuffer.PageSize)
+            page_stop = min(SparseBuffer.PageSize, page_start + stop - position)
+            yield page_index, page_start, page_stop, position - start
+            position += page_stop - page_start
+
+    def __getitem__(self, key: int | slice) -> bytearray | int:
+        start, stop = self._range(key)
+        data = bytearray(stop - start)
+        for page_index, page_start, page_stop, offset in self._page_sections(start, stop):
+            page = self.pages.get(page_index)
+            if page is not None:
+                data[offset : offset + page_stop - page_start] = page[page_start:page_stop]
+        return data if isinstance(key, slice) else data[0]
+
+    def __setitem__(self, key: int | slice, value) -> None:
+        start, stop = self._range(key)
+        data = memoryview(bytes([value]) if isinstance(key, int) else value).cast("B")
+        if len(data) != stop - start:
+            raise ValueError("SparseBuffer cannot be resized!")
+
+        for page_index, page_start, page_stop, offset in self._page_sections(start, stop):
+            page = self.pages.get(page_index)
+            if page is None:
+                page = self.pages[page_index] = bytearray(SparseBuffer.PageSize)
+            page[page_start:page_stop] = data[offset : offset + page_stop - page_start]
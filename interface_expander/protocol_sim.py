@@ -0,0 +1,133 @@
+"""
+pySerial URL handler for the simulated interface expander
+
+    sim://[name][?latency=<seconds>&bus_time=<scale>&loopback]
+
+Ports with the same name share one simulated device (the device keeps its state between connections).
+latency delays every message sent to the host (default 0, the response is received without a thread switch,
+e.g. latency=0.0005 for the round trip of a USB device), bus_time scales the I2C bus and memory write times
+(0: instant). With loopback all written bytes are received again, no device is simulated.
+"""
+
+from __future__ import annotations
+from serial.serialutil import SerialBase, SerialException, PortNotOpenError
+from interface_expander.Simulator import Simulator
+import urllib.parse as urlparse
+import threading
+import time
+
+SIMULATORS = {}  # Name -> Simulator
+
+
+def get_simulator(name: str) -> Simulator:
+    if name not in SIMULATORS:
+        SIMULATORS[name] = Simulator()
+    return SIMULATORS[name]
+
+
+class Serial(SerialBase):
+    reset_time = 0.0  # The simulated device restarts instantly
+
+    def __init__(self, *args, **kwargs):
+        self.simulator = None
+        self.loopback = False
+        self.rx_buffer = bytearray()
+        self.rx_condition = threading.Condition()
+        self.cancel = False
+        super(Serial, self).__init__(*args, **kwargs)
+
+    def open(self):
+        if self.is_open:
+            raise SerialException("Port is already open.")
+        if self._port is None:
+            raise SerialException("Port must be configured before it can be used.")
+
+        self.rx_buffer = bytearray()
+        self.cancel = False
+        self.from_url(self.port)
+        if not self.loopback:
+            self.simulator.connect(self._receive)
+        self.is_open = True
+
+    def close(self):
+        if self.is_open:
+            self.is_open = False
+            if self.simulator is not None:
+                self.simulator.disconnect()
+            self.cancel_read()
+        super(Serial, self).close()
+
+    def _reconfigure_port(self):
+        pass
+
+    def from_url(self, url: str):
+        parts = urlparse.urlsplit(url)
+        if parts.scheme != "sim":
+            raise SerialException('expected a string in the form "sim://[name][?options]": not starting with sim://')
+
+        options = urlparse.parse_qs(parts.query, True)
+        self.loopback = "loopback" in options
+        if self.loopback:
+            return
+
+        self.simulator = get_simulator(parts.netloc)
+        for option, values in options.items():
+            if option == "latency":
+                self.simulator.latency = float(values[0])
+            elif option == "bus_time":
+                self.simulator.bus_time = float(values[0])
+            else:
+                raise SerialException("unknown option: {!r}".format(option))
+
+    @property
+    def in_waiting(self) -> int:
+        if not self.is_open:
+            raise PortNotOpenError()
+        return len(self.rx_buffer)
+
+    def read(self, size: int = 1) -> bytes:
+        if not self.is_open:
+            raise PortNotOpenError()
+
+        deadline = None if self._timeout is None else time.monotonic() + self._timeout
+        with self.rx_condition:
+            while len(self.rx_buffer) < size and not self.cancel and self.is_open:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    break
+                self.rx_condition.wait(remaining)
+            self.cancel = False
+
+            data = bytes(self.rx_buffer[:size])
+            del self.rx_buffer[:size]
+        return data
+
+    def write(self, data) -> int:
+        if not self.is_open:
+            raise PortNotOpenError()
+        data = bytes(data)
+        if self.loopback:
+            self._receive(data)
+        else:
+            self.simulator.receive(data)
+        return len(data)
+
+    def cancel_read(self):
+        with self.rx_condition:
+            self.cancel = True
+            self.rx_condition.notify_all()
+
+    def cancel_write(self):
+        pass
+
+    def reset_input_buffer(self):
+        with self.rx_condition:
+            self.rx_buffer.clear()
+
+    def reset_output_buffer(self):
+        pass
+
+    def _receive(self, data: bytes):
+        with self.rx_condition:
+            self.rx_buffer.extend(data)
+            self.rx_condition.notify_all()
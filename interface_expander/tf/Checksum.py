@@ -0,0 +1,65 @@
+"""
+Checksum functions used by TinyFrame
+
+All functions take a bytes-like buffer and return the checksum as int.
+"""
+
+import binascii
+
+def _make_crc16_table() -> tuple:
+    """ Build the lookup table for the reflected CRC-16 (poly 0x8005, init 0x0000) """
+    poly = 0xA001  # 0x8005 reflected
+    table = []
+    for i in range(256):
+        reg = i
+        for _ in range(8):
+            if reg & 1:
+                reg = (reg >> 1) ^ poly
+            else:
+                reg >>= 1
+        table.append(reg)
+    return tuple(table)
+
+CRC16_TABLE = _make_crc16_table()
+
+def none(buffer) -> int:
+    """ No checksum """
+    return 0
+
+def xor(buffer) -> int:
+    """ Inverted XOR of all bytes (1 byte) """
+    size = len(buffer)
+    if size == 0:
+        return 0xFF
+
+    # Fold the buffer (as one big integer) in halves until a single byte is left
+    acc = int.from_bytes(buffer, byteorder='big', signed=False)
+    width = size
+    while width > 1:
+        half = width // 2
+        shift = (width - half) * 8
+        acc = (acc >> shift) ^ (acc & ((1 << shift) - 1))
+        width -= half
+
+    return (~acc) & 0xFF
+
+def crc16(buffer) -> int:
+    """ CRC-16 (poly 0x8005, reflected in/out, init 0x0000) """
+    table = CRC16_TABLE
+    reg = 0
+    for b in buffer:
+        reg = (reg >> 8) ^ table[(reg ^ b) & 0xFF]
+    return reg
+
+def crc32(buffer) -> int:
+    """ Standard CRC-32 """
+    return binascii.crc32(buffer)
+
+# checksum type -> (function, number of bytes)
+CKSUM_TYPES = {
+    'none': (none, 0),
+    None: (none, 0),
+    'xor': (xor, 1),
+    'crc16': (crc16, 2),
+    'crc32': (crc32, 4),
+}
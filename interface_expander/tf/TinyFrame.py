@@ -1,13 +1,15 @@
-import binascii
+import interface_expander.tf.Checksum as Checksum
 
 class TinyFrame:
     def __init__(self, peer:int=1):
         self.write = None # the writer function should be attached here
+        self.frame_sink = None # if set, received frames are passed to it instead of the listeners
 
         self.id_listeners = {}
         self.type_listeners = {}
         self.fallback_listener = None
         self.peer = peer # the peer bit
+        self.userdata = None # arbitrary user data (e.g. the device the instance belongs to)
 
         # ----------------------------- FRAME FORMAT ---------------------------------
         #  The format can be adjusted to fit your particular application needs
@@ -46,6 +48,10 @@ class TinyFrame:
         #  Value of the SOF byte (if TF_USE_SOF_BYTE == 1)
         self.SOF_BYTE = 0x01
 
+        #  Parse whole frames from received chunks using slices (requires SOF byte and checksum),
+        #  frames split across chunks fall back to the byte-by-byte parser
+        self.BULK_PARSER = True
+
         self.next_frame_id = 0
 
         self.reset_parser()
@@ -64,69 +70,15 @@ class TinyFrame:
         # received frame
         self.rf = TF_Msg()
 
-    def _reflect(self, num, width):
-        """Reverts bit order of the given number
-
-        Args:
-            num (int): Number that should be reflected
-            width (int): Size of the number in bits
-        """
-        reflected = 0
-
-        for i in range(width):
-            if (num >> i) & 1 != 0:
-                reflected |= 1 << (width - 1 - i)
-
-        return reflected
-
-    def _crc16(self, data: bytes):
-        xor_in = 0x0000  # initial value
-        xor_out = 0x0000  # final XOR value
-        poly = 0x8005  # generator polinom (normal form)
-
-        reg = xor_in
-        for byte in data:
-            cur_byte = self._reflect(byte, 8)
-            for i in range(8):
-                topbit = reg & 0x8000
-                if cur_byte & (0x80 >> i):
-                    topbit ^= 0x8000
-                reg <<= 1
-                if topbit:
-                    reg ^= poly
-            reg &= 0xFFFF
-        return self._reflect(reg ^ xor_out, 16)
-
     def _calc_cksum_bytes(self):
-        if self.CKSUM_TYPE == 'none' or self.CKSUM_TYPE is None:
-            return 0
-        elif self.CKSUM_TYPE == 'xor':
-            return 1
-        elif self.CKSUM_TYPE == 'crc16':
-            return 2
-        elif self.CKSUM_TYPE == 'crc32':
-            return 4
-        else:
+        if self.CKSUM_TYPE not in Checksum.CKSUM_TYPES:
             raise Exception("Bad cksum type!")
+        return Checksum.CKSUM_TYPES[self.CKSUM_TYPE][1]
 
     def _cksum(self, buffer) -> int:
-        if self.CKSUM_TYPE == 'none' or self.CKSUM_TYPE is None:
-            return 0
-
-        elif self.CKSUM_TYPE == 'xor':
-            acc = 0
-            for b in buffer:
-                acc ^= b
-            return (~acc) & ((1<<(self._CKSUM_BYTES*8))-1)
-
-        elif self.CKSUM_TYPE == 'crc16':
-            return self._crc16(buffer)
-
-        elif self.CKSUM_TYPE == 'crc32':
-            return binascii.crc32(buffer)
-
-        else:
+        if self.CKSUM_TYPE not in Checksum.CKSUM_TYPES:
             raise Exception("Bad cksum type!")
+        return Checksum.CKSUM_TYPES[self.CKSUM_TYPE][0](buffer)
 
     def _gen_frame_id(self) -> int:
         """
@@ -197,11 +149,80 @@ class TinyFrame:
 
         return (id, buf)
 
-    def accept(self, bytes):
+    def accept(self, data):
         """
         Parse bytes received on the serial port
         """
-        for b in bytes:
+        if self._CKSUM_BYTES is None:
+            self._CKSUM_BYTES = self._calc_cksum_bytes()
+
+        if not self.BULK_PARSER or not self.USE_SOF_BYTE or self._CKSUM_BYTES == 0:
+            for b in data:
+                self.accept_byte(b)
+            return
+
+        if not isinstance(data, (bytes, bytearray)):
+            data = bytes(data)
+
+        pos = 0
+        size = len(data)
+
+        # Finish a frame that was split across chunks
+        while pos < size and self.ps != 'SOF':
+            self.accept_byte(data[pos])
+            pos += 1
+
+        head_size = 1 + self.ID_BYTES + self.LEN_BYTES + self.TYPE_BYTES
+        id_end = 1 + self.ID_BYTES
+        len_end = id_end + self.LEN_BYTES
+
+        while pos < size:
+            sof = data.find(self.SOF_BYTE, pos)
+            if sof < 0:
+                return
+
+            head_end = sof + head_size
+            hck_end = head_end + self._CKSUM_BYTES
+            if hck_end > size:
+                break  # Incomplete header
+
+            head = data[sof:head_end]
+            hck = self._unpack(data[head_end:hck_end])
+            if hck != self._cksum(head):
+                pos = hck_end  # Same bytes are consumed as by the byte parser
+                continue
+
+            frame = TF_Msg()
+            frame.id = self._unpack(head[1:id_end])
+            frame.len = self._unpack(head[id_end:len_end])
+            frame.type = self._unpack(head[len_end:])
+
+            if frame.len == 0:
+                self.rf = frame
+                self._emit_frame()
+                self.reset_parser()
+                pos = hck_end
+                continue
+
+            pld_end = hck_end + frame.len
+            pck_end = pld_end + self._CKSUM_BYTES
+            if pck_end > size:
+                break  # Incomplete payload
+
+            payload = bytearray(data[hck_end:pld_end])
+            pck = self._unpack(data[pld_end:pck_end])
+            if pck == self._cksum(payload):
+                frame.data = payload
+                self.rf = frame
+                self._emit_frame()
+                self.reset_parser()
+
+            pos = pck_end
+        else:
+            return
+
+        # Feed the incomplete frame to the byte parser, it continues with the next chunk
+        for b in data[sof:]:
             self.accept_byte(b)
 
     def accept_byte(self, b:int):
@@ -277,7 +298,7 @@ class TinyFrame:
                     self.reset_parser()
                 else:
                     if self.rf.len == 0:
-                        self.handle_rx_frame()
+                        self._emit_frame()
                         self.reset_parser()
                     else:
                         self.ps = 'PLD'
@@ -298,7 +319,7 @@ class TinyFrame:
                     self.rlen = self._CKSUM_BYTES
                     self.rbuf = bytearray()
                 else:
-                    self.handle_rx_frame()
+                    self._emit_frame()
                     self.reset_parser()
             return
 
@@ -312,12 +333,20 @@ class TinyFrame:
                 if pck != actual:
                     self.reset_parser()
                 else:
-                    self.handle_rx_frame()
+                    self._emit_frame()
                     self.reset_parser()
             return
 
-    def handle_rx_frame(self):
-        frame = self.rf
+    def _emit_frame(self):
+        if self.frame_sink is not None:
+            self.frame_sink(self.rf)
+        else:
+            self.handle_rx_frame()
+
+    def handle_rx_frame(self, frame=None):
+        """ Run the listeners for a received frame (the last parsed frame by default) """
+        if frame is None:
+            frame = self.rf
 
         if frame.id in self.id_listeners and self.id_listeners[frame.id] is not None:
             lst = self.id_listeners[frame.id]
@@ -1,3 +1,4 @@
+from __future__ import annotations
 import interface_expander.tf.TinyFrame as TF
 from enum import Enum
 
@@ -11,7 +12,7 @@ class TfMsgType(Enum):
     TYPE_GPIO = 0x05
 
 
-TF_INSTANCE = TF.TinyFrame()
+TF_CALLBACKS = {}  # Message type -> callback, shared by the instances of all expanders
 TF_FRAME_START = 0x01
 TF_START_BYTES = 1  # 0x01 => 1 byte
 TF_ID_BYTES = 1
@@ -21,9 +22,10 @@ TF_CKSUM_BYTES = 1  # xor => 1 byte
 TF_FRAME_OVERHEAD_SIZE = TF_START_BYTES + TF_ID_BYTES + TF_LEN_BYTES + TF_TYPE_BYTES + TF_CKSUM_BYTES + 1
 
 
-def tf_init(write_callback) -> TF.TinyFrame:
-    global TF_INSTANCE, TF_FRAME_START, TF_ID_BYTES, TF_LEN_BYTES
-    tf = TF_INSTANCE
+def tf_init(write_callback, userdata=None) -> TF.TinyFrame:
+    """Create the TinyFrame instance of one expander. The callbacks find the expander in tf.userdata."""
+    global TF_FRAME_START, TF_ID_BYTES, TF_LEN_BYTES
+    tf = TF.TinyFrame()
 
     tf.SOF_BYTE = TF_FRAME_START
     tf.ID_BYTES = TF_ID_BYTES
@@ -31,19 +33,19 @@ def tf_init(write_callback) -> TF.TinyFrame:
     tf.TYPE_BYTES = TF_TYPE_BYTES
     tf.CKSUM_TYPE = 'xor'
     tf.write = write_callback
-    tf.add_fallback_listener(tf_fallback_cb)
+    tf.userdata = userdata
+    tf.add_fallback_listener(tf_dispatch_cb)
+
     return tf
 
 
 def tf_register_callback(msg_type: TfMsgType, callback) -> None:
-    global TF_INSTANCE
-    TF_INSTANCE.add_type_listener(msg_type.value, callback)
-
-
-def tf_send(msg_type: TfMsgType, msg) -> None:
-    global TF_INSTANCE
-    TF_INSTANCE.send(msg_type.value, msg)
+    global TF_CALLBACKS
+    TF_CALLBACKS[msg_type.value] = callback
 
 
-def tf_fallback_cb(tf, msg):
-    raise Exception("No TF type listener fond for this msg:\n" + str(msg.data))
+def tf_dispatch_cb(tf, msg):
+    callback = TF_CALLBACKS.get(msg.type)
+    if callback is None:
+        raise Exception("No TF type listener fond for this msg:\n" + str(msg.data))
+    callback(tf, msg)
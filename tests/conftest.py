@@ -0,0 +1,34 @@
+from interface_expander.I2cInterface import I2cInterface
+from interface_expander.Memory import Memory, MemoryType, MemoryAddressWidth
+from typing import Callable
+import pytest
+
+FRAM_SLAVE_ADDR = 0x51  # 32 kByte FRAM of the test board
+FRAM_SIZE = pow(2, 15)
+EEPROM_SLAVE_ADDR = 0x52  # 128 kByte EEPROM of the test board
+EEPROM_SIZE = pow(2, 17)
+EEPROM_PAGE_SIZE = 256
+
+
+@pytest.fixture
+def create_memory() -> Callable[..., Memory]:
+    """Factory for the memories of the test board, create_memory(interface, memory_type, slave_address=None,
+    **options) passes the options (read_cache, ...) to Memory."""
+
+    def create(interface: I2cInterface, memory_type: MemoryType, slave_address: int | None = None, **options) -> Memory:
+        if memory_type == MemoryType.FRAM:
+            default_address, page_count, page_size = FRAM_SLAVE_ADDR, 1, FRAM_SIZE
+        else:
+            default_address, page_size = EEPROM_SLAVE_ADDR, EEPROM_PAGE_SIZE
+            page_count = EEPROM_SIZE // EEPROM_PAGE_SIZE
+        return Memory(
+            interface=interface,
+            slave_address=default_address if slave_address is None else slave_address,
+            memory_type=memory_type,
+            address_width=MemoryAddressWidth.TWO_BYTES,
+            page_count=page_count,
+            page_size=page_size,
+            **options,
+        )
+
+    return create
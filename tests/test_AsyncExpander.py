@@ -0,0 +1,187 @@
+#!/usr/bin/env python
+
+"""Testing asyncio API"""
+
+from interface_expander.InterfaceExpander import InterfaceExpander
+from interface_expander.I2cInterface import (
+    I2cInterface,
+    I2cConfig,
+    ClockFreq,
+    AddressWidth,
+    I2cId,
+    I2cMasterRequest,
+    I2C_MASTER_QUEUE_SPACE,
+)
+from interface_expander.Memory import Memory, MemoryType, MemoryAddressWidth, MemoryOperation
+from interface_expander.DigitalToAnalog import DigitalToAnalog, DAC_MAX_SAMPLE_BUFFER_SPACE
+from interface_expander.AsyncExpander import AsyncExpander, AsyncI2cInterface, AsyncMemory, AsyncDigitalToAnalog
+from tests.helper import generate_ascii_data
+import asyncio
+import pytest
+import random
+import threading
+import time
+
+
+class TestAsyncExpander:
+    WRITE_READ_COUNT = 42
+    DATA_SIZE_MAX = 1024
+    STREAM_COUNT = 10
+    SAMPLING_RATE = 20000
+
+    I2C_CLOCK_FREQ = ClockFreq.FREQ400K
+    FRAM_SLAVE_ADDR = 0x51
+    FRAM_SIZE = pow(2, 15)
+
+    def test_concurrent_memory_and_dac_stream(self):
+        expander = InterfaceExpander()
+        expander.reset()
+
+        async def memory_task(mem: AsyncMemory):
+            for _ in range(TestAsyncExpander.WRITE_READ_COUNT):
+                data = generate_ascii_data(1, TestAsyncExpander.DATA_SIZE_MAX)
+                address = random.randint(0, TestAsyncExpander.FRAM_SIZE - len(data))
+                mem.write(address=address, data=data)
+                await mem.flush()
+                assert await mem.read(address=address, length=len(data)) == data
+
+            mem.write(address=address, data=data)  # Unchanged, a differential flush skips the page
+            assert await mem.flush(differential=True, verify=True) == (0, 1)
+            assert await mem.verify(address=address, length=len(data)) == []
+
+        async def dac_task(dac: AsyncDigitalToAnalog):
+            sequence = [random.uniform(-1.0, 1.0) for _ in range(DAC_MAX_SAMPLE_BUFFER_SPACE + 42)]
+            rate = TestAsyncExpander.SAMPLING_RATE
+            for _ in range(TestAsyncExpander.STREAM_COUNT):
+                await dac.stream_sequence(
+                    sequence_ch0=sequence, sampling_rate_ch0=rate, sequence_ch1=sequence, sampling_rate_ch1=rate
+                )
+
+        async def main():
+            async_expander = AsyncExpander(expander)
+            await async_expander.connect()
+
+            cfg0 = I2cConfig(
+                clock_freq=TestAsyncExpander.I2C_CLOCK_FREQ, slave_addr=0x01, slave_addr_width=AddressWidth.Bits7
+            )
+            i2c0 = I2cInterface(i2c_id=I2cId.I2C0, config=cfg0)
+            mem = Memory(
+                interface=i2c0,
+                slave_address=TestAsyncExpander.FRAM_SLAVE_ADDR,
+                memory_type=MemoryType.FRAM,
+                address_width=MemoryAddressWidth.TWO_BYTES,
+                page_count=1,
+                page_size=TestAsyncExpander.FRAM_SIZE,
+            )
+            dac = DigitalToAnalog()
+
+            try:
+                await asyncio.gather(memory_task(AsyncMemory(mem)), dac_task(AsyncDigitalToAnalog(async_expander, dac)))
+            finally:
+                async_expander.disconnect()
+
+        asyncio.run(main())
+
+    def test_request_timeout_and_cancellation(self):
+        expander = InterfaceExpander()
+
+        async def main():
+            async_expander = AsyncExpander(expander)
+            await async_expander.connect()
+            cfg0 = I2cConfig(
+                clock_freq=TestAsyncExpander.I2C_CLOCK_FREQ, slave_addr=0x01, slave_addr_width=AddressWidth.Bits7
+            )
+            i2c0 = I2cInterface(i2c_id=I2cId.I2C0, config=cfg0)
+            async_i2c0 = AsyncI2cInterface(i2c0)
+
+            def read_request() -> I2cMasterRequest:
+                address = bytes(2)
+                return I2cMasterRequest(slave_addr=TestAsyncExpander.FRAM_SLAVE_ADDR, write_data=address, read_size=128)
+
+            try:
+                # More requests than the device accepts, the last ones wait in the submit queue
+                futures = [i2c0.submit(read_request()) for _ in range(2 * I2C_MASTER_QUEUE_SPACE)]
+                timed_out = read_request()
+                with pytest.raises(TimeoutError, match="submit queue position"):
+                    await async_i2c0.request(timed_out, timeout=0.0)
+                cancelled = read_request()
+                task = asyncio.create_task(async_i2c0.request(cancelled))
+                await asyncio.sleep(0)
+                task.cancel()
+                with pytest.raises(asyncio.CancelledError):
+                    await task
+
+                # Both are removed from the submit queue and never sent
+                assert all(request not in (timed_out, cancelled) for request, _ in i2c0.master_submit_queue)
+                await asyncio.gather(*(asyncio.wrap_future(future) for future in futures))
+                assert timed_out.request_id is None and cancelled.request_id is None
+                assert not i2c0.master_submit_queue
+            finally:
+                async_expander.disconnect()
+
+        asyncio.run(main())
+
+    def test_memory_read_cache_prefetch_and_lock(self):
+        expander = InterfaceExpander()
+
+        async def main():
+            async_expander = AsyncExpander(expander)
+            await async_expander.connect()
+            cfg0 = I2cConfig(
+                clock_freq=TestAsyncExpander.I2C_CLOCK_FREQ, slave_addr=0x01, slave_addr_width=AddressWidth.Bits7
+            )
+            i2c0 = I2cInterface(i2c_id=I2cId.I2C0, config=cfg0)
+            mem = Memory(
+                interface=i2c0,
+                slave_address=TestAsyncExpander.FRAM_SLAVE_ADDR,
+                memory_type=MemoryType.FRAM,
+                address_width=MemoryAddressWidth.TWO_BYTES,
+                page_count=1,
+                page_size=TestAsyncExpander.FRAM_SIZE,
+                read_cache=True,
+                prefetch_depth=4,
+            )
+            async_mem = AsyncMemory(mem)
+
+            try:
+                # Only the gaps of the read cache are read, as by Memory.read()
+                data = await async_mem.read(address=0, length=1024)
+                sent_frames = expander.tx_frames
+                assert await async_mem.read(address=256, length=512) == data[256:768]
+                assert expander.tx_frames == sent_frames
+                mem.invalidate(address=512, length=100)
+                assert await async_mem.read(address=0, length=1024) == data
+                assert expander.tx_frames - sent_frames == len(mem.plan(512, 100, MemoryOperation.READ))
+
+                # The requests issued ahead by the prefetcher are dropped
+                mem.read(address=2048, length=64)
+                mem.read(address=2112, length=64)
+                assert mem.prefetch_queue
+                await async_mem.read(address=4096, length=16)
+                assert not mem.prefetch_queue and mem.prefetch_next is None
+
+                # Operations wait while another thread holds the memory, a failed write-back is raised first
+                locked = threading.Event()
+
+                def hold_memory():
+                    with mem.io_lock:
+                        locked.set()
+                        time.sleep(0.1)
+
+                thread = threading.Thread(target=hold_memory)
+                thread.start()
+                locked.wait()
+                start_time = time.monotonic()
+                assert await async_mem.read(address=0, length=16) == data[:16]
+                assert time.monotonic() - start_time >= 0.09
+                thread.join()
+
+                mem.write(address=0, data=b"lost?")
+                mem.write_back_error = TimeoutError("Memory did not complete the write cycle!")
+                with pytest.raises(TimeoutError):
+                    await async_mem.flush()
+                assert await async_mem.flush() == (1, 0)
+            finally:
+                async_expander.disconnect()
+
+        asyncio.run(main())
@@ -0,0 +1,97 @@
+#!/usr/bin/env python
+
+"""Testing TinyFrame checksum functions"""
+
+import interface_expander.tf.Checksum as Checksum
+import interface_expander.tf.TinyFrame as TF
+import binascii
+import random
+import time
+
+
+def reference_xor(buffer: bytes) -> int:
+    acc = 0
+    for b in buffer:
+        acc ^= b
+    return (~acc) & 0xFF
+
+
+def reference_reflect(num: int, width: int) -> int:
+    reflected = 0
+    for i in range(width):
+        if (num >> i) & 1 != 0:
+            reflected |= 1 << (width - 1 - i)
+    return reflected
+
+
+def reference_crc16(buffer: bytes) -> int:
+    poly = 0x8005
+    reg = 0x0000
+    for byte in buffer:
+        cur_byte = reference_reflect(byte, 8)
+        for i in range(8):
+            topbit = reg & 0x8000
+            if cur_byte & (0x80 >> i):
+                topbit ^= 0x8000
+            reg <<= 1
+            if topbit:
+                reg ^= poly
+        reg &= 0xFFFF
+    return reference_reflect(reg, 16)
+
+
+class TestChecksum:
+    BUFFER_COUNT = 500
+    BUFFER_SIZE_MAX = 300
+    BENCHMARK_SIZES = [5, 16, 64, 140, 320]
+    BENCHMARK_LOOPS = 2000
+
+    def test_checksums_match_reference(self):
+        rnd = random.Random(42)
+        for _ in range(TestChecksum.BUFFER_COUNT):
+            size = rnd.randint(0, TestChecksum.BUFFER_SIZE_MAX)
+            buffer = bytes(rnd.getrandbits(8) for _ in range(size))
+
+            assert Checksum.xor(buffer) == reference_xor(buffer)
+            assert Checksum.xor(bytearray(buffer)) == reference_xor(buffer)
+            assert Checksum.crc16(buffer) == reference_crc16(buffer)
+            assert Checksum.crc32(buffer) == binascii.crc32(buffer)
+
+    def test_crc16_check_value(self):
+        # CRC-16/ARC check value
+        assert Checksum.crc16(b"123456789") == 0xBB3D
+
+    def test_checksum_type_selection(self):
+        for cksum_type, cksum_bytes in (("xor", 1), ("crc16", 2), ("crc32", 4)):
+            tf = TF.TinyFrame()
+            tf.CKSUM_TYPE = cksum_type
+            frames = []
+            tf.add_fallback_listener(lambda _, msg: frames.append(bytes(msg.data)))
+
+            _, frame = tf._compose(type=1, pld=b"checksum")
+            assert tf._CKSUM_BYTES == cksum_bytes
+            assert len(frame) == 1 + tf.ID_BYTES + tf.LEN_BYTES + tf.TYPE_BYTES + 2 * cksum_bytes + len(b"checksum")
+
+            tf.accept(frame)
+            assert frames == [b"checksum"]
+
+    def test_checksum_speed(self):
+        functions = [
+            ("xor (reference)", reference_xor),
+            ("xor", Checksum.xor),
+            ("crc16 (reference)", reference_crc16),
+            ("crc16", Checksum.crc16),
+            ("crc32", Checksum.crc32),
+        ]
+        for size in TestChecksum.BENCHMARK_SIZES:
+            buffer = bytes(random.getrandbits(8) for _ in range(size))
+            for name, fn in functions:
+                start_time = time.perf_counter()
+                for _ in range(TestChecksum.BENCHMARK_LOOPS):
+                    fn(buffer)
+                elapsed_time = time.perf_counter() - start_time
+                print(
+                    f"Size: {size:3d} bytes, {name:17s}: "
+                    f"{elapsed_time / TestChecksum.BENCHMARK_LOOPS * 1e6:8.2f} us/call, "
+                    f"{size * TestChecksum.BENCHMARK_LOOPS / elapsed_time / 1e6:8.2f} MB/s"
+                )
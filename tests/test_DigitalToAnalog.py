@@ -3,6 +3,8 @@ from interface_expander.DigitalToAnalog import DigitalToAnalog, DAC_MAX_SAMPLE_B
 import math
 import time
 import random
+import pytest
+import os
 
 
 class TestDigitalToAnalog:
@@ -46,6 +48,10 @@ class TestDigitalToAnalog:
             )
         expander.disconnect()
 
+    @pytest.mark.skipif(
+        os.environ.get(InterfaceExpander.PortEnvironmentVariable, "").startswith("sim://"),
+        reason="Streams at 20 kHz, a busy host sharing the CPU with the simulator causes underruns",
+    )
     def test_stream_sequence(self):
         expander = InterfaceExpander()
         expander.reset()
@@ -3,8 +3,9 @@
 """Testing I2c master write/read"""
 
 from interface_expander.InterfaceExpander import InterfaceExpander
-from interface_expander.I2cInterface import I2cInterface, I2cConfig, ClockFreq, AddressWidth, I2cId
+from interface_expander.I2cInterface import I2cInterface, I2cConfig, ClockFreq, AddressWidth, I2cId, I2cStatusCode
 from tests.helper import generate_master_write_read_requests, i2c_send_request, verify_master_write_read_requests
+import time
 
 
 class TestI2cMaster:
@@ -88,3 +89,117 @@ class TestI2cMaster:
             verify_master_write_read_requests(i2c1)
 
         expander.disconnect()
+
+    def test_i2c_master_cpu_time_per_request(self):
+        # Compare host CPU time per completed request with and without the background reader
+        for background_reader in (False, True):
+            expander = InterfaceExpander()
+            expander.reset()
+            expander.connect(background_reader=background_reader)
+
+            cfg0 = I2cConfig(
+                clock_freq=TestI2cMaster.I2C_CLOCK_FREQ,
+                slave_addr=0x01,
+                slave_addr_width=AddressWidth.Bits7,
+                mem_addr_width=AddressWidth.Bits16,
+            )
+            i2c0 = I2cInterface(i2c_id=I2cId.I2C0, config=cfg0, callback_fn=None)
+
+            requests = generate_master_write_read_requests(
+                slave_addr=TestI2cMaster.FRAM_SLAVE_ADDR,
+                min_addr=TestI2cMaster.FRAM_0_MIN_ADDR,
+                max_addr=TestI2cMaster.FRAM_0_MAX_ADDR,
+                min_size=TestI2cMaster.DATA_SIZE_MIN,
+                max_size=TestI2cMaster.DATA_SIZE_MAX,
+                count=TestI2cMaster.REQUEST_COUNT // 8,
+            )
+            request_count = len(requests)
+
+            start_cpu_time = time.process_time()
+            start_time = time.perf_counter()
+            for request in requests:
+                rid = i2c0.send_request(request=request)
+                i2c0.wait_for_response(request_id=rid, timeout=0.1, pop_request=True)
+            cpu_time = time.process_time() - start_cpu_time
+            elapsed_time = time.perf_counter() - start_time
+
+            print(
+                f"Background reader: {background_reader}, requests: {request_count}, "
+                f"CPU time per request: {cpu_time / request_count * 1e6:.1f} us, "
+                f"wall time per request: {elapsed_time / request_count * 1e6:.1f} us"
+            )
+            expander.disconnect()
+
+    def test_i2c_master_pipelined_submit(self):
+        expander = InterfaceExpander()
+        expander.reset()
+        expander.connect(background_reader=True)
+
+        cfg0 = I2cConfig(
+            clock_freq=TestI2cMaster.I2C_CLOCK_FREQ,
+            slave_addr=0x01,
+            slave_addr_width=AddressWidth.Bits7,
+            mem_addr_width=AddressWidth.Bits16,
+        )
+        i2c0 = I2cInterface(i2c_id=I2cId.I2C0, config=cfg0, callback_fn=None)
+
+        requests = generate_master_write_read_requests(
+            slave_addr=TestI2cMaster.FRAM_SLAVE_ADDR,
+            min_addr=TestI2cMaster.FRAM_0_MIN_ADDR,
+            max_addr=TestI2cMaster.FRAM_0_MAX_ADDR,
+            min_size=TestI2cMaster.DATA_SIZE_MIN,
+            max_size=TestI2cMaster.DATA_SIZE_MAX,
+            count=TestI2cMaster.REQUEST_COUNT // 4,
+        )
+
+        start_time = time.perf_counter()
+        futures = [i2c0.submit(request) for request in requests]
+        completed = i2c0.wait_all(futures, timeout=60.0)
+        elapsed_time = time.perf_counter() - start_time
+
+        for write_request, read_request in zip(completed[0::2], completed[1::2]):
+            assert write_request.status_code == I2cStatusCode.SUCCESS
+            assert read_request.status_code == I2cStatusCode.SUCCESS
+            assert read_request.read_data == write_request.write_data[2:]
+        assert i2c0.master_requests == {}
+
+        print(f"Pipelined: {len(requests) / elapsed_time:.0f} transactions/second")
+        expander.disconnect()
+
+    def test_i2c_master_coalesced_tx(self):
+        expander = InterfaceExpander()
+        expander.reset()
+
+        for coalesce_tx in (False, True):
+            expander.connect(background_reader=True, coalesce_tx=coalesce_tx)
+            cfg0 = I2cConfig(
+                clock_freq=TestI2cMaster.I2C_CLOCK_FREQ,
+                slave_addr=0x01,
+                slave_addr_width=AddressWidth.Bits7,
+                mem_addr_width=AddressWidth.Bits16,
+            )
+            i2c0 = I2cInterface(i2c_id=I2cId.I2C0, config=cfg0, callback_fn=None)
+
+            requests = generate_master_write_read_requests(
+                slave_addr=TestI2cMaster.FRAM_SLAVE_ADDR,
+                min_addr=TestI2cMaster.FRAM_0_MIN_ADDR,
+                max_addr=TestI2cMaster.FRAM_0_MAX_ADDR,
+                min_size=TestI2cMaster.DATA_SIZE_MIN,
+                max_size=TestI2cMaster.DATA_SIZE_MAX,
+                count=TestI2cMaster.REQUEST_COUNT // 4,
+            )
+
+            start_time = time.perf_counter()
+            futures = [i2c0.submit(request) for request in requests]
+            completed = i2c0.wait_all(futures, timeout=60.0)
+            elapsed_time = time.perf_counter() - start_time
+
+            for write_request, read_request in zip(completed[0::2], completed[1::2]):
+                assert read_request.status_code == I2cStatusCode.SUCCESS
+                assert read_request.read_data == write_request.write_data[2:]
+
+            print(
+                f"Coalesced TX: {coalesce_tx}, {len(requests) / elapsed_time:.0f} transactions/second, "
+                f"{expander.tx_frames / expander.tx_writes:.2f} frames/write"
+            )
+            expander.disconnect()
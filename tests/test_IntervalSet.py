@@ -0,0 +1,92 @@
+#!/usr/bin/env python
+
+"""Testing IntervalSet class"""
+
+from interface_expander.IntervalSet import IntervalSet
+from interface_expander.Memory import Memory, MemoryType, MemoryAddressWidth
+import random
+import time
+
+
+class TestIntervalSet:
+    def test_merge_overlapping_and_adjacent(self):
+        intervals = IntervalSet()
+        intervals.add(10, 20)
+        intervals.add(30, 40)
+        intervals.add(50, 60)
+        assert list(intervals) == [(10, 20), (30, 40), (50, 60)]
+
+        intervals.add(20, 30)  # Adjacent on both sides
+        assert list(intervals) == [(10, 40), (50, 60)]
+
+        intervals.add(5, 55)  # Overlaps everything
+        assert list(intervals) == [(5, 60)]
+
+        intervals.add(0, 0)  # Empty
+        intervals.add(70, 80)
+        intervals.add(72, 75)  # Contained
+        assert list(intervals) == [(5, 60), (70, 80)]
+
+        intervals.clear()
+        assert not intervals
+
+    def test_remove_and_gaps(self):
+        intervals = IntervalSet()
+        intervals.add(10, 20)
+        intervals.add(30, 40)
+        assert intervals.gaps(0, 50) == [(0, 10), (20, 30), (40, 50)]
+        assert intervals.gaps(12, 18) == []
+        assert intervals.gaps(15, 35) == [(20, 30)]
+
+        intervals.remove(15, 35)
+        assert list(intervals) == [(10, 15), (35, 40)]
+        intervals.remove(0, 12)
+        intervals.remove(36, 37)
+        assert list(intervals) == [(12, 15), (35, 36), (37, 40)]
+        intervals.remove(0, 100)
+        assert not intervals
+
+    def test_random_against_reference(self):
+        intervals = IntervalSet()
+        reference = bytearray(1000)
+        for _ in range(2000):
+            start = random.randint(0, 990)
+            end = start + random.randint(0, 10)
+            if random.random() < 0.7:
+                intervals.add(start, end)
+                reference[start:end] = b"\x01" * (end - start)
+            else:
+                intervals.remove(start, end)
+                reference[start:end] = b"\x00" * (end - start)
+
+        previous_end = -1
+        covered = bytearray(1000)
+        for start, end in intervals:
+            assert previous_end < start < end  # Sorted, non-overlapping and not adjacent
+            covered[start:end] = b"\x01" * (end - start)
+            previous_end = end
+        assert covered == reference
+
+        gaps = bytearray(1000)
+        for start, end in intervals.gaps(0, 1000):
+            gaps[start:end] = b"\x01" * (end - start)
+        assert gaps == bytes(1 - byte for byte in reference)
+
+    def test_memory_byte_writes(self):
+        mem = Memory(
+            interface=None,
+            slave_address=0x50,
+            memory_type=MemoryType.EEPROM,
+            address_width=MemoryAddressWidth.TWO_BYTES,
+            page_count=1024,
+            page_size=256,
+        )
+
+        # One write per byte as with hex file records
+        start_time = time.perf_counter()
+        for address in range(mem.memory_size):
+            mem.write(address, b"\xaa")
+        elapsed_time = time.perf_counter() - start_time
+        print(f"{mem.memory_size} byte writes in {elapsed_time:.2f} seconds")
+
+        assert list(mem.updated_sections) == [(0, mem.memory_size)]
@@ -4,11 +4,13 @@
 
 from interface_expander.InterfaceExpander import InterfaceExpander
 from interface_expander.I2cInterface import I2cInterface, I2cConfig, ClockFreq, AddressWidth, I2cId, I2C_MAX_WRITE_SIZE
-from interface_expander.Memory import Memory, MemoryType, MemoryAddressWidth
+from interface_expander.Memory import Memory, MemoryType, MemoryAddressWidth, MemoryOperation, MemoryTransaction
 from tests.helper import generate_ascii_data
 from intelhex import IntelHex
 from time import sleep
+import time
 import random
+import pytest
 import os
 
 
@@ -38,18 +40,47 @@ class TestMemory:
         )
 
         address = pow(2, address_width.value * 8) - 1
-        mem._pack_slave_address(address)  # Should not change the slave address
-        assert mem.slave_address == eeprom_slave_addr
+        assert mem._pack_slave_address(address) == (eeprom_slave_addr, address)
 
         # If the memory size is larger than 2^16, the additional address bits will
         # be packed into the slave address byte.
         address = pow(2, address_width.value * 8)
-        mem._pack_slave_address(address)
-        assert mem.slave_address == 0b0101_0001  # 0x51 with additional address bit set
+        assert mem._pack_slave_address(address) == (0b0101_0001, 0)  # 0x51 with additional address bit set
+        assert mem.slave_address == eeprom_slave_addr  # Not changed by packing
 
         address = pow(2, address_width.value * 8) - 1
-        mem._pack_slave_address(address)  # Should not change the slave address
-        assert mem.slave_address == eeprom_slave_addr
+        assert mem._pack_slave_address(address) == (eeprom_slave_addr, address)
+
+    def test_transaction_plan(self):
+        mem = Memory(
+            interface=None,
+            slave_address=0x50,
+            memory_type=MemoryType.EEPROM,
+            address_width=MemoryAddressWidth.TWO_BYTES,
+            page_count=512,
+            page_size=256,
+        )
+
+        # Reads are split at the bank boundary, each transaction carries its own slave address
+        plan = mem.plan(0xFFF0, 32, MemoryOperation.READ)
+        assert plan == (
+            MemoryTransaction(address=0xFFF0, length=16, slave_addr=0x50, address_bytes=b"\xff\xf0"),
+            MemoryTransaction(address=0x10000, length=16, slave_addr=0x51, address_bytes=b"\x00\x00"),
+        )
+        assert mem.plan(0xFFF0, 32, MemoryOperation.READ) is plan  # Memoized
+        assert mem.slave_address == 0x50
+
+        # Writes are split at page boundaries and the maximum request size (address bytes included)
+        plan = mem.plan(0x1F0, 300, MemoryOperation.WRITE)
+        max_length = I2C_MAX_WRITE_SIZE - 2
+        assert [(transaction.address, transaction.length) for transaction in plan] == [
+            (0x1F0, 16),
+            (0x200, max_length),
+            (0x200 + max_length, max_length),
+            (0x200 + 2 * max_length, 0x100 - 2 * max_length),
+            (0x300, 300 - 16 - 0x100),
+        ]
+        assert plan[0].write_request(b"data").write_data == b"\x01\xf0data"
 
     def test_memory_write_read_fram(self):
         expander = InterfaceExpander()
@@ -76,6 +107,398 @@ class TestMemory:
             read_data = mem.read(address=address, length=len(data))
             assert read_data == data, f"Data mismatch at address {address}: expected {data}, got {read_data}"
 
+    def test_memory_flush_speed_fram(self):
+        expander = InterfaceExpander()
+        expander.connect()
+
+        cfg0 = I2cConfig(clock_freq=ClockFreq.FREQ1M, slave_addr=0x01, slave_addr_width=AddressWidth.Bits7)
+        i2c0 = I2cInterface(i2c_id=I2cId.I2C0, config=cfg0)
+
+        mem = Memory(
+            interface=i2c0,
+            slave_address=TestMemory.FRAM_SLAVE_ADDR,
+            memory_type=MemoryType.FRAM,
+            address_width=MemoryAddressWidth.TWO_BYTES,
+            page_count=1,
+            page_size=TestMemory.FRAM_SIZE,
+        )
+
+        data = os.urandom(TestMemory.FRAM_SIZE)
+        mem.write(address=0, data=data)
+        start_time = time.perf_counter()
+        mem.flush()
+        elapsed_time = time.perf_counter() - start_time
+        print(f"FRAM flush: {len(data) / elapsed_time:.0f} bytes/second")
+
+        mem.buffer = bytearray(TestMemory.FRAM_SIZE)
+        assert mem.read(address=0, length=TestMemory.FRAM_SIZE) == data
+        expander.disconnect()
+
+    def test_memory_read_cache_fram(self):
+        expander = InterfaceExpander()
+        expander.connect()
+
+        cfg0 = I2cConfig(clock_freq=TestMemory.I2C_CLOCK_FREQ, slave_addr=0x01, slave_addr_width=AddressWidth.Bits7)
+        i2c0 = I2cInterface(i2c_id=I2cId.I2C0, config=cfg0)
+
+        mem = Memory(
+            interface=i2c0,
+            slave_address=TestMemory.FRAM_SLAVE_ADDR,
+            memory_type=MemoryType.FRAM,
+            address_width=MemoryAddressWidth.TWO_BYTES,
+            page_count=1,
+            page_size=TestMemory.FRAM_SIZE,
+            read_cache=True,
+        )
+        uncached = Memory(
+            interface=i2c0,
+            slave_address=TestMemory.FRAM_SLAVE_ADDR,
+            memory_type=MemoryType.FRAM,
+            address_width=MemoryAddressWidth.TWO_BYTES,
+            page_count=1,
+            page_size=TestMemory.FRAM_SIZE,
+        )
+
+        data = generate_ascii_data(1000, 1000)
+        mem.write(address=1000, data=data)
+        mem.flush()
+
+        # Flushed and read ranges are served from the buffer
+        sent_frames = expander.tx_frames
+        assert mem.read(address=1000, length=len(data)) == data
+        assert mem.read(address=1200, length=100) == data[200:300]
+        assert expander.tx_frames == sent_frames
+
+        # Only the missing part is read
+        assert mem.read(address=900, length=200)[100:] == data[:100]
+        assert expander.tx_frames == sent_frames + 1
+        assert list(mem.valid_sections) == [(900, 2000)]
+
+        # Written by another master, the cache returns stale data until invalidated
+        new_data = generate_ascii_data(100, 100)
+        uncached.write(address=1500, data=new_data)
+        uncached.flush()
+        assert mem.read(address=1500, length=100) == data[500:600]
+        mem.invalidate(address=1500, length=100)
+        assert mem.read(address=1500, length=100) == new_data
+
+        start_time = time.perf_counter()
+        for _ in range(TestMemory.WRITE_READ_COUNT):
+            mem.read(address=1000, length=256)
+        elapsed_time = time.perf_counter() - start_time
+        print(f"Cached reads: {TestMemory.WRITE_READ_COUNT / elapsed_time:.0f} reads/second")
+        expander.disconnect()
+
+    def test_memory_readv_writev_fram(self, create_memory):
+        expander = InterfaceExpander()
+        expander.connect()
+
+        cfg0 = I2cConfig(clock_freq=ClockFreq.FREQ1M, slave_addr=0x01, slave_addr_width=AddressWidth.Bits7)
+        i2c0 = I2cInterface(i2c_id=I2cId.I2C0, config=cfg0)
+
+        # Small fields, some of them close to each other
+        fields = []
+        for i in range(40):
+            address = 500 * i + random.randint(0, 8)
+            fields.append((address, generate_ascii_data(1, 8)))
+            fields.append((address + 12, generate_ascii_data(1, 8)))
+        mem = create_memory(i2c0, MemoryType.FRAM)
+        mem.writev(fields)
+
+        other = create_memory(i2c0, MemoryType.FRAM)
+        start_time = time.perf_counter()
+        for address, data in fields:
+            assert other.read(address, len(data)) == data
+        read_time = time.perf_counter() - start_time
+
+        sent_frames = expander.tx_frames
+        start_time = time.perf_counter()
+        assert other.readv([(address, len(data)) for address, data in reversed(fields)]) == [
+            data for _, data in reversed(fields)
+        ]
+        readv_time = time.perf_counter() - start_time
+        assert expander.tx_frames - sent_frames == 40  # Close fields are read together
+        print(f"{len(fields)} fields, read: {read_time * 1000:.1f} ms, readv: {readv_time * 1000:.1f} ms")
+
+        # With the read cache close fields are written together, the gap is rewritten with the known content
+        cached = create_memory(i2c0, MemoryType.FRAM, read_cache=True)
+        cached.readv([(address, 30) for address, _ in fields[::2]])
+        new_fields = [(address, generate_ascii_data(len(data), len(data))) for address, data in fields]
+        sent_frames = expander.tx_frames
+        assert cached.writev(new_fields) == (1, 0)
+        assert expander.tx_frames - sent_frames == 40
+        assert other.readv([(address, len(data)) for address, data in new_fields]) == [data for _, data in new_fields]
+        expander.disconnect()
+
+    def test_memory_readv_bank_boundary_eeprom(self):
+        expander = InterfaceExpander()
+        expander.connect()
+
+        cfg0 = I2cConfig(clock_freq=ClockFreq.FREQ1M, slave_addr=0x01, slave_addr_width=AddressWidth.Bits7)
+        i2c0 = I2cInterface(i2c_id=I2cId.I2C0, config=cfg0)
+
+        mem = Memory(
+            interface=i2c0,
+            slave_address=TestMemory.EEPROM_SLAVE_ADDR,
+            memory_type=MemoryType.EEPROM,
+            address_width=MemoryAddressWidth.TWO_BYTES,
+            page_count=TestMemory.EEPROM_PAGE_COUNT,
+            page_size=TestMemory.EEPROM_PAGE_SIZE,
+        )
+        fields = [(0x1FF00, b"end"), (0xFFF0, generate_ascii_data(32, 32)), (0x10, b"start")]
+        mem.writev(fields)
+        assert len(mem.plan(0xFFF0, 32, MemoryOperation.READ)) == 2  # Split at the bank boundary
+
+        mem.buffer = bytearray(mem.memory_size)
+        assert mem.readv([(address, len(data)) for address, data in fields]) == [data for _, data in fields]
+        expander.disconnect()
+
+    def test_memory_sequential_prefetch_fram(self, create_memory):
+        expander = InterfaceExpander()
+        expander.connect()
+
+        cfg0 = I2cConfig(clock_freq=ClockFreq.FREQ1M, slave_addr=0x01, slave_addr_width=AddressWidth.Bits7)
+        i2c0 = I2cInterface(i2c_id=I2cId.I2C0, config=cfg0)
+
+        log = generate_ascii_data(8192, 8192)
+        mem = create_memory(i2c0, MemoryType.FRAM, prefetch_depth=0)
+        mem.write(4096, log)
+        mem.flush()
+
+        # Log readout in small chunks
+        times = []
+        for prefetch_depth in (0, 16):
+            reader = create_memory(i2c0, MemoryType.FRAM, prefetch_depth=prefetch_depth)
+            start_time = time.perf_counter()
+            data = b"".join(reader.read(address, 32) for address in range(4096, 4096 + len(log), 32))
+            times.append(time.perf_counter() - start_time)
+            assert data == log
+        assert (reader.prefetch_hits, reader.prefetch_misses) == (len(log) // 32 - 1, 1)
+        assert reader.prefetch_window == 16
+        print(
+            f"Sequential 32 byte reads: {len(log) / times[0] / 1000:.1f} kB/s, "
+            f"prefetched: {len(log) / times[1] / 1000:.1f} kB/s"
+        )
+
+        # Random access resets the depth
+        assert reader.read(100, 10) == mem.read(100, 10)
+        assert reader.prefetch_misses == 2 and reader.prefetch_window == 1
+        assert reader.read(110, 200) == mem.read(110, 200)
+        assert reader.prefetch_window == 4
+
+        # Writing to the prefetched range drops the prefetched data
+        reader.write(350, b"new data")
+        reader.flush()
+        assert reader.read(310, 48) == mem.read(310, 48)
+        assert reader.read(310, 48)[40:] == b"new data"
+        reader.close()
+        expander.disconnect()
+
+    def test_memory_verify_fram(self, create_memory):
+        expander = InterfaceExpander()
+        expander.connect()
+
+        cfg0 = I2cConfig(clock_freq=ClockFreq.FREQ1M, slave_addr=0x01, slave_addr_width=AddressWidth.Bits7)
+        i2c0 = I2cInterface(i2c_id=I2cId.I2C0, config=cfg0)
+
+        mem = create_memory(i2c0, MemoryType.FRAM)
+        mem.write(address=0, data=generate_ascii_data(TestMemory.FRAM_SIZE, TestMemory.FRAM_SIZE))
+        mem.flush(verify=True)
+
+        start_time = time.perf_counter()
+        assert mem.verify() == []
+        verify_time = time.perf_counter() - start_time
+        print(f"Verify: {TestMemory.FRAM_SIZE / verify_time / 1000:.1f} kB/s")
+
+        # Modified by another master
+        other = create_memory(i2c0, MemoryType.FRAM)
+        other.write(address=100, data=b"\x00\x00\x00")
+        other.write(address=104, data=b"\x00")
+        other.write(address=30000, data=b"\x00")
+        other.flush()
+        assert mem.verify(stop_on_mismatch=False) == [(100, 103), (104, 105), (30000, 30001)]
+        assert mem.verify() == [(100, 103), (104, 105)]  # Stops after the first mismatching read
+        assert mem.verify(address=1000, length=1000) == []
+
+        mem.flush(verify=True)  # Nothing to write
+        mem.write(address=100, data=mem.buffer[100:105])
+        mem.write(address=30000, data=mem.buffer[30000:30001])
+        assert mem.flush(verify=True) == (1, 0)
+        assert mem.verify() == []
+        expander.disconnect()
+
+    def test_memory_differential_flush_eeprom(self, create_memory):
+        expander = InterfaceExpander()
+        expander.connect()
+
+        cfg0 = I2cConfig(clock_freq=ClockFreq.FREQ1M, slave_addr=0x01, slave_addr_width=AddressWidth.Bits7)
+        i2c0 = I2cInterface(i2c_id=I2cId.I2C0, config=cfg0)
+
+        page_count = 64
+        image = generate_ascii_data(page_count * TestMemory.EEPROM_PAGE_SIZE, page_count * TestMemory.EEPROM_PAGE_SIZE)
+        mem = create_memory(i2c0, MemoryType.EEPROM)
+        mem.write(address=0, data=image)
+        start_time = time.perf_counter()
+        assert mem.flush() == (page_count, 0)
+        full_time = time.perf_counter() - start_time
+
+        # Only the pages that differ from the memory content (read back) are written
+        changed_pages = [3, 17, 42]
+        new_image = bytearray(image)
+        for page in changed_pages:
+            new_image[page * TestMemory.EEPROM_PAGE_SIZE + 7] ^= 0x01
+        mem.write(address=0, data=new_image)
+        start_time = time.perf_counter()
+        assert mem.flush(differential=True) == (len(changed_pages), page_count - len(changed_pages))
+        differential_time = time.perf_counter() - start_time
+        assert create_memory(i2c0, MemoryType.EEPROM).read(address=0, length=len(new_image)) == new_image
+        print(f"Full flush: {full_time:.3f} s, differential flush: {differential_time:.3f} s")
+
+        # With the read cache the memory content is known from the page digests, nothing is read back
+        cached = create_memory(i2c0, MemoryType.EEPROM, read_cache=True)
+        cached.read(address=0, length=len(new_image))
+        cached.write(address=0, data=new_image)
+        cached.write(address=5 * TestMemory.EEPROM_PAGE_SIZE, data=b"changed")
+        assert not cached._differential_read_sections()
+        assert cached.flush(differential=True) == (1, page_count - 1)
+        new_image[5 * TestMemory.EEPROM_PAGE_SIZE : 5 * TestMemory.EEPROM_PAGE_SIZE + 7] = b"changed"
+        assert create_memory(i2c0, MemoryType.EEPROM).read(address=0, length=len(new_image)) == new_image
+        expander.disconnect()
+
+    def test_memory_page_coalescing_eeprom(self, create_memory):
+        expander = InterfaceExpander()
+        expander.connect()
+
+        cfg0 = I2cConfig(clock_freq=ClockFreq.FREQ1M, slave_addr=0x01, slave_addr_width=AddressWidth.Bits7)
+        i2c0 = I2cInterface(i2c_id=I2cId.I2C0, config=cfg0)
+
+        page_count = 8
+        image = bytearray(generate_ascii_data(page_count * TestMemory.EEPROM_PAGE_SIZE, page_count * 256))
+        mem = create_memory(i2c0, MemoryType.EEPROM)
+        mem.write(address=0, data=image)
+        mem.flush()
+
+        for read_cache in (False, True):
+            # Scattered fields, 10 per page with small gaps
+            mem = create_memory(i2c0, MemoryType.EEPROM, read_cache=read_cache)
+            if read_cache:
+                mem.read(address=0, length=len(image))
+            for page in range(page_count):
+                for field in range(10):
+                    address = page * TestMemory.EEPROM_PAGE_SIZE + field * 12
+                    data = generate_ascii_data(4, 4)
+                    mem.write(address=address, data=data)
+                    image[address : address + len(data)] = data
+
+            sections, unknown_gaps = mem._coalesce_page_sections(list(mem.updated_sections))
+            assert len(sections) == page_count  # One write cycle per page instead of one per field
+            assert len(unknown_gaps) == (0 if read_cache else 9 * page_count)
+
+            start_time = time.perf_counter()
+            assert mem.flush() == (page_count, 0)
+            elapsed_time = time.perf_counter() - start_time
+            print(f"{10 * page_count} fields (read cache: {read_cache}) flushed in {elapsed_time * 1000:.1f} ms")
+            assert create_memory(i2c0, MemoryType.EEPROM).read(address=0, length=len(image)) == image
+        expander.disconnect()
+
+    def test_memory_write_back_eeprom(self, create_memory):
+        expander = InterfaceExpander()
+        expander.connect(background_reader=True)
+
+        cfg0 = I2cConfig(clock_freq=ClockFreq.FREQ1M, slave_addr=0x01, slave_addr_width=AddressWidth.Bits7)
+        i2c0 = I2cInterface(i2c_id=I2cId.I2C0, config=cfg0)
+
+        def wait_until(predicate) -> None:
+            deadline = time.monotonic() + 2.0
+            while not predicate():
+                assert time.monotonic() < deadline
+                sleep(0.001)
+
+        mem = create_memory(i2c0, MemoryType.EEPROM)
+        mem.start_write_back(delay=0.002, coalesce_window=0.02)
+
+        # Control loop logging records, write() does not wait for the EEPROM write cycles
+        log = bytearray()
+        write_times = []
+        for _ in range(200):
+            record = generate_ascii_data(16, 16)
+            start_time = time.perf_counter()
+            mem.write(address=len(log), data=record)
+            write_times.append(time.perf_counter() - start_time)
+            log += record
+            sleep(0.0005)
+        wait_until(lambda: not mem.updated_sections)
+        with mem.io_lock:  # Until the write-back in progress is complete
+            assert create_memory(i2c0, MemoryType.EEPROM).read(address=0, length=len(log)) == log
+        print(f"Write-back: longest write() {max(write_times) * 1000:.3f} ms")
+
+        # sync() is a barrier
+        mem.write(address=4096, data=b"synchronized")
+        mem.sync()
+        assert create_memory(i2c0, MemoryType.EEPROM).read(address=4096, length=12) == b"synchronized"
+
+        # A failed write-back is raised by the next call, its data is written after the error has been handled
+        mem.slave_address = 0x30  # No device
+        mem.plan.cache_clear()
+        mem.write(address=8192, data=b"lost?")
+        wait_until(lambda: mem.write_back_error is not None)
+        with pytest.raises(TimeoutError):
+            mem.write(address=8197, data=b" no")  # Buffered before the error is raised
+        mem.slave_address = TestMemory.EEPROM_SLAVE_ADDR
+        mem.plan.cache_clear()
+        mem.stop_write_back()
+        assert create_memory(i2c0, MemoryType.EEPROM).read(address=8192, length=8) == b"lost? no"
+        expander.disconnect()
+
+    def test_memory_mapped_and_sparse_buffer_eeprom(self):
+        expander = InterfaceExpander()
+        expander.connect()
+
+        cfg0 = I2cConfig(clock_freq=TestMemory.I2C_CLOCK_FREQ, slave_addr=0x01, slave_addr_width=AddressWidth.Bits7)
+        i2c0 = I2cInterface(i2c_id=I2cId.I2C0, config=cfg0)
+
+        sparse = Memory(
+            interface=i2c0,
+            slave_address=TestMemory.EEPROM_SLAVE_ADDR,
+            memory_type=MemoryType.EEPROM,
+            address_width=MemoryAddressWidth.TWO_BYTES,
+            page_count=TestMemory.EEPROM_PAGE_COUNT,
+            page_size=TestMemory.EEPROM_PAGE_SIZE,
+            sparse_buffer=True,
+        )
+        data = generate_ascii_data(1000, 1000)
+        sparse.write(address=0xEE00, data=data)
+        sparse.flush()
+        assert sparse.read(address=0xEE00, length=len(data)) == data
+        assert len(sparse.buffer.pages) == 2  # Only the touched pages are allocated
+
+        mapped = Memory(
+            interface=i2c0,
+            slave_address=TestMemory.EEPROM_SLAVE_ADDR,
+            memory_type=MemoryType.EEPROM,
+            address_width=MemoryAddressWidth.TWO_BYTES,
+            page_count=TestMemory.EEPROM_PAGE_COUNT,
+            page_size=TestMemory.EEPROM_PAGE_SIZE,
+            buffer_file="eeprom_image.bin",
+        )
+        assert mapped.read(address=0xEE00, length=len(data)) == data
+
+        # The whole memory is read straight into the mapped file
+        mapped.download_bin_file(0, "eeprom_image.bin")
+        mapped.close()
+        with open("eeprom_image.bin", "rb") as file:
+            image = file.read()
+        assert len(image) == TestMemory.EEPROM_SIZE
+        assert image[0xEE00 : 0xEE00 + len(data)] == data
+
+        sparse.download_bin_file(0xEE00, "eeprom_section.bin", len(data))
+        with open("eeprom_section.bin", "rb") as file:
+            assert file.read() == data
+
+        os.remove("eeprom_image.bin")
+        os.remove("eeprom_section.bin")
+        expander.disconnect()
+
     def test_memory_down_and_upload_bin_file_fram(self):
         expander = InterfaceExpander()
         expander.connect()
@@ -109,6 +532,54 @@ class TestMemory:
 
         os.remove(r"littlefs_image.bin")
 
+    def test_memory_bin_file_streaming_progress_fram(self):
+        expander = InterfaceExpander()
+        expander.connect()
+
+        cfg0 = I2cConfig(clock_freq=ClockFreq.FREQ1M, slave_addr=0x01, slave_addr_width=AddressWidth.Bits7)
+        i2c0 = I2cInterface(i2c_id=I2cId.I2C0, config=cfg0)
+
+        mem = Memory(
+            interface=i2c0,
+            slave_address=TestMemory.FRAM_SLAVE_ADDR,
+            memory_type=MemoryType.FRAM,
+            address_width=MemoryAddressWidth.TWO_BYTES,
+            page_count=int(TestMemory.FRAM_SIZE / 256),
+            page_size=256,
+        )
+
+        address = 1000  # Not page aligned
+        random_data = generate_ascii_data(20000, 20000)
+        with open(r"stream_image.bin", "wb") as f:
+            f.write(random_data)
+
+        upload_progress = []
+        start_time = time.perf_counter()
+        mem.upload_bin_file(address, r"stream_image.bin", progress=lambda done, total: upload_progress.append(done))
+        upload_time = time.perf_counter() - start_time
+        assert upload_progress == sorted(upload_progress)
+        assert upload_progress[0] == 4096 - address  # Chunks end on page (and chunk) boundaries
+        assert upload_progress[-1] == len(random_data)
+        assert not mem.updated_sections
+
+        download_progress = []
+        mem.buffer = bytearray(mem.memory_size)
+        start_time = time.perf_counter()
+        mem.download_bin_file(
+            address, r"stream_image.bin", len(random_data), progress=lambda done, total: download_progress.append(done)
+        )
+        download_time = time.perf_counter() - start_time
+        assert download_progress == upload_progress
+        print(
+            f"Streaming upload: {len(random_data) / upload_time / 1000:.1f} kB/s, "
+            f"download: {len(random_data) / download_time / 1000:.1f} kB/s"
+        )
+
+        with open(r"stream_image.bin", "rb") as f:
+            assert f.read() == random_data
+        os.remove(r"stream_image.bin")
+        expander.disconnect()
+
     def test_memory_down_and_upload_hex_file_fram(self):
         expander = InterfaceExpander()
         expander.connect()
@@ -144,6 +615,45 @@ class TestMemory:
 
         os.remove(r"littlefs_image.hex")
 
+    def test_memory_upload_hex_file_segments_fram(self):
+        expander = InterfaceExpander()
+        expander.connect()
+
+        cfg0 = I2cConfig(clock_freq=TestMemory.I2C_CLOCK_FREQ, slave_addr=0x01, slave_addr_width=AddressWidth.Bits7)
+        i2c0 = I2cInterface(i2c_id=I2cId.I2C0, config=cfg0)
+
+        mem = Memory(
+            interface=i2c0,
+            slave_address=TestMemory.FRAM_SLAVE_ADDR,
+            memory_type=MemoryType.FRAM,
+            address_width=MemoryAddressWidth.TWO_BYTES,
+            page_count=1,
+            page_size=TestMemory.FRAM_SIZE,
+        )
+        background = generate_ascii_data(TestMemory.FRAM_SIZE, TestMemory.FRAM_SIZE)
+        mem.write(0, background)
+        mem.flush()
+
+        # Hex file with gaps, the memory between the segments must not be written
+        segments = [(100, 1000), (1000, 5000), (20000, 20001), (30000, TestMemory.FRAM_SIZE)]
+        ih = IntelHex()
+        for start, end in segments:
+            ih.puts(start, generate_ascii_data(end - start, end - start))
+        ih.write_hex_file("segments.hex")
+
+        start_time = time.perf_counter()
+        mem.upload_hex_file("segments.hex")
+        print(f"Hex upload: {len(ih) / (time.perf_counter() - start_time):.0f} bytes/second")
+        os.remove("segments.hex")
+
+        expected = bytearray(background)
+        for start, end in segments:
+            expected[start:end] = ih.gets(start, end - start)
+        mem.download_hex_file(0, "segments.hex")
+        assert bytes(IntelHex("segments.hex").tobinarray()) == expected
+        os.remove("segments.hex")
+        expander.disconnect()
+
     def test_memory_write_read_eeprom(self):
         expander = InterfaceExpander()
         expander.connect()
@@ -169,6 +679,34 @@ class TestMemory:
             read_data = mem.read(address=address, length=len(data))
             assert read_data == data, f"Data mismatch at address {address}: expected {data}, got {read_data}"
 
+    def test_memory_flush_speed_eeprom(self):
+        expander = InterfaceExpander()
+        expander.connect()
+
+        cfg0 = I2cConfig(clock_freq=ClockFreq.FREQ1M, slave_addr=0x01, slave_addr_width=AddressWidth.Bits7)
+        i2c0 = I2cInterface(i2c_id=I2cId.I2C0, config=cfg0)
+
+        mem = Memory(
+            interface=i2c0,
+            slave_address=TestMemory.EEPROM_SLAVE_ADDR,
+            memory_type=MemoryType.EEPROM,
+            address_width=MemoryAddressWidth.TWO_BYTES,
+            page_count=TestMemory.EEPROM_PAGE_COUNT,
+            page_size=TestMemory.EEPROM_PAGE_SIZE,
+        )
+
+        data = os.urandom(64 * TestMemory.EEPROM_PAGE_SIZE)
+        mem.write(address=0, data=data)
+        start_time = time.perf_counter()
+        mem.flush()
+        elapsed_time = time.perf_counter() - start_time
+        print(f"EEPROM flush: {len(data) / elapsed_time:.0f} bytes/second")
+        print(f"Learned write cycle time: {mem.write_cycle_time * 1000:.2f} ms")
+
+        mem.buffer = bytearray(mem.memory_size)
+        assert mem.read(address=0, length=len(data)) == data
+        expander.disconnect()
+
     def test_memory_down_and_upload_bin_file_eeprom(self):
         expander = InterfaceExpander()
         expander.connect()
@@ -0,0 +1,115 @@
+#!/usr/bin/env python
+
+"""Testing MemoryArray class (on the simulator, the test board has a single EEPROM)"""
+
+from interface_expander.InterfaceExpander import InterfaceExpander
+from interface_expander.I2cInterface import I2cInterface, I2cConfig, ClockFreq, AddressWidth, I2cId, I2C_MAX_READ_SIZE
+from interface_expander.Memory import MemoryType
+from interface_expander.MemoryArray import MemoryArray
+from interface_expander.Simulator import (
+    SimMemory,
+    SIM_FRAM_SLAVE_ADDR,
+    SIM_FRAM_SIZE,
+    SIM_EEPROM_SLAVE_ADDR,
+    SIM_EEPROM_SIZE,
+    SIM_EEPROM_PAGE_SIZE,
+    SIM_EEPROM_WRITE_TIME,
+)
+from interface_expander.protocol_sim import get_simulator
+from tests.helper import generate_ascii_data
+import pytest
+import time
+
+
+class TestMemoryArray:
+    EEPROM_SLAVE_ADDRS = (SIM_EEPROM_SLAVE_ADDR, 0x54, 0x56)  # Two EEPROMs on I2C0, one on I2C1
+    DATA_SIZE = 24 * SIM_EEPROM_PAGE_SIZE
+
+    @staticmethod
+    def create_interfaces(name: str) -> tuple[InterfaceExpander, I2cInterface, I2cInterface]:
+        simulator = get_simulator(name)
+        for slave_addr in TestMemoryArray.EEPROM_SLAVE_ADDRS[1:]:
+            eeprom = SimMemory(SIM_EEPROM_SIZE, 2, page_size=SIM_EEPROM_PAGE_SIZE, write_time=SIM_EEPROM_WRITE_TIME)
+            simulator.attach(slave_addr, eeprom)
+
+        expander = InterfaceExpander(port=f"sim://{name}")
+        expander.connect(background_reader=True)
+        cfg = I2cConfig(clock_freq=ClockFreq.FREQ1M, slave_addr=0x01, slave_addr_width=AddressWidth.Bits7)
+        i2c0 = I2cInterface(i2c_id=I2cId.I2C0, config=cfg, expander=expander)
+        i2c1 = I2cInterface(i2c_id=I2cId.I2C1, config=cfg, expander=expander)
+        return expander, i2c0, i2c1
+
+    def test_striped_eeproms(self, create_memory):
+        expander, i2c0, i2c1 = TestMemoryArray.create_interfaces("array-striped")
+        interfaces = (i2c0, i2c0, i2c1)
+        eeproms = [
+            create_memory(interface, MemoryType.EEPROM, slave_addr)
+            for interface, slave_addr in zip(interfaces, TestMemoryArray.EEPROM_SLAVE_ADDRS)
+        ]
+        array = MemoryArray(eeproms, stripe_size=SIM_EEPROM_PAGE_SIZE)
+        assert array.memory_size == 3 * SIM_EEPROM_SIZE
+
+        data = generate_ascii_data(TestMemoryArray.DATA_SIZE, TestMemoryArray.DATA_SIZE)
+        address = 100  # Not stripe aligned
+        array.write(address, data)
+        start_time = time.perf_counter()
+        assert array.flush() == (25, 0)  # One page per stripe, the first and the last one partially
+        array_time = time.perf_counter() - start_time
+        assert array.read(address, len(data)) == data
+
+        # Stripes are distributed round-robin
+        stripe = SIM_EEPROM_PAGE_SIZE
+        assert eeproms[0].read(0, stripe)[address:] == data[: stripe - address]
+        assert eeproms[1].read(0, stripe) == data[stripe - address : 2 * stripe - address]
+        assert eeproms[2].read(0, stripe) == data[2 * stripe - address : 3 * stripe - address]
+        assert eeproms[0].read(stripe, stripe) == data[3 * stripe - address : 4 * stripe - address]
+
+        # The same amount of data on a single EEPROM
+        single = create_memory(i2c0, MemoryType.EEPROM, SIM_EEPROM_SLAVE_ADDR)
+        single.write(SIM_EEPROM_SIZE // 2, data)
+        start_time = time.perf_counter()
+        single.flush()
+        single_time = time.perf_counter() - start_time
+        print(
+            f"Flush {len(data)} bytes, single EEPROM: {len(data) / single_time / 1000:.1f} kB/s, "
+            f"3 striped EEPROMs: {len(data) / array_time / 1000:.1f} kB/s"
+        )
+        expander.disconnect()
+
+    def test_concatenated_memories(self, create_memory):
+        expander, i2c0, i2c1 = TestMemoryArray.create_interfaces("array-linear")
+        fram = create_memory(i2c1, MemoryType.FRAM, SIM_FRAM_SLAVE_ADDR)
+        eeprom = create_memory(i2c0, MemoryType.EEPROM, SIM_EEPROM_SLAVE_ADDR)
+        array = MemoryArray([fram, eeprom])
+        assert array.memory_size == SIM_FRAM_SIZE + SIM_EEPROM_SIZE
+
+        # Across the boundary between both memories
+        data = generate_ascii_data(2000, 2000)
+        address = SIM_FRAM_SIZE - 1000
+        array.write(address, data)
+        assert array.flush() == (1 + 4, 0)
+        assert array.read(address, len(data)) == data
+        assert fram.read(address, 1000) == data[:1000]
+        assert eeprom.read(0, 1000) == data[1000:]
+        expander.disconnect()
+
+    def test_write_back_errors_and_pipelined_reads(self, create_memory):
+        expander, i2c0, _ = TestMemoryArray.create_interfaces("array-write-back")
+        eeproms = [
+            create_memory(i2c0, MemoryType.EEPROM, slave_addr) for slave_addr in TestMemoryArray.EEPROM_SLAVE_ADDRS[:2]
+        ]
+        array = MemoryArray(eeproms, stripe_size=SIM_EEPROM_PAGE_SIZE)
+
+        # The error of a failed write-back is raised by the array, the data is written by the next flush
+        data = generate_ascii_data(4 * SIM_EEPROM_PAGE_SIZE, 4 * SIM_EEPROM_PAGE_SIZE)
+        array.write(0, data)
+        eeproms[1].write_back_error = TimeoutError("Memory did not complete the write cycle!")
+        with pytest.raises(TimeoutError):
+            array.flush()
+        assert array.flush() == (4, 0)
+
+        # Both EEPROMs are on I2C0, their read requests are pipelined together
+        frames = expander.tx_frames
+        assert array.read(0, len(data)) == data
+        assert expander.tx_frames - frames == 2 * 2 * SIM_EEPROM_PAGE_SIZE // I2C_MAX_READ_SIZE
+        expander.disconnect()
@@ -0,0 +1,95 @@
+#!/usr/bin/env python
+
+"""Testing MemoryFile class"""
+
+from interface_expander.InterfaceExpander import InterfaceExpander
+from interface_expander.I2cInterface import I2cInterface, I2cConfig, ClockFreq, AddressWidth, I2cId
+from interface_expander.Memory import MemoryType
+from interface_expander.MemoryIO import MemoryFile
+from tests.helper import generate_ascii_data
+import tarfile
+import time
+import io
+
+
+class TestMemoryIO:
+    I2C_CLOCK_FREQ = ClockFreq.FREQ1M
+    CHUNK_SIZE = 256
+
+    def test_memory_file_read_write_seek(self, create_memory):
+        expander = InterfaceExpander()
+        expander.connect()
+        cfg = I2cConfig(clock_freq=TestMemoryIO.I2C_CLOCK_FREQ, slave_addr=0x01, slave_addr_width=AddressWidth.Bits7)
+        i2c0 = I2cInterface(i2c_id=I2cId.I2C0, config=cfg)
+
+        for memory_type in (MemoryType.FRAM, MemoryType.EEPROM):
+            mem = create_memory(i2c0, memory_type)
+            data = generate_ascii_data(3000, 3000)
+            with MemoryFile(mem) as file:
+                assert file.seekable() and file.readable() and file.writable()
+                assert file.seek(0, io.SEEK_END) == mem.memory_size
+                file.seek(1000)
+                for offset in range(0, len(data), 100):
+                    file.write(data[offset : offset + 100])
+                assert file.tell() == 1000 + len(data)
+
+                # Written data is read back before it is flushed
+                file.seek(900)
+                assert file.read(200)[100:] == data[:100]
+                assert mem.updated_sections
+
+                file.flush()
+                assert not mem.updated_sections
+
+                file.seek(-10, io.SEEK_END)
+                assert len(file.read()) == 10
+                assert file.read(1) == b""
+
+            other = create_memory(i2c0, memory_type)
+            assert other.read(1000, len(data)) == data
+        expander.disconnect()
+
+    def test_memory_file_tar_archive(self, create_memory):
+        expander = InterfaceExpander()
+        expander.connect()
+        cfg = I2cConfig(clock_freq=TestMemoryIO.I2C_CLOCK_FREQ, slave_addr=0x01, slave_addr_width=AddressWidth.Bits7)
+        i2c0 = I2cInterface(i2c_id=I2cId.I2C0, config=cfg)
+
+        # Standard tooling works directly on the memory
+        files = {"config.txt": generate_ascii_data(5000, 5000), "version.txt": b"1.2.3"}
+        with MemoryFile(create_memory(i2c0, MemoryType.EEPROM)) as file:
+            with tarfile.open(fileobj=file, mode="w:") as archive:
+                for name, content in files.items():
+                    info = tarfile.TarInfo(name)
+                    info.size = len(content)
+                    archive.addfile(info, io.BytesIO(content))
+
+        mem = create_memory(i2c0, MemoryType.EEPROM)
+        with MemoryFile(mem) as file, tarfile.open(fileobj=file, mode="r:") as archive:
+            assert archive.getnames() == list(files)
+            for name, content in files.items():
+                assert archive.extractfile(name).read() == content
+        expander.disconnect()
+
+    def test_memory_file_sequential_read_speed(self, create_memory):
+        expander = InterfaceExpander()
+        expander.connect()
+        cfg = I2cConfig(clock_freq=TestMemoryIO.I2C_CLOCK_FREQ, slave_addr=0x01, slave_addr_width=AddressWidth.Bits7)
+        i2c0 = I2cInterface(i2c_id=I2cId.I2C0, config=cfg)
+        mem = create_memory(i2c0, MemoryType.FRAM)
+
+        start_time = time.perf_counter()
+        chunk_size = TestMemoryIO.CHUNK_SIZE
+        expected = b"".join(mem.read(address, chunk_size) for address in range(0, mem.memory_size, chunk_size))
+        read_time = time.perf_counter() - start_time
+
+        start_time = time.perf_counter()
+        with MemoryFile(mem) as file:
+            data = b"".join(iter(lambda: file.read(chunk_size), b""))
+        file_time = time.perf_counter() - start_time
+        assert data == expected
+        print(
+            f"Sequential {chunk_size} byte reads, Memory.read: {mem.memory_size / read_time / 1000:.1f} "
+            f"kB/s, MemoryFile: {mem.memory_size / file_time / 1000:.1f} kB/s"
+        )
+        expander.disconnect()
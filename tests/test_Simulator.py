@@ -0,0 +1,96 @@
+#!/usr/bin/env python
+
+"""Testing the simulated interface expander (sim:// ports)"""
+
+from interface_expander.InterfaceExpander import InterfaceExpander
+from interface_expander.EchoCom import EchoCom
+from interface_expander.I2cInterface import I2cInterface, I2cConfig, ClockFreq, AddressWidth, I2cId, I2cMasterRequest
+from interface_expander.Memory import Memory, MemoryType, MemoryAddressWidth
+from interface_expander.Simulator import SimMemory, SIM_FRAM_SLAVE_ADDR, SIM_FRAM_SIZE, SIM_EEPROM_WRITE_TIME
+from tests.helper import generate_ascii_data
+import serial
+import time
+
+
+class TestSimulator:
+    LOOP_COUNT = 1000
+    REQUEST_COUNT = 2000
+    DATA_SIZE_MIN = 1
+    DATA_SIZE_MAX = 256 + 64
+
+    def test_loopback(self):
+        port = serial.serial_for_url("sim://?loopback", timeout=0.1)
+        tx_data = generate_ascii_data(TestSimulator.DATA_SIZE_MAX, TestSimulator.DATA_SIZE_MAX)
+        port.write(tx_data)
+        assert port.in_waiting == len(tx_data)
+        assert port.read(len(tx_data)) == tx_data
+        assert port.read(1) == b""  # Timeout
+        port.close()
+
+    def test_echo(self):
+        expander = InterfaceExpander(port="sim://echo")
+        expander.reset()
+        expander.connect()
+
+        usb_com = EchoCom(expander)
+        for _ in range(TestSimulator.LOOP_COUNT):
+            tx_data = generate_ascii_data(TestSimulator.DATA_SIZE_MIN, TestSimulator.DATA_SIZE_MAX)
+            usb_com.send(tx_data)
+            assert usb_com.read_echo(timeout=0.5) == tx_data
+
+        expander.disconnect()
+
+    def test_memory_persists_between_connections(self):
+        expander = InterfaceExpander(port="sim://memory")
+        data = generate_ascii_data(4096, 4096)
+
+        for write in (True, False):
+            expander.connect()
+            cfg = I2cConfig(clock_freq=ClockFreq.FREQ1M, slave_addr=0x01, slave_addr_width=AddressWidth.Bits7)
+            i2c = I2cInterface(i2c_id=I2cId.I2C0, config=cfg, expander=expander)
+            fram = Memory(
+                interface=i2c,
+                slave_address=SIM_FRAM_SLAVE_ADDR,
+                memory_type=MemoryType.FRAM,
+                address_width=MemoryAddressWidth.TWO_BYTES,
+                page_count=1,
+                page_size=SIM_FRAM_SIZE,
+            )
+            if write:
+                fram.write(1000, data)
+                fram.flush()
+            else:
+                assert fram.read(1000, len(data)) == data
+            expander.disconnect()
+
+    def test_eeprom_write_cycle(self):
+        eeprom = SimMemory(size=pow(2, 17), address_width=2, page_size=256, write_time=SIM_EEPROM_WRITE_TIME)
+        assert eeprom.address_bits == 1
+
+        # Writes wrap around within the page, the second bank is selected by the slave address
+        assert eeprom.access(0x53, bytes([0x00, 0xFE]) + b"abcd", 0, now=0.0) == (True, b"")
+        assert eeprom.data[0x100FE:0x10100] == b"ab"
+        assert eeprom.data[0x10000:0x10002] == b"cd"
+
+        # No acknowledge until the write cycle is complete
+        assert eeprom.access(0x53, bytes([0x00, 0xFE]), 4, now=SIM_EEPROM_WRITE_TIME / 2) == (False, b"")
+        assert eeprom.access(0x53, bytes([0x00, 0xFE]), 2, now=SIM_EEPROM_WRITE_TIME) == (True, b"ab")
+
+    def test_i2c_master_request_speed(self):
+        expander = InterfaceExpander(port="sim://speed?latency=0&bus_time=0")
+        expander.connect(background_reader=True)
+
+        cfg = I2cConfig(clock_freq=ClockFreq.FREQ1M, slave_addr=0x01, slave_addr_width=AddressWidth.Bits7)
+        i2c = I2cInterface(i2c_id=I2cId.I2C0, config=cfg, expander=expander)
+
+        start_time = time.time()
+        futures = []
+        for i in range(TestSimulator.REQUEST_COUNT):
+            address = (i * 4) % SIM_FRAM_SIZE
+            write_data = address.to_bytes(2, "big") + i.to_bytes(4, "big")
+            futures.append(i2c.submit(I2cMasterRequest(SIM_FRAM_SLAVE_ADDR, write_data, 0)))
+        i2c.wait_all(futures, timeout=10)
+        elapsed_time = time.time() - start_time
+        print(f"Simulated I2C master requests: {TestSimulator.REQUEST_COUNT / elapsed_time:.2f} requests/second")
+
+        expander.disconnect()
@@ -0,0 +1,46 @@
+#!/usr/bin/env python
+
+"""Testing SparseBuffer class"""
+
+from interface_expander.SparseBuffer import SparseBuffer
+import random
+import pytest
+
+
+class TestSparseBuffer:
+    SIZE = 5 * SparseBuffer.PageSize + 123
+
+    def test_unwritten_bytes_read_as_zero(self):
+        buffer = SparseBuffer(TestSparseBuffer.SIZE)
+        assert len(buffer) == TestSparseBuffer.SIZE
+        assert buffer[:] == bytes(TestSparseBuffer.SIZE)
+        assert buffer[-1] == 0
+        assert not buffer.pages
+
+    def test_writes_allocate_touched_pages(self):
+        buffer = SparseBuffer(TestSparseBuffer.SIZE)
+        buffer[SparseBuffer.PageSize - 2 : SparseBuffer.PageSize + 2] = b"abcd"
+        buffer[-1] = 0x42
+        assert sorted(buffer.pages) == [0, 1, 5]
+        assert buffer[SparseBuffer.PageSize - 3 : SparseBuffer.PageSize + 3] == b"\x00abcd\x00"
+        assert buffer[TestSparseBuffer.SIZE - 1] == 0x42
+
+        with pytest.raises(ValueError):
+            buffer[0:4] = b"abc"  # Cannot be resized
+        with pytest.raises(IndexError):
+            buffer[TestSparseBuffer.SIZE] = 0
+
+    def test_random_against_reference(self):
+        buffer = SparseBuffer(TestSparseBuffer.SIZE)
+        reference = bytearray(TestSparseBuffer.SIZE)
+        for _ in range(1000):
+            start = random.randint(0, TestSparseBuffer.SIZE)
+            end = min(TestSparseBuffer.SIZE, start + random.randint(0, 3 * SparseBuffer.PageSize))
+            data = random.randbytes(end - start)
+            buffer[start:end] = data
+            reference[start:end] = data
+
+            start = random.randint(0, TestSparseBuffer.SIZE)
+            end = start + random.randint(0, 3 * SparseBuffer.PageSize)
+            assert buffer[start:end] == reference[start:end]
+        assert buffer[:] == reference
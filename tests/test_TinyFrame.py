@@ -0,0 +1,117 @@
+#!/usr/bin/env python
+
+"""Testing TinyFrame receive parser"""
+
+import interface_expander.tf.TinyFrame as TF
+import random
+import time
+
+
+def create_tf(bulk_parser: bool) -> TF.TinyFrame:
+    # Same frame format as used by the interface expander (see tiny_frame.tf_init)
+    tf = TF.TinyFrame()
+    tf.SOF_BYTE = 0x01
+    tf.ID_BYTES = 1
+    tf.LEN_BYTES = 2
+    tf.TYPE_BYTES = 1
+    tf.CKSUM_TYPE = "xor"
+    tf.BULK_PARSER = bulk_parser
+    tf.write = lambda _: None
+    return tf
+
+
+def collect_frames(tf: TF.TinyFrame) -> list[tuple]:
+    frames = []
+
+    def listener(_, msg):
+        frames.append((msg.id, msg.type, msg.len, bytes(msg.data)))
+
+    tf.add_fallback_listener(listener)
+    return frames
+
+
+def compose_stream(frame_sizes: list[int], seed: int = 42) -> bytes:
+    rnd = random.Random(seed)
+    tf = create_tf(bulk_parser=False)
+    stream = bytearray()
+    for size in frame_sizes:
+        payload = bytes(rnd.getrandbits(8) for _ in range(size))
+        _, frame = tf._compose(type=rnd.randint(0, 5), pld=payload)
+        stream.extend(frame)
+    return bytes(stream)
+
+
+def split_stream(stream: bytes, seed: int = 42) -> list[bytes]:
+    rnd = random.Random(seed)
+    chunks = []
+    pos = 0
+    while pos < len(stream):
+        size = rnd.randint(1, 512)
+        chunks.append(stream[pos : pos + size])
+        pos += size
+    return chunks
+
+
+class TestTinyFrame:
+    FRAME_COUNT = 2000
+    FRAME_SIZE_MAX = 320
+    # Typical RX frame sizes (DAC status, I2C status, I2C status with read data, echo)
+    BENCHMARK_FRAME_SIZES = [12, 24, 140, 320]
+    BENCHMARK_BYTES = 1 << 20
+
+    def test_bulk_parser_matches_byte_parser(self):
+        rnd = random.Random(1)
+        frame_sizes = [rnd.randint(0, TestTinyFrame.FRAME_SIZE_MAX) for _ in range(TestTinyFrame.FRAME_COUNT)]
+        stream = compose_stream(frame_sizes)
+
+        tf_byte = create_tf(bulk_parser=False)
+        frames_byte = collect_frames(tf_byte)
+        tf_byte.accept(stream)
+
+        tf_bulk = create_tf(bulk_parser=True)
+        frames_bulk = collect_frames(tf_bulk)
+        for chunk in split_stream(stream):
+            tf_bulk.accept(chunk)
+
+        assert len(frames_byte) == TestTinyFrame.FRAME_COUNT
+        assert frames_bulk == frames_byte
+
+    def test_bulk_parser_with_corrupted_stream(self):
+        rnd = random.Random(2)
+        frame_sizes = [rnd.randint(0, TestTinyFrame.FRAME_SIZE_MAX) for _ in range(TestTinyFrame.FRAME_COUNT)]
+        stream = bytearray(compose_stream(frame_sizes))
+        for _ in range(len(stream) // 500):
+            stream[rnd.randrange(len(stream))] = rnd.getrandbits(8)
+
+        tf_byte = create_tf(bulk_parser=False)
+        frames_byte = collect_frames(tf_byte)
+        for b in stream:
+            tf_byte.accept_byte(b)
+
+        tf_bulk = create_tf(bulk_parser=True)
+        frames_bulk = collect_frames(tf_bulk)
+        for chunk in split_stream(bytes(stream), seed=3):
+            tf_bulk.accept(chunk)
+
+        assert frames_bulk == frames_byte
+
+    def test_bulk_parser_speed(self):
+        for frame_size in TestTinyFrame.BENCHMARK_FRAME_SIZES:
+            frame_count = TestTinyFrame.BENCHMARK_BYTES // (frame_size + 6)
+            stream = compose_stream([frame_size] * frame_count)
+            chunks = [stream[i : i + 4096] for i in range(0, len(stream), 4096)]
+
+            for bulk_parser in (False, True):
+                tf = create_tf(bulk_parser)
+                frames = collect_frames(tf)
+
+                start_time = time.perf_counter()
+                for chunk in chunks:
+                    tf.accept(chunk)
+                elapsed_time = time.perf_counter() - start_time
+
+                assert len(frames) == frame_count
+                print(
+                    f"Frame size: {frame_size:3d} bytes, bulk parser: {bulk_parser!s:5}, "
+                    f"speed: {len(stream) / elapsed_time / 1e6:.2f} MB/s"
+                )
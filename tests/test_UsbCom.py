@@ -4,7 +4,11 @@
 
 from interface_expander.InterfaceExpander import InterfaceExpander
 from interface_expander.EchoCom import EchoCom
+from interface_expander.CtrlInterface import CtrlInterface
 from tests.helper import generate_ascii_data
+from concurrent.futures import ThreadPoolExecutor
+import serial.tools.list_ports
+import pytest
 import time
 
 
@@ -31,6 +35,88 @@ class TestUsbCom:
 
         expander.disconnect()
 
+    def test_usb_com_echo_background_reader(self):
+        expander = InterfaceExpander()
+        expander.reset()
+        expander.connect(background_reader=True)
+
+        usb_com = EchoCom()
+
+        counter = TestUsbCom.LOOP_COUNT
+        while counter > 0:
+            tx_data = generate_ascii_data(TestUsbCom.DATA_SIZE_MIN, TestUsbCom.DATA_SIZE_MAX)
+            usb_com.send(tx_data)
+            echo = usb_com.read_echo(timeout=0.02)
+            assert echo == tx_data
+            counter -= 1
+
+        expander.disconnect()
+
+    def test_usb_com_echo_coalesced_tx(self):
+        expander = InterfaceExpander()
+        expander.reset()
+        expander.connect(background_reader=True, coalesce_tx=True)
+
+        usb_com = EchoCom()
+
+        # Frames sent back to back are written together, flush() writes them right away
+        for _ in range(TestUsbCom.LOOP_COUNT // 8):
+            tx_data = [generate_ascii_data(TestUsbCom.DATA_SIZE_MIN, TestUsbCom.DATA_SIZE_MAX) for _ in range(8)]
+            for data in tx_data:
+                usb_com.send(data)
+            expander.flush()
+
+            deadline = time.monotonic() + 0.1
+            while usb_com.received_data != tx_data[-1]:  # Echoes arrive in order
+                assert time.monotonic() < deadline
+                time.sleep(0.001)
+
+        print(f"Frames per write: {expander.tx_frames / expander.tx_writes:.2f}")
+        assert expander.tx_writes < expander.tx_frames
+        expander.disconnect()
+
+    def test_usb_com_echo_multiple_devices(self):
+        expanders = InterfaceExpander.connect_all(background_reader=True)
+        assert len(expanders) > 0
+
+        def echo_loop(expander: InterfaceExpander) -> int:
+            usb_com = EchoCom(expander)
+            for _ in range(TestUsbCom.LOOP_COUNT):
+                tx_data = generate_ascii_data(TestUsbCom.DATA_SIZE_MIN, TestUsbCom.DATA_SIZE_MAX)
+                usb_com.send(tx_data)
+                echo = usb_com.read_echo(timeout=0.1 * len(expanders))  # The devices share the host
+                assert echo == tx_data
+            return TestUsbCom.LOOP_COUNT
+
+        start_time = time.time()
+        with ThreadPoolExecutor(max_workers=len(expanders)) as executor:
+            echo_count = sum(executor.map(echo_loop, expanders.values()))
+        elapsed_time = time.time() - start_time
+        print(f"Devices: {len(expanders)}, echo messages: {echo_count / elapsed_time:.2f} messages/second")
+
+        for expander in expanders.values():
+            expander.disconnect()
+
+    def test_usb_com_one_instance_per_device(self, monkeypatch):
+        # Equivalent selections of the same device return the same instance
+        expander = InterfaceExpander()
+        port, _ = InterfaceExpander.find_devices()[0]
+        assert InterfaceExpander(port=port) is expander
+        assert InterfaceExpander(None, port) is InterfaceExpander(port=port)
+
+        # The default selection is resolved once, not on every construction
+        monkeypatch.setattr(serial.tools.list_ports, "comports", lambda: pytest.fail("Serial ports enumerated!"))
+        assert EchoCom(expander) is EchoCom(expander=expander) is EchoCom()
+        assert CtrlInterface(expander) is CtrlInterface(expander=expander) is CtrlInterface()
+        monkeypatch.undo()
+
+        expander.connect()
+        usb_com = EchoCom(expander)
+        EchoCom(expander=expander)
+        usb_com.send(b"echo")
+        assert usb_com.read_echo(timeout=0.5) == b"echo"
+        expander.disconnect()
+
     def test_usb_echo_com_speed(self):
         expander = InterfaceExpander()
         expander.reset()